@@ -1,4 +1,5 @@
 from fina.tools import database
+import json
 import os
 from dotenv import load_dotenv
 from supabase import create_client, Client
@@ -7,12 +8,11 @@ from supabase import create_client, Client
 # database.insert_investment(asset_name="Test Investment", type="stocks", amount_invested=500.0, from_wallet="Test Wallet")
 # database.insert_debts(name="Test Debt", amount=200.0, interest_rate=5.0, to_wallet="Test Wallet")
 # database.insert_transaction(wallet="Test Wallet", amount=150.0, category="expense")
-wallets = database.read_wallets()
-investments = database.read_investments()
-debts = database.read_debts()
-transactions = database.read_transactions()
+# read_* return compact JSON tables: {"columns": [...], "rows": [[...]]}
+wallets = json.loads(database.read_wallets())
+investments = json.loads(database.read_investments())
+debts = json.loads(database.read_debts())
+transactions = json.loads(database.read_transactions())
 
-print("Wallets:", wallets)
-print("Investments:", investments)
-print("Debts:", debts)
-print("Transactions:", transactions)
+for label, table in [("Wallets", wallets), ("Investments", investments), ("Debts", debts), ("Transactions", transactions)]:
+    print(f"{label}:", [dict(zip(table["columns"], row)) for row in table["rows"]])
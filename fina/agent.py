@@ -1,20 +1,58 @@
+from typing import AsyncGenerator
+
 from google.adk import Agent
-from google.adk.agents import SequentialAgent
+from google.adk.agents import BaseAgent, SequentialAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
 from .config import MODEL
 
 from .tools.callback_logging import log_query_to_model, log_model_response
 from .tools.utils import append_to_state    
+from .tools.crud_dispatch import current_intent
+from .tools.defend_tools import start_model_preload
+from .tools.prefetch import prefetch_state
+from .tools.safety_gate import prompt_safety_gate
 
-from .sub_agents.database_agent.agent import database_agent
+from .sub_agents.database_agent.agent import crud_dispatch_agent
 from .sub_agents.user_context_agent import user_context_agent
-from .sub_agents.defend_agent.agent import defend_agent 
+
+# Load configured defend models before the first request needs them.
+start_model_preload()
+
+
+class PrefetchAgent(BaseAgent):
+    """
+    Fetches the data of the classified intent concurrently before it is routed.
+
+    Invest and planner agents then start with the financial summary and
+    market data already in state (see tools/prefetch.py).
+    """
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        # Written every turn, so data prefetched for an earlier message never lingers.
+        state_delta = await prefetch_state(current_intent(ctx.session.state))
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=EventActions(state_delta=state_delta),
+        )
+
+
+prefetch_agent = PrefetchAgent(
+    name="prefetch_agent",
+    description="Prefetches the financial summary and market data for invest and planner intents.",
+)
 
 main_flow = SequentialAgent(
     name="main_flow",
-    agents=[
-        defend_agent,
+    # The prompt-safety classifier runs directly here instead of through an
+    # LLM agent; malicious prompts end the flow with a refusal.
+    before_agent_callback=prompt_safety_gate,
+    sub_agents=[
         user_context_agent,
-        database_agent,
+        prefetch_agent,
+        crud_dispatch_agent,
     ],
 )
 
@@ -26,4 +26,131 @@ DEFAULT_TOP_K = 3
 DEFAULT_DISTANCE_THRESHOLD = 0.5
 DEFAULT_EMBEDDING_MODEL = "publishers/google/models/text-embedding-005"
 DEFAULT_EMBEDDING_REQUESTS_PER_MIN = 1000
+RAG_CORPUS_CACHE_TTL_SECONDS = float(os.environ.get("RAG_CORPUS_CACHE_TTL_SECONDS", "300"))
+RAG_BACKEND = os.environ.get("RAG_BACKEND", "vertex").lower()  # "vertex" or "local"
+RAG_LOCAL_INDEX_DIR = os.environ.get(
+    "RAG_LOCAL_INDEX_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "fina", "rag_index"),
+)
+# "vertex" uses DEFAULT_EMBEDDING_MODEL; "local" uses a sentence-transformers model
+RAG_EMBEDDING_BACKEND = os.environ.get("RAG_EMBEDDING_BACKEND", RAG_BACKEND).lower()
+RAG_LOCAL_EMBEDDING_MODEL = os.environ.get(
+    "RAG_LOCAL_EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+)
+RAG_CACHE_ENABLED = os.environ.get("RAG_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RAG_CACHE_SIMILARITY_THRESHOLD = float(os.environ.get("RAG_CACHE_SIMILARITY_THRESHOLD", "0.92"))
+RAG_CACHE_MAX_ENTRIES = int(os.environ.get("RAG_CACHE_MAX_ENTRIES", "5000"))
+RAG_CACHE_TTL_SECONDS = float(os.environ.get("RAG_CACHE_TTL_SECONDS", str(7 * 86400)))
+RAG_MANIFEST_DIR = os.environ.get(
+    "RAG_MANIFEST_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "fina", "rag_manifests"),
+)
+RAG_INGEST_BATCH_SIZE = int(os.environ.get("RAG_INGEST_BATCH_SIZE", "25"))  # Vertex AI imports at most 25 paths per call
+RAG_INGEST_PARALLELISM = int(os.environ.get("RAG_INGEST_PARALLELISM", "4"))
+RAG_MAX_QUERIES = int(os.environ.get("RAG_MAX_QUERIES", "6"))  # sub-questions per rag_query call
+RAG_CONTEXT_TOKEN_BUDGET = int(os.environ.get("RAG_CONTEXT_TOKEN_BUDGET", "3000"))  # merged multi-query context
+RAG_COMPRESSION_ENABLED = os.environ.get("RAG_COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+RAG_COMPRESSED_TOKEN_BUDGET = int(os.environ.get("RAG_COMPRESSED_TOKEN_BUDGET", "1200"))  # hard cap per rag_query call
+RAG_DUPLICATE_SIMILARITY = float(os.environ.get("RAG_DUPLICATE_SIMILARITY", "0.8"))
+RAG_HYBRID_ENABLED = os.environ.get("RAG_HYBRID_ENABLED", "true").lower() in ("1", "true", "yes")
+RAG_HYBRID_CANDIDATES = int(os.environ.get("RAG_HYBRID_CANDIDATES", "20"))  # per retriever, before fusion
+RAG_RRF_K = int(os.environ.get("RAG_RRF_K", "60"))
+# Keyword and vector hits of one source are the same passage when this share of
+# the shorter one's terms appears in the other (the two retrievers chunk differently).
+RAG_FUSION_MIN_OVERLAP = float(os.environ.get("RAG_FUSION_MIN_OVERLAP", "0.6"))
+# How often the keyword index checks the backend for corpus changes made elsewhere.
+RAG_KEYWORD_INDEX_REFRESH_SECONDS = float(os.environ.get("RAG_KEYWORD_INDEX_REFRESH_SECONDS", "300"))
+# Optional sentence-transformers CrossEncoder, e.g. "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+RAG_RERANK_MODEL = os.environ.get("RAG_RERANK_MODEL", "")
 
+
+# Prompt safety classifier settings
+DEFEND_MODEL_NAME = os.environ.get("DEFEND_MODEL_NAME", "Mustartoo/defend-model-v1")
+DEFEND_MODEL_REVISION = os.environ.get("DEFEND_MODEL_REVISION", "main")
+DEFEND_MODEL_MAX_RESIDENT = int(os.environ.get("DEFEND_MODEL_MAX_RESIDENT", "2"))
+# Comma-separated "name@revision" specs loaded at startup, e.g. "org/model@main,org/model-v2@abc123"
+DEFEND_PRELOAD_MODELS = [m.strip() for m in os.environ.get("DEFEND_PRELOAD_MODELS", "").split(",") if m.strip()]
+DEFEND_CANARY_MODEL = os.environ.get("DEFEND_CANARY_MODEL", "")  # "name@revision" served to a share of traffic
+DEFEND_CANARY_FRACTION = float(os.environ.get("DEFEND_CANARY_FRACTION", "0"))
+DEFEND_MALICIOUS_CLASS_ID = 0  # classifier output for a malicious prompt (1 is benign)
+DEFEND_VERDICT_CACHE_SIZE = int(os.environ.get("DEFEND_VERDICT_CACHE_SIZE", "10000"))
+DEFEND_VERDICT_CACHE_TTL_SECONDS = float(os.environ.get("DEFEND_VERDICT_CACHE_TTL_SECONDS", "86400"))
+DEFEND_VERDICT_CACHE_PATH = os.environ.get("DEFEND_VERDICT_CACHE_PATH")  # optional JSON file to persist verdicts
+DEFEND_BATCH_MAX_SIZE = int(os.environ.get("DEFEND_BATCH_MAX_SIZE", "16"))
+DEFEND_BATCH_MAX_WAIT_MS = float(os.environ.get("DEFEND_BATCH_MAX_WAIT_MS", "5"))
+DEFEND_WINDOW_STRIDE = int(os.environ.get("DEFEND_WINDOW_STRIDE", "128"))  # token overlap between windows of long prompts
+DEFEND_BACKEND = os.environ.get("DEFEND_BACKEND", "auto").lower()  # "auto", "onnx" or "torch"
+DEFEND_ONNX_CACHE_DIR = os.environ.get(
+    "DEFEND_ONNX_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "fina", "defend_onnx"),
+)
+DEFEND_ONNX_THREADS = int(os.environ.get("DEFEND_ONNX_THREADS", str(min(4, os.cpu_count() or 1))))
+# The int8 model is used only if at most this many parity prompts get a different prediction.
+DEFEND_ONNX_MAX_DISAGREEMENTS = int(os.environ.get("DEFEND_ONNX_MAX_DISAGREEMENTS", "0"))
+# Optional labelled CSV (MPDD format) whose prompts replace the built-in parity set.
+DEFEND_ONNX_PARITY_CSV = os.environ.get("DEFEND_ONNX_PARITY_CSV")
+DEFEND_ONNX_PARITY_LIMIT = int(os.environ.get("DEFEND_ONNX_PARITY_LIMIT", "1000"))
+DEFEND_SERVICE_SOCKET = os.environ.get("DEFEND_SERVICE_SOCKET")  # Unix socket of a shared classifier service
+DEFEND_SERVICE_TIMEOUT_SECONDS = float(os.environ.get("DEFEND_SERVICE_TIMEOUT_SECONDS", "30"))
+DEFEND_LEXICAL_ENABLED = os.environ.get("DEFEND_LEXICAL_ENABLED", "true").lower() in ("1", "true", "yes")
+DEFEND_LEXICAL_MODEL_PATH = os.environ.get(
+    "DEFEND_LEXICAL_MODEL_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "fina", "defend_lexical.npz"),
+)
+DEFEND_LEXICAL_MAX_RECALL_LOSS = float(os.environ.get("DEFEND_LEXICAL_MAX_RECALL_LOSS", "0.005"))
+
+# Market data settings
+PRICE_HISTORY_DIR = os.environ.get(
+    "PRICE_HISTORY_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "fina", "price_history"),
+)
+PRICE_HISTORY_SOURCE = os.environ.get("PRICE_HISTORY_SOURCE", "VCI")
+# How long today's still-forming bar is served from the store before it is fetched again
+PRICE_HISTORY_LIVE_TTL_SECONDS = int(os.environ.get("PRICE_HISTORY_LIVE_TTL_SECONDS", "900"))
+DEFAULT_PRICE_INTERVAL = "1D"
+TRADING_DAYS_PER_YEAR = 252
+RISK_FREE_RATE = float(os.environ.get("RISK_FREE_RATE", "0.03"))  # annual, used for Sharpe ratios
+
+# Provider record/replay ("off", "record" or "replay")
+PROVIDER_REPLAY_MODE = os.environ.get("PROVIDER_REPLAY_MODE", "off").lower()
+PROVIDER_FIXTURE_DIR = os.environ.get(
+    "PROVIDER_FIXTURE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fixtures", "providers"),
+)
+PROVIDER_REPLAY_LATENCY_MS = float(os.environ.get("PROVIDER_REPLAY_LATENCY_MS", "0"))
+PROVIDER_REPLAY_ERROR_RATE = float(os.environ.get("PROVIDER_REPLAY_ERROR_RATE", "0"))
+PROVIDER_TIMEOUT_SECONDS = float(os.environ.get("PROVIDER_TIMEOUT_SECONDS", "30"))  # per HTTP provider request
+
+# Tool result encoding
+RESULT_FLOAT_PRECISION = 2  # decimals, or significant digits for values below 1
+RESULT_MAX_ROWS = int(os.environ.get("RESULT_MAX_ROWS", "100"))
+# Rows shown to the CRUD argument extractor to pick the target of an edit or delete.
+CRUD_CANDIDATE_LIMIT = int(os.environ.get("CRUD_CANDIDATE_LIMIT", "20"))
+
+# Valuation settings
+VALUATION_INTERVAL_SECONDS = int(os.environ.get("VALUATION_INTERVAL_SECONDS", "900"))  # for `python -m fina.tools.valuation schedule`
+# Crypto is priced in this currency; it must match the wallets' currency that
+# amount_invested is recorded in (stocks are always priced in VND).
+VALUATION_CRYPTO_CONVERT = os.environ.get("VALUATION_CRYPTO_CONVERT", "VND")
+
+# Intent routing
+INTENT_ROUTER_ENABLED = os.environ.get("INTENT_ROUTER_ENABLED", "true").lower() in ("1", "true", "yes")
+INTENT_ROUTER_ENCODER = os.environ.get("INTENT_ROUTER_ENCODER", "hashed")  # "hashed" or "embedding"
+# The confidence thresholds below which the LLM classifies are calibrated on the
+# examples (leave-one-out) so that routed messages reach these accuracies;
+# insert/edit/delete intents change data, so they need a stricter bar.
+INTENT_ROUTER_TARGET_ACCURACY = float(os.environ.get("INTENT_ROUTER_TARGET_ACCURACY", "0.97"))
+INTENT_ROUTER_WRITE_TARGET_ACCURACY = float(os.environ.get("INTENT_ROUTER_WRITE_TARGET_ACCURACY", "1.0"))
+# Write intents also need at least this much more confidence than the other intents.
+INTENT_ROUTER_WRITE_MARGIN = float(os.environ.get("INTENT_ROUTER_WRITE_MARGIN", "0.15"))
+# Fixed thresholds that override the calibrated ones.
+INTENT_ROUTER_THRESHOLD = os.environ.get("INTENT_ROUTER_THRESHOLD")
+INTENT_ROUTER_WRITE_THRESHOLD = os.environ.get("INTENT_ROUTER_WRITE_THRESHOLD")
+INTENT_ROUTER_TEMPERATURE = float(os.environ.get("INTENT_ROUTER_TEMPERATURE", "0.05"))
+
+# Gemini context caching of static agent instructions
+CONTEXT_CACHE_ENABLED = os.environ.get("CONTEXT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CONTEXT_CACHE_TTL_SECONDS = int(os.environ.get("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+CONTEXT_CACHE_REFRESH_MARGIN_SECONDS = int(os.environ.get("CONTEXT_CACHE_REFRESH_MARGIN_SECONDS", "600"))
+CONTEXT_CACHE_RETRY_SECONDS = int(os.environ.get("CONTEXT_CACHE_RETRY_SECONDS", "300"))  # backoff after a failed create
+CONTEXT_CACHE_MIN_TOKENS = int(os.environ.get("CONTEXT_CACHE_MIN_TOKENS", "1024"))  # Gemini's minimum cacheable size
@@ -1 +1 @@
-from .agent import database_agent
\ No newline at end of file
+from .agent import crud_dispatch_agent, database_agent
\ No newline at end of file
@@ -1,7 +1,30 @@
+import asyncio
+import json
+from datetime import date
+from typing import AsyncGenerator
+
 from google.adk import Agent
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.events import Event, EventActions
+from google.genai import types
 from ...config import MODEL
 from ...tools.callback_logging import log_query_to_model, log_model_response
-from ...tools.utils import append_to_state
+from ...tools.context_cache import use_context_cache
+from ...tools.utils import append_to_state, set_state
+from ...tools.crud_dispatch import (
+    DELETE_INTENTS,
+    READ_INTENTS,
+    TARGET_LOOKUPS,
+    confirmation_reply,
+    current_intent,
+    describe_arguments,
+    dispatch,
+    find_targets,
+    is_crud_intent,
+    parse_arguments,
+)
 from ...tools.database import (
     insert_wallet, 
     insert_investment, 
@@ -31,7 +54,8 @@ database_agent = Agent(
     name="database_agent",
     model=MODEL,
     description="An agent responsible for handling CRUD operations and financial analysis routing in the FINA system.",
-    instruction="""
+    # Static, so it is served from the context cache; per-turn state is in `instruction` below.
+    static_instruction="""
 You are the Database Agent in the FINA financial assistant system.
 Your primary responsibility is to interact with the user's financial database using the provided tools
 and to route tasks to the appropriate sub-agents when necessary.
@@ -40,7 +64,7 @@ and to route tasks to the appropriate sub-agents when necessary.
 
 ## INTENT HANDLING LOGIC
 
-You will receive a 'state' that includes 'intent' and 'query'.  
+You will receive a 'state' that includes 'intent' and 'query'; the current intent is given with the user's message.  
 Use the 'intent' field to determine which action to take.  
 Each intent directly maps to a specific tool or agent as follows:
 
@@ -59,6 +83,7 @@ Use these tools to insert new data:
     - type: type of investment (e.g., stock, crypto, bond)
     - amount_invested: amount invested
     - from_wallet: wallet used for the investment
+    - quantity: (optional) number of units bought, if the user mentions it
     
 - intent = 'insert_debt' → call tool `insert_debts`
   - Parameters:
@@ -121,6 +146,9 @@ Use these tools to read data from the database:
 - intent = 'read_investment' → call tool `read_investments`
 - intent = 'read_debt' → call tool `read_debts`
 - intent = 'read_transaction' → call tool `read_transactions`
+- All read tools accept optional `fields` (list of columns to return) and `limit` (max rows).
+  Request only the columns needed to answer the user, e.g. `read_wallets(fields=["name", "balance"])`.
+  Results are tables: {"columns": [...], "rows": [[...]]}; "truncated": true means more rows exist.
 ---
 
 ### TAX ACTION
@@ -132,12 +160,12 @@ If intent = 'tax':
 
 ### INVEST / PLANNER ACTIONS
 If intent is one of ['invest', 'planner']:
-1. Call the tool `financial_summary` to summarize financial data.
-2. Store the summary in the system state using `append_to_state('summary', summary_data)`.
-   - `append_to_state` Parameters:
-     - key: the state key to append to (e.g., 'summary')
-     - value: the data to append
-3. If intent = 'invest', route the task to the **invest_agent**, if intent = 'planner', route to the **planner_agent**.
+1. The financial summary is normally prefetched into state['summary'] before you run; the prefetched keys are given with the user's message.
+   Only if 'summary' is not among them, call the tool `financial_summary` and store the result with `set_state('summary', summary_data)`.
+   - `set_state` Parameters:
+     - field: the state key to replace (e.g., 'summary')
+     - response: the new value
+2. If intent = 'invest', route the task to the **invest_agent**, if intent = 'planner', route to the **planner_agent**.
 
 ---
 
@@ -161,7 +189,11 @@ If intent is 'research':
   "I’m sorry, I could not identify the correct action for your request."
   
     """,
-    before_model_callback=log_query_to_model,
+    instruction="""
+Current intent: {intent?}
+Prefetched state keys: {prefetched?}
+""",
+    before_model_callback=[log_query_to_model, use_context_cache],
     after_model_callback=log_model_response,
     tools=[
         # Insert
@@ -187,6 +219,7 @@ If intent is 'research':
         # Financial summary & State utils
         financial_summary,
         append_to_state,
+        set_state,
     ],
     sub_agents=[
         research_agent,
@@ -196,3 +229,185 @@ If intent is 'research':
         planner_agent,
     ],
 )
+
+
+def _argument_instruction(context: ReadonlyContext) -> str:
+    intent = current_intent(context.state)
+    candidates = context.state.get("crud_candidates")
+    instruction = f"""
+You extract the arguments of a database operation from the user's latest message in the FINA financial assistant.
+Intent: {intent}
+Today's date: {date.today().isoformat()}
+
+{describe_arguments(intent)}
+"""
+    if candidates is not None:
+        instruction += f"""
+Candidate rows, newest first (pick the id or name of the row the user means):
+{json.dumps(candidates, ensure_ascii=False, default=str)}
+"""
+    instruction += """
+Reply with a single JSON object mapping parameter names to values and nothing else.
+Use numbers for amounts (e.g. "50k" -> 50000, "2 triệu" -> 2000000) and ISO dates.
+For `new_data`, give an object with only the fields to change.
+If a required value is missing and cannot be inferred, reply {"question": "<ask the user for it, in their language>"} instead.
+"""
+    return instruction
+
+
+def _responder_instruction(context: ReadonlyContext) -> str:
+    return f"""
+You are the FINA financial assistant. Answer the user's latest message using only this data from their database.
+Reply in the user's language, concisely; use a short list or table when there are several rows.
+
+{json.dumps(context.state.get("crud_result"), ensure_ascii=False, default=str)}
+"""
+
+
+crud_argument_agent = LlmAgent(
+    name="crud_argument_agent",
+    model=MODEL,
+    description="Extracts the arguments of a CRUD database operation as JSON.",
+    instruction=_argument_instruction,
+    generate_content_config=types.GenerateContentConfig(temperature=0),
+    disallow_transfer_to_parent=True,
+    disallow_transfer_to_peers=True,
+    before_model_callback=log_query_to_model,
+    after_model_callback=log_model_response,
+)
+
+crud_responder_agent = LlmAgent(
+    name="crud_responder_agent",
+    model=MODEL,
+    description="Answers the user from the result of a database read.",
+    instruction=_responder_instruction,
+    disallow_transfer_to_parent=True,
+    disallow_transfer_to_peers=True,
+    before_model_callback=log_query_to_model,
+    after_model_callback=log_model_response,
+)
+
+
+def _format_write_reply(result: dict) -> str:
+    if result["status"] != "success":
+        return f"Sorry, I could not complete that: {result['message']}"
+    details = ", ".join(f"{key}={value}" for key, value in result["arguments"].items())
+    return f"Done: {result['intent'].replace('_', ' ')} ({details})."
+
+
+def _format_confirmation(intent: str, arguments: dict, candidates: list) -> str:
+    details = ", ".join(f"{key}={value}" for key, value in arguments.items())
+    targets = set(arguments.values())
+    row = next((row for row in candidates or [] if {row.get("id"), row.get("name")} & targets), None)
+    if row:
+        details += "; " + ", ".join(f"{key}: {value}" for key, value in row.items())
+    return f'Please confirm: {intent.replace("_", " ")} ({details}). Reply "yes" to delete it or "no" to cancel.'
+
+
+def _user_text(ctx: InvocationContext) -> str:
+    content = ctx.user_content
+    return "\n".join(part.text for part in content.parts if part.text) if content and content.parts else ""
+
+
+class CrudDispatchAgent(BaseAgent):
+    """
+    Runs CRUD intents without the database_agent's routing prompt.
+
+    Read intents call their tool directly and use one LLM call to phrase the
+    answer; insert/edit/delete intents use one LLM call to extract the
+    arguments and then call their tool directly. Deletes are stored in
+    `pending_crud` and only run once the user confirms them in their next
+    message. Every other intent (tax, invest, planner, visualize, research,
+    unknown) goes to `fallback_agent`.
+    """
+
+    argument_agent: LlmAgent
+    responder_agent: LlmAgent
+    fallback_agent: BaseAgent
+
+    def __init__(self, name: str, argument_agent: LlmAgent, responder_agent: LlmAgent, fallback_agent: BaseAgent, description: str = ""):
+        super().__init__(
+            name=name,
+            description=description,
+            argument_agent=argument_agent,
+            responder_agent=responder_agent,
+            fallback_agent=fallback_agent,
+            sub_agents=[argument_agent, responder_agent, fallback_agent],
+        )
+
+    def _event(self, ctx: InvocationContext, state_delta: dict = None, text: str = None) -> Event:
+        return Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(text=text)]) if text else None,
+            actions=EventActions(state_delta=state_delta or {}),
+        )
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        pending = ctx.session.state.get("pending_crud")
+        if pending:
+            reply = confirmation_reply(_user_text(ctx))
+            if reply is True:
+                result = await asyncio.to_thread(dispatch, pending["intent"], pending["arguments"])
+                yield self._event(
+                    ctx, {"crud_result": result, "crud_candidates": None, "pending_crud": None}, _format_write_reply(result)
+                )
+                return
+            if reply is False:
+                yield self._event(ctx, {"crud_candidates": None, "pending_crud": None}, "Cancelled, nothing was deleted.")
+                return
+            # Any other message drops the pending delete and is handled as usual.
+            yield self._event(ctx, {"pending_crud": None})
+
+        intent = current_intent(ctx.session.state)
+        if not is_crud_intent(intent):
+            async for event in self.fallback_agent.run_async(ctx):
+                yield event
+            return
+
+        if intent in READ_INTENTS:
+            result = await asyncio.to_thread(dispatch, intent)
+            yield self._event(ctx, {"crud_result": result})
+            async for event in self.responder_agent.run_async(ctx):
+                yield event
+            return
+
+        if intent in TARGET_LOOKUPS:
+            rows = await asyncio.to_thread(find_targets, intent, _user_text(ctx))
+            yield self._event(ctx, {"crud_candidates": rows})
+
+        # The extractor's JSON is consumed here rather than shown to the user.
+        output = ""
+        async for event in self.argument_agent.run_async(ctx):
+            if event.is_final_response() and event.content and event.content.parts:
+                output = "".join(part.text or "" for part in event.content.parts)
+            elif not event.content:
+                yield event
+        try:
+            arguments = parse_arguments(output)
+        except ValueError as e:
+            result = {"status": "error", "message": str(e), "intent": intent}
+            yield self._event(ctx, {"crud_result": result}, _format_write_reply(result))
+            return
+        if "question" in arguments:
+            yield self._event(ctx, text=str(arguments["question"]))
+            return
+
+        if intent in DELETE_INTENTS:
+            pending = {"intent": intent, "arguments": arguments}
+            candidates = ctx.session.state.get("crud_candidates")
+            yield self._event(ctx, {"pending_crud": pending}, _format_confirmation(intent, arguments, candidates))
+            return
+
+        result = await asyncio.to_thread(dispatch, intent, arguments)
+        yield self._event(ctx, {"crud_result": result, "crud_candidates": None}, _format_write_reply(result))
+
+
+crud_dispatch_agent = CrudDispatchAgent(
+    name="crud_dispatch_agent",
+    argument_agent=crud_argument_agent,
+    responder_agent=crud_responder_agent,
+    fallback_agent=database_agent,
+    description="Runs CRUD intents directly and routes everything else to the database agent.",
+)
@@ -1 +0,0 @@
-from .agent import defend_agent
\ No newline at end of file
@@ -10,6 +10,10 @@ from ...tools.investment_tools import (
     get_investment_summary, 
     suggest_investment_portfolio, 
 )
+from ...tools.price_history import get_price_history
+from ...tools.valuation import mark_to_market
+from ...tools.portfolio_analytics import optimize_portfolio
+from ...tools.backtest import backtest_allocations
 
 invest_agent = Agent(
     name="invest_agent",
@@ -18,20 +22,23 @@ invest_agent = Agent(
     instruction="""
 You are the **Invest Agent** in the FINA financial assistant system.  
 Your primary responsibility is to provide financial investment insights, including cryptocurrency and stock market data, 
-and generate personalized investment recommendations based on the user's summarized financial data {summary_data?}.
+and generate personalized investment recommendations based on the user's summarized financial data.
 
 ---
 
 ## INPUT CONTEXT
 Read data from these state to clarify the context:
-- {query?}: the user's request 
-- {summary_data?}: a financial overview of the user's situation
+- the user's request: {query?}
+- a financial overview of the user's situation: {summary?}
+- top 10 cryptocurrencies, prefetched: {top_crypto?}
+- top 10 VN stocks, prefetched: {top_vn_stocks?}
+When the top lists are already here, use them instead of calling `get_top_10_crypto()` or `get_top_10_vn_stocks()` again.
 ---
 
 ## ACTION RULES
 
-Analyze the user's {query?} and select the most appropriate action or tool to call. Then combine the data of 
-{summary_data?} with tools output to provide tailored responses.
+Analyze the user's request and select the most appropriate action or tool to call. Then combine the financial
+overview with tools output to provide tailored responses.
 Use the following mapping logic:
 
 1. If the user requests information about cryptocurrencies:
@@ -43,6 +50,12 @@ Use the following mapping logic:
 3. If the user wants to compare assets (mix of crypto and stocks): use `compare_assets(asset_list)`
 4. If the user wants a market overview: use `get_investment_summary()`
 5. If the user wants personalized investment portfolio suggestions based on their financial profile: use `suggest_investment_portfolio(user_profile)`
+   - Include "assets" (candidate VN tickers) and "holdings" ({ticker: value}) in user_profile when known to get an optimized stock allocation
+6. If the user asks about the price history or past performance of a VN stock: use `get_price_history(symbol, start_date, end_date, interval)`
+7. If the user asks how their own investments are performing right now: use `mark_to_market()` to refresh current values and profit
+8. If the user asks for risk/return analytics or an optimal allocation across specific VN stocks: use `optimize_portfolio(symbols, method, risk)`
+9. Before recommending a stock allocation, show how it would have performed: use `backtest_allocations(weight_sets, start_date, end_date, rebalance)`
+   - Pass every allocation you want to compare in one `weight_sets` dict instead of calling the tool once per allocation
 ---
 
 """,
@@ -56,5 +69,9 @@ Use the following mapping logic:
         compare_assets,
         get_investment_summary, 
         suggest_investment_portfolio, 
+        get_price_history,
+        mark_to_market,
+        optimize_portfolio,
+        backtest_allocations,
     ],
 )
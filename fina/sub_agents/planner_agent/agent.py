@@ -16,7 +16,8 @@ planner_agent = Agent(
 You are the Planner Agent in the FINA financial assistant system.
 Your job is to help users plan and manage their finances effectively.
 
-You receive the user's intent and the current financial summary (from state['summary']).
+You receive the user's intent and the current financial summary (from state['summary']):
+{summary?}
 Based on the query, perform the correct planning action:
 
 ---
@@ -2,7 +2,7 @@ from google.adk import Agent
 from ...config import MODEL
 
 from ...tools.callback_logging import log_query_to_model, log_model_response
-from ...tools.utils import append_to_state
+from ...tools.utils import set_state
 from ...tools.rag_query import rag_query
 
 tax_agent = Agent(
@@ -16,7 +16,11 @@ tax_agent = Agent(
        - Parameters:
          - corpus_name: The name of the corpus to query (required, but can be empty to use current corpus)
          - query: The text question to ask 
-    Then, you should use the 'append_to_state' tool to store the retrieved information into the 'context' state.
+         - queries: Optional list of further sub-questions. When a question has several parts
+           (e.g. deductions, tax brackets and filing deadlines), pass them all in one call
+           instead of calling 'rag_query' once per part.
+    'rag_query' stores the compressed retrieved text in the 'context' state itself, replacing the previous context.
+    Only use the 'set_state' tool to overwrite 'context' if you need to keep a shorter summary of it; never append to it.
     Combine the user's {query?} with the retrieved context to provide accurate and relevant tax information or calculations.
     Always ensure that your responses are compliant with current tax regulations and guidelines.
     """,
@@ -24,6 +28,6 @@ tax_agent = Agent(
     after_model_callback=log_model_response,
     tools=[
         rag_query,
-        append_to_state,
+        set_state,
     ],
 )
\ No newline at end of file
@@ -1,16 +1,25 @@
+from typing import AsyncGenerator
+
 from ...tools.callback_logging import log_query_to_model, log_model_response
-from ...tools.utils import append_to_state
+from ...tools.crud_dispatch import confirmation_reply
+from ...tools.intent_router import classify_intent
+from ...tools.utils import set_state
 
 from google.adk import Agent
-from ...config import MODEL
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from ...config import INTENT_ROUTER_ENABLED, MODEL
 
-user_context_agent = Agent(
-    name="user_context_agent",
+user_context_llm_agent = Agent(
+    name="user_context_llm_agent",
     model=MODEL,
     description="Extract and define user intent from user input within the FINA financial assistant system.",
-    instruction="""
+    # Fully static, but with its tools (~750 tokens) still under Gemini's
+    # 1024-token caching minimum, so it does not use the context cache.
+    static_instruction="""
     You are a user context analysis agent in the FINA financial assistant system.
-    Your main goal is to classify the user's query into one of the defined intents and store it using 'append_to_state'.
+    Your main goal is to classify the user's query into one of the defined intents and store it using 'set_state'.
     You must store both the detected intent and the raw query text.
 
     ---
@@ -69,11 +78,50 @@ user_context_agent = Agent(
 
     ---
     ## ACTIONS:
-    1. Use 'append_to_state' to store the detected intent in the 'intent' state.
+    1. Use 'set_state' to store the detected intent in the 'intent' state, replacing the previous one.
     2. If intent cannot be determined, store 'unknown' and respond with a clarification request like:
        "I didn’t quite understand your request. Could you please specify what you want to do (e.g., view data, invest, or plan spending)?"
     """,
     before_model_callback=log_query_to_model,
     after_model_callback=log_model_response,
-    tools=[append_to_state],
+    tools=[set_state],
+)
+
+
+class IntentRouterAgent(BaseAgent):
+    """
+    Writes the intent of the user's message to state with the local intent
+    router, and only runs the LLM classifier when the router is not confident.
+    Answers to a pending delete confirmation are not classified.
+    """
+
+    llm_agent: LlmAgent
+
+    def __init__(self, name: str, llm_agent: LlmAgent, description: str = ""):
+        super().__init__(name=name, description=description, llm_agent=llm_agent, sub_agents=[llm_agent])
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        content = ctx.user_content
+        text = "\n".join(part.text for part in content.parts if part.text) if content and content.parts else ""
+        # A yes/no answer to a pending delete keeps the intent of that delete.
+        if ctx.session.state.get("pending_crud") and confirmation_reply(text) is not None:
+            return
+        if INTENT_ROUTER_ENABLED and text.strip():
+            intent, confidence = classify_intent(text)
+            if intent is not None:
+                yield Event(
+                    invocation_id=ctx.invocation_id,
+                    author=self.name,
+                    branch=ctx.branch,
+                    actions=EventActions(state_delta={"intent": intent, "intent_confidence": round(confidence, 4)}),
+                )
+                return
+        async for event in self.llm_agent.run_async(ctx):
+            yield event
+
+
+user_context_agent = IntentRouterAgent(
+    name="user_context_agent",
+    llm_agent=user_context_llm_agent,
+    description=user_context_llm_agent.description,
 )
@@ -12,8 +12,10 @@ from .rag_query import (
     list_corpora, 
     rag_query, 
 )
+from .rag_cache import get_rag_cache_stats
 from .utils import (
     append_to_state, 
+    set_state,
     get_corpus_resource_name, 
     check_corpus_exists, 
     set_current_corpus,
@@ -59,12 +61,33 @@ from .investment_tools import (
     suggest_investment_portfolio, 
 )
 
+from .price_history import (
+    get_price_history,
+)
+
+from .valuation import (
+    mark_to_market,
+)
+
+from .portfolio_analytics import (
+    optimize_portfolio,
+)
+
+from .backtest import (
+    backtest_allocations,
+)
+
 from .visualize_tools import (
     visualize_transactions
 )
 
 from .defend_tools import (
     classify_prompt_safety,
+    classify_prompt_safety_batch,
+    get_verdict_cache_stats,
+    get_screening_stats,
+    evaluate_cascade,
+    get_model_stats,
 )   
 
 __all__ = [
@@ -72,6 +95,7 @@ __all__ = [
     "log_model_response",
     "rag_query",
     "append_to_state",
+    "set_state",
     "get_corpus_resource_name",
     "check_corpus_exists",
     "set_current_corpus",
@@ -81,6 +105,7 @@ __all__ = [
     "delete_document",
     "get_corpus_info",
     "list_corpora",
+    "get_rag_cache_stats",
     "insert_wallet",
     "insert_investment",
     "insert_debts",
@@ -109,6 +134,15 @@ __all__ = [
     "compare_assets",
     "get_investment_summary",
     "suggest_investment_portfolio",
+    "get_price_history",
+    "mark_to_market",
+    "optimize_portfolio",
+    "backtest_allocations",
     "visualize_transactions",
     "classify_prompt_safety",
+    "classify_prompt_safety_batch",
+    "get_verdict_cache_stats",
+    "get_screening_stats",
+    "evaluate_cascade",
+    "get_model_stats",
 ]
\ No newline at end of file
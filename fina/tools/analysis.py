@@ -2,7 +2,7 @@ import os
 from supabase import create_client, Client
 from datetime import datetime 
 from datetime import timedelta
-from fina.tools.database import read_transactions
+from fina.tools.database import select_rows
 import pandas as pd
 
 url = os.getenv("SUPABASE_URL")
@@ -22,7 +22,7 @@ def get_transactions_range(period: str = 'month', wallet: str | None = None):
 
     wallet: optional wallet name to filter transactions by wallet.
 
-    The function reads transactions via `read_transactions()` and parses the
+    The function reads transactions via `select_rows()` and parses the
     'time' field (supports ISO strings with or without trailing 'Z').
     If no transactions match the filter, an empty DataFrame with the two
     columns is returned.
@@ -56,7 +56,7 @@ def get_transactions_range(period: str = 'month', wallet: str | None = None):
         return None
 
     rows = []
-    for t in read_transactions() or []:
+    for t in select_rows("transactions", ["time", "wallet", "amount"]):
         if wallet and (t.get('wallet') != wallet):
             continue
         t_time = _parse_iso_string(t.get('time'))
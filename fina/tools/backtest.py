@@ -0,0 +1,193 @@
+"""
+Vectorized allocation backtester on top of the local price store.
+
+Holdings are fixed between rebalance dates, so the value of a portfolio on any
+day is its value at the last rebalance times the price-relative of each asset
+since then, weighted by the target weights. That turns the whole simulation
+into a few matrix products over all days and all weight sets at once.
+"""
+
+import logging
+from typing import Dict
+
+import numpy as np
+
+from ..config import TRADING_DAYS_PER_YEAR
+from .portfolio_analytics import MISSING_HISTORY_HINT, annualized_stats, load_price_matrix, max_drawdown
+
+logger = logging.getLogger(__name__)
+
+REBALANCE_FREQUENCIES = ("none", "daily", "weekly", "monthly", "quarterly", "yearly")
+
+_SECONDS_PER_YEAR = 365.25 * 86400
+
+
+def rebalance_indices(times: np.ndarray, rebalance: str) -> np.ndarray:
+    """
+    Indices of the bars at whose close the portfolio is rebalanced: the first
+    bar, then the first bar of every new period.
+    """
+    if rebalance not in REBALANCE_FREQUENCIES:
+        raise ValueError(f"Invalid rebalance '{rebalance}'. Expected one of: {', '.join(REBALANCE_FREQUENCIES)}")
+    n = times.shape[0]
+    if rebalance == "none" or n == 0:
+        return np.zeros(1, dtype=np.int64)
+    if rebalance == "daily":
+        return np.arange(n)
+
+    days = np.asarray(times, dtype=np.int64).astype("datetime64[s]").astype("datetime64[D]")
+    if rebalance == "weekly":
+        # 1970-01-01 was a Thursday; shift so weeks start on Monday.
+        key = (days.astype(np.int64) + 3) // 7
+    elif rebalance == "monthly":
+        key = days.astype("datetime64[M]").astype(np.int64)
+    elif rebalance == "quarterly":
+        key = days.astype("datetime64[M]").astype(np.int64) // 3
+    else:
+        key = days.astype("datetime64[Y]").astype(np.int64)
+    return np.concatenate([[0], np.flatnonzero(key[1:] != key[:-1]) + 1])
+
+
+def run_backtest(
+    times: np.ndarray,
+    prices: np.ndarray,
+    weights: np.ndarray,
+    rebalance: str = "monthly",
+    initial_value: float = 1.0,
+) -> Dict[str, np.ndarray]:
+    """
+    Backtest K weight sets over a (T, N) price matrix in one vectorized pass.
+
+    Args:
+        times: (T,) int64 epoch seconds
+        prices: (T, N) close prices
+        weights: (K, N) target weights, each row summing to 1
+        rebalance: one of REBALANCE_FREQUENCIES
+        initial_value: starting portfolio value
+
+    Returns:
+        dict of arrays: equity (T, K), cagr (K,), max_drawdown (K,),
+        turnover (K,) as annualized one-way turnover, plus volatility and Sharpe.
+    """
+    weights = np.atleast_2d(weights)
+    anchors = rebalance_indices(times, rebalance)
+    t_count = prices.shape[0]
+
+    # Each bar t > 0 is valued from the last rebalance strictly before it.
+    anchor_of = np.zeros(t_count, dtype=np.int64)
+    anchor_of[1:] = anchors[np.searchsorted(anchors, np.arange(1, t_count), side="left") - 1]
+
+    # Growth of every weight set over each completed holding period.
+    period_relative = prices[anchors[1:]] / prices[anchors[:-1]]  # (J, N)
+    period_growth = period_relative @ weights.T  # (J, K)
+    anchor_values = initial_value * np.vstack([
+        np.ones((1, weights.shape[0])),
+        np.cumprod(period_growth, axis=0),
+    ])  # (J + 1, K)
+
+    anchor_position = np.searchsorted(anchors, anchor_of)
+    equity = anchor_values[anchor_position] * ((prices / prices[anchor_of]) @ weights.T)
+
+    # Weights drift during each holding period; rebalancing trades them back.
+    drifted = weights[None, :, :] * period_relative[:, None, :]  # (J, K, N)
+    drifted /= drifted.sum(axis=2, keepdims=True)
+    total_turnover = 0.5 * np.abs(weights[None, :, :] - drifted).sum(axis=2).sum(axis=0)
+
+    years = max((times[-1] - times[0]) / _SECONDS_PER_YEAR, 1e-9)
+    stats = annualized_stats(equity[1:] / equity[:-1] - 1.0, TRADING_DAYS_PER_YEAR)
+    return {
+        "equity": equity,
+        "cagr": (equity[-1] / initial_value) ** (1.0 / years) - 1.0,
+        "max_drawdown": max_drawdown(equity),
+        "turnover": total_turnover / years,
+        "annual_volatility": stats["annual_volatility"],
+        "sharpe_ratio": stats["sharpe_ratio"],
+    }
+
+
+def backtest_allocations(
+    weight_sets: Dict[str, Dict[str, float]],
+    start_date: str,
+    end_date: str = "",
+    rebalance: str = "monthly",
+    initial_value: float = 1.0,
+    max_points: int = 24,
+) -> dict:
+    """
+    Backtest one or more target allocations of VN stocks on historical prices.
+    All weight sets are simulated together in a single call.
+
+    Args:
+        weight_sets (dict): Allocations by name, e.g.
+                            {"conservative": {"VNM": 0.6, "ACB": 0.4}, "growth": {"FPT": 0.7, "MWG": 0.3}}
+        start_date (str): First date of the backtest, ISO format (YYYY-MM-DD)
+        end_date (str): Last date of the backtest, ISO format. Empty means today.
+        rebalance (str): One of "none", "daily", "weekly", "monthly", "quarterly", "yearly"
+        initial_value (float): Starting portfolio value
+        max_points (int): Number of points of each equity curve to return
+
+    Returns:
+        dict: Equity curve, CAGR, max drawdown and turnover for each allocation
+    """
+    try:
+        if not weight_sets:
+            return {"status": "error", "message": "No weight sets provided"}
+
+        names = list(weight_sets)
+        symbols = list(dict.fromkeys(s.upper() for ws in weight_sets.values() for s in ws))
+        times, prices, kept, missing = load_price_matrix(symbols, start_date, end_date or None)
+        if not kept or prices.shape[0] < 2:
+            return {
+                "status": "error",
+                "message": "Not enough price history for the requested assets and dates."
+                + (MISSING_HISTORY_HINT if missing else ""),
+                "missing_symbols": missing,
+            }
+
+        column = {symbol: i for i, symbol in enumerate(kept)}
+        weights = np.zeros((len(names), len(kept)))
+        for k, name in enumerate(names):
+            for symbol, weight in weight_sets[name].items():
+                if symbol.upper() in column:
+                    weights[k, column[symbol.upper()]] = float(weight)
+        totals = weights.sum(axis=1, keepdims=True)
+        valid = totals[:, 0] > 0
+        if not valid.any():
+            return {
+                "status": "error",
+                "message": "None of the weight sets contain assets with price history",
+                "missing_symbols": missing,
+            }
+        weights[valid] /= totals[valid]
+
+        result = run_backtest(times, prices, weights[valid], rebalance, initial_value)
+
+        point_idx = np.unique(np.linspace(0, len(times) - 1, max(min(max_points, len(times)), 2)).astype(int))
+        dates = times[point_idx].astype("datetime64[s]").astype("datetime64[D]").astype(str)
+        backtests = {}
+        for k, name in enumerate(n for n, ok in zip(names, valid) if ok):
+            backtests[name] = {
+                "weights": {s: round(float(w), 4) for s, w in zip(kept, weights[valid][k]) if w > 0},
+                "final_value": round(float(result["equity"][-1, k]), 4),
+                "cagr": round(float(result["cagr"][k]), 4),
+                "max_drawdown": round(float(result["max_drawdown"][k]), 4),
+                "annual_turnover": round(float(result["turnover"][k]), 4),
+                "annual_volatility": round(float(result["annual_volatility"][k]), 4),
+                "sharpe_ratio": round(float(result["sharpe_ratio"][k]), 4),
+                "equity_curve": [
+                    [str(d), round(float(v), 4)] for d, v in zip(dates, result["equity"][point_idx, k])
+                ],
+            }
+
+        return {
+            "status": "success",
+            "message": f"Backtested {len(backtests)} allocation(s) from {dates[0]} to {dates[-1]} with {rebalance} rebalancing",
+            "rebalance": rebalance,
+            "backtests": backtests,
+            "skipped": [n for n, ok in zip(names, valid) if not ok],
+            "missing_symbols": missing,
+        }
+    except Exception as e:
+        error_msg = f"Error running backtest: {str(e)}"
+        logger.error(error_msg)
+        return {"status": "error", "message": error_msg}
@@ -0,0 +1,192 @@
+"""
+Gemini context caching of the agents' static request prefix.
+
+Agents that set `static_instruction` send the same system instruction and
+tool declarations on every turn; only their `instruction` (state such as the
+current intent) changes, and ADK sends that as user content. The
+`use_context_cache` before_model_callback stores that static prefix once as
+Gemini cached content and points each request at it with
+`config.cached_content`, so the prefix is neither re-sent nor re-billed at the
+full input-token rate.
+
+One cache per distinct prefix (model, system instruction, tools) is shared by
+all sessions of the process. It is created on the first request that needs it,
+because ADK only assembles the final system instruction (agent transfer
+rules, tool declarations) at request time. Its TTL is extended in the
+background once less than CONTEXT_CACHE_REFRESH_MARGIN_SECONDS remain, and an
+expired or deleted cache is recreated. Prefixes below CONTEXT_CACHE_MIN_TOKENS
+are never cached; when creation fails the prefix is sent uncached as before
+and creation is retried after CONTEXT_CACHE_RETRY_SECONDS. Each prefix has its
+own creation lock, so a slow create for one agent never blocks another.
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest
+from google.genai import types
+
+from ..config import (
+    CONTEXT_CACHE_ENABLED,
+    CONTEXT_CACHE_MIN_TOKENS,
+    CONTEXT_CACHE_REFRESH_MARGIN_SECONDS,
+    CONTEXT_CACHE_RETRY_SECONDS,
+    CONTEXT_CACHE_TTL_SECONDS,
+)
+from .utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# prefix key -> (cache name, expire time); None marks a prefix too small to cache
+_CACHES: Dict[str, Optional[Tuple[str, datetime]]] = {}
+# prefix key -> time before which a failed creation is not retried
+_RETRY_AFTER: Dict[str, datetime] = {}
+_CREATE_LOCKS: Dict[str, threading.Lock] = {}
+_CACHES_LOCK = threading.Lock()
+_REFRESHING: Dict[str, bool] = {}
+_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="context-cache")
+_CLIENT = None
+
+
+def _client():
+    global _CLIENT
+    if _CLIENT is None:
+        from google import genai
+
+        _CLIENT = genai.Client()
+    return _CLIENT
+
+
+def _prefix_key(llm_request: LlmRequest) -> str:
+    config = llm_request.config
+    digest = hashlib.sha256(llm_request.model.encode("utf-8"))
+    digest.update(repr(config.system_instruction).encode("utf-8"))
+    for tool in config.tools or []:
+        digest.update(tool.model_dump_json(exclude_none=True).encode("utf-8"))
+    if config.tool_config:
+        digest.update(config.tool_config.model_dump_json(exclude_none=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _prefix_tokens(llm_request: LlmRequest) -> int:
+    config = llm_request.config
+    text = repr(config.system_instruction) + "".join(repr(tool) for tool in config.tools or [])
+    return estimate_tokens(text)
+
+
+def _expire_time(cache: types.CachedContent) -> datetime:
+    if cache.expire_time:
+        return cache.expire_time
+    return datetime.now(timezone.utc) + timedelta(seconds=CONTEXT_CACHE_TTL_SECONDS)
+
+
+def _create(llm_request: LlmRequest, agent_name: str) -> Tuple[str, datetime]:
+    config = llm_request.config
+    cache = _client().caches.create(
+        model=llm_request.model,
+        config=types.CreateCachedContentConfig(
+            display_name=f"fina-{agent_name}",
+            system_instruction=config.system_instruction,
+            tools=config.tools,
+            tool_config=config.tool_config,
+            ttl=f"{CONTEXT_CACHE_TTL_SECONDS}s",
+        ),
+    )
+    logger.info(f"Created context cache {cache.name} for {agent_name}")
+    return cache.name, _expire_time(cache)
+
+
+def _refresh(key: str, name: str) -> None:
+    """Extend the TTL of a cache; forget it if it no longer exists."""
+    try:
+        cache = _client().caches.update(
+            name=name,
+            config=types.UpdateCachedContentConfig(ttl=f"{CONTEXT_CACHE_TTL_SECONDS}s"),
+        )
+        with _CACHES_LOCK:
+            _CACHES[key] = (name, _expire_time(cache))
+    except Exception as e:
+        logger.warning(f"Could not refresh context cache {name}, it will be recreated: {str(e)}")
+        with _CACHES_LOCK:
+            _CACHES.pop(key, None)
+    finally:
+        with _CACHES_LOCK:
+            _REFRESHING.pop(key, None)
+
+
+def _usable(key: str, now: datetime) -> Optional[str]:
+    """Name of the cache of `key` if it is still valid; call with _CACHES_LOCK held."""
+    entry = _CACHES.get(key)
+    if entry is None or entry[1] - now <= timedelta(seconds=30):
+        return None
+    name, expire_time = entry
+    if expire_time - now < timedelta(seconds=CONTEXT_CACHE_REFRESH_MARGIN_SECONDS) and not _REFRESHING.get(key):
+        _REFRESHING[key] = True
+        _POOL.submit(_refresh, key, name)
+    return name
+
+
+def _cache_name(llm_request: LlmRequest, agent_name: str) -> Optional[str]:
+    key = _prefix_key(llm_request)
+    now = datetime.now(timezone.utc)
+    with _CACHES_LOCK:
+        if key in _CACHES and _CACHES[key] is None:
+            return None
+        name = _usable(key, now)
+        if name is not None:
+            return name
+        if _RETRY_AFTER.get(key, now) > now:
+            return None
+        if _prefix_tokens(llm_request) < CONTEXT_CACHE_MIN_TOKENS:
+            _CACHES[key] = None
+            return None
+        create_lock = _CREATE_LOCKS.setdefault(key, threading.Lock())
+
+    # Concurrent first requests for one prefix make one cache; other prefixes do not wait.
+    with create_lock:
+        now = datetime.now(timezone.utc)
+        with _CACHES_LOCK:
+            name = _usable(key, now)
+            if name is not None or _RETRY_AFTER.get(key, now) > now:
+                return name
+        try:
+            created = _create(llm_request, agent_name)
+        except Exception as e:
+            logger.warning(
+                f"Context caching unavailable for {agent_name}, sending the prefix uncached "
+                f"and retrying in {CONTEXT_CACHE_RETRY_SECONDS}s: {str(e)}"
+            )
+            with _CACHES_LOCK:
+                _RETRY_AFTER[key] = now + timedelta(seconds=CONTEXT_CACHE_RETRY_SECONDS)
+            return None
+        with _CACHES_LOCK:
+            _CACHES[key] = created
+            _RETRY_AFTER.pop(key, None)
+        return created[0]
+
+
+async def use_context_cache(callback_context: CallbackContext, llm_request: LlmRequest):
+    """
+    before_model_callback that replaces the static request prefix with a cached-content reference.
+
+    Returns None so the request always goes to the model.
+    """
+    config = llm_request.config
+    if not CONTEXT_CACHE_ENABLED or config is None or not config.system_instruction or config.cached_content:
+        return None
+    # Cache creation is a blocking API call; keep it off the event loop.
+    name = await asyncio.to_thread(_cache_name, llm_request, callback_context.agent_name)
+    if name is None:
+        return None
+    # Gemini rejects requests that repeat the cached system instruction or tools.
+    config.system_instruction = None
+    config.tools = None
+    config.tool_config = None
+    config.cached_content = name
+    return None
@@ -0,0 +1,132 @@
+"""
+Token-budgeted compression of retrieved chunks.
+
+`rag_query` hits are full chunks, most of whose sentences do not bear on the
+question. `compress_results` keeps only the sentences that do:
+  1. chunks are split into sentences,
+  2. each sentence is scored by its term overlap with the queries (the
+     hybrid retriever's Vietnamese-aware terms), with a small bonus for
+     higher-ranked chunks,
+  3. near-duplicate sentences (term Jaccard similarity of at least
+     RAG_DUPLICATE_SIMILARITY) are dropped, which removes the overlap
+     between neighbouring chunks and repeated boilerplate,
+  4. the best sentences are kept until the token budget is spent and are
+     put back in document order.
+If no sentence shares a term with the queries, the opening sentences of the
+best chunk are kept instead.
+"""
+
+import re
+from typing import Any, Dict, List, Set, Tuple
+
+from ..config import (
+    RAG_COMPRESSED_TOKEN_BUDGET,
+    RAG_DUPLICATE_SIMILARITY,
+)
+from .rag_hybrid import tokenize_document, tokenize_query
+from .utils import estimate_tokens
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;:])\s+|\n+")
+_MIN_SENTENCE_CHARS = 20
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Split `text` into sentences.
+
+    Fragments shorter than a few words, such as "Điều 7." headings, are
+    joined to the sentence that follows them (or the last one).
+    """
+    sentences: List[str] = []
+    pending = ""
+    for piece in _SENTENCE_END.split(text):
+        piece = " ".join(piece.split())
+        if not piece:
+            continue
+        piece = f"{pending} {piece}".strip()
+        if len(piece) < _MIN_SENTENCE_CHARS:
+            pending = piece
+        else:
+            sentences.append(piece)
+            pending = ""
+    if pending:
+        if sentences:
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        else:
+            sentences.append(pending)
+    return sentences
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def compress_results(
+    queries: List[str],
+    results: List[Dict[str, Any]],
+    token_budget: int = RAG_COMPRESSED_TOKEN_BUDGET,
+    duplicate_similarity: float = RAG_DUPLICATE_SIMILARITY,
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Reduce the text of retrieval results to the sentences most relevant to `queries`.
+
+    Args:
+        queries: the questions the results were retrieved for
+        results: retrieval results, best first, each with a "text" field
+        token_budget: hard cap on the estimated tokens of all kept sentences
+        duplicate_similarity: sentences at least this similar to a kept one are dropped
+
+    Returns:
+        (results, stats): the results that kept at least one sentence, with
+        "text" replaced by those sentences, and original_tokens /
+        compressed_tokens estimates
+    """
+    query_terms: Set[str] = set()
+    for query in queries:
+        query_terms.update(tokenize_query(query))
+    # tokenize_document yields accented and folded terms, so folded query terms match too.
+    candidates = []
+    for rank, result in enumerate(results):
+        for position, sentence in enumerate(split_sentences(result.get("text", ""))):
+            terms = set(tokenize_document(sentence))
+            overlap = len(query_terms & terms)
+            if not overlap:
+                continue
+            score = overlap / (len(terms) ** 0.5) + 0.1 / (rank + 1)
+            candidates.append((score, rank, position, sentence, terms))
+    if not candidates and results:
+        # Nothing shares a term with the queries (e.g. a paraphrase matched by
+        # vector search only); keep the opening of the best chunk.
+        candidates = [
+            (-position, 0, position, sentence, set(tokenize_document(sentence)))
+            for position, sentence in enumerate(split_sentences(results[0].get("text", "")))
+        ]
+
+    kept: List[Tuple[int, int, str, Set[str]]] = []
+    tokens = 0
+    for score, rank, position, sentence, terms in sorted(candidates, key=lambda c: c[0], reverse=True):
+        if any(_jaccard(terms, other) >= duplicate_similarity for *_, other in kept):
+            continue
+        cost = estimate_tokens(sentence)
+        if tokens + cost > token_budget:
+            continue
+        tokens += cost
+        kept.append((rank, position, sentence, terms))
+
+    by_result: Dict[int, List[Tuple[int, str]]] = {}
+    for rank, position, sentence, _ in kept:
+        by_result.setdefault(rank, []).append((position, sentence))
+    compressed = [
+        {**results[rank], "text": " ".join(sentence for _, sentence in sorted(by_result[rank]))}
+        for rank in sorted(by_result)
+    ]
+    stats = {
+        "original_tokens": sum(estimate_tokens(result.get("text", "")) for result in results),
+        "compressed_tokens": tokens,
+    }
+    return compressed, stats
+
+
+def format_context(results: List[Dict[str, Any]]) -> str:
+    """Render compressed results as one context string with a source label per chunk."""
+    return "\n".join(f"[{result.get('source_name') or result.get('source_uri', '')}] {result['text']}" for result in results)
@@ -0,0 +1,269 @@
+"""
+Deterministic dispatch of CRUD intents to the database tools.
+
+Each insert_/edit_/delete_/read_ intent maps to exactly one function in
+database.py, so no LLM is needed to pick the tool. Read intents take no
+arguments and are called directly; for the others an LLM only extracts the
+arguments (described by `describe_arguments`), which `dispatch` checks and
+coerces to the types annotated on the tool before calling it.
+
+Edits and deletes name their target row. `find_targets` looks up the rows
+whose name columns contain a word of the user's message (the tables have no
+user column: each deployment has its own database), newest first, so the
+extractor picks from a short list rather than the whole table. Deletes are
+only run after the user confirms them (see `confirmation_reply`).
+"""
+
+import inspect
+import json
+import logging
+import re
+import types
+import typing
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..config import CRUD_CANDIDATE_LIMIT
+from .database import (
+    READ_ORDER,
+    delete_debt,
+    delete_investment,
+    delete_transaction,
+    delete_wallet,
+    insert_debts,
+    insert_investment,
+    insert_transaction,
+    insert_wallet,
+    read_debts,
+    read_investments,
+    read_transactions,
+    read_wallets,
+    select_rows,
+    update_debt,
+    update_investment,
+    update_transaction,
+    update_wallet,
+)
+
+logger = logging.getLogger(__name__)
+
+INTENT_TOOLS: Dict[str, Callable] = {
+    "insert_wallet": insert_wallet,
+    "insert_investment": insert_investment,
+    "insert_debt": insert_debts,
+    "insert_transaction": insert_transaction,
+    "edit_wallet": update_wallet,
+    "edit_investment": update_investment,
+    "edit_debt": update_debt,
+    "edit_transaction": update_transaction,
+    "delete_wallet": delete_wallet,
+    "delete_investment": delete_investment,
+    "delete_debt": delete_debt,
+    "delete_transaction": delete_transaction,
+    "read_wallet": read_wallets,
+    "read_investment": read_investments,
+    "read_debt": read_debts,
+    "read_transaction": read_transactions,
+}
+
+READ_INTENTS = {"read_wallet", "read_investment", "read_debt", "read_transaction"}
+DELETE_INTENTS = {"delete_wallet", "delete_investment", "delete_debt", "delete_transaction"}
+
+# entity -> (table, columns shown to the extractor, columns searched for the target's name)
+_TARGET_TABLES: Dict[str, Tuple[str, List[str], List[str]]] = {
+    "wallet": ("wallets", ["name", "type", "balance"], ["name", "type"]),
+    "investment": ("investments", ["id", "asset_name", "type", "amount_invested", "from_wallet", "start_date"], ["asset_name", "type"]),
+    "debt": ("debts", ["id", "name", "amount", "interest_rate", "due_date", "to_wallet"], ["name"]),
+    "transaction": ("transactions", ["id", "time", "wallet", "category", "type", "amount", "description"], ["category", "description", "wallet"]),
+}
+
+# Edits and deletes name their target by id or name; the extractor is shown
+# the candidate rows so it can pick it.
+TARGET_LOOKUPS: Dict[str, Tuple[str, List[str], List[str]]] = {
+    f"{action}_{entity}": lookup
+    for action in ("edit", "delete")
+    for entity, lookup in _TARGET_TABLES.items()
+}
+
+# Words of a request that never name a row.
+_STOPWORDS = {
+    "a", "an", "and", "at", "change", "correct", "debt", "delete", "edit", "expense", "fix", "for", "from",
+    "get", "i", "in", "income", "investment", "is", "it", "loan", "me", "modify", "my", "of", "on", "please",
+    "remove", "rid", "the", "to", "transaction", "update", "wallet", "with",
+    "bỏ", "các", "cập", "cho", "chỉnh", "của", "dịch", "đi", "đổi", "đầu", "giao", "khoản", "lại", "nhật",
+    "nợ", "sửa", "thành", "tôi", "tư", "và", "vay", "ví", "với", "xoá", "xóa",
+    "đồng", "nghìn", "ngàn", "triệu", "tỷ", "usd", "vnd",
+}
+_NUMBER = re.compile(r"^\d+([.,]\d+)*(k|tr|m)?$")
+
+_AFFIRMATIVE = {"yes", "y", "ok", "okay", "sure", "confirm", "có", "co", "ừ", "vâng", "đúng", "đồng ý", "xác nhận", "dong y", "xac nhan"}
+_NEGATIVE = {"no", "n", "cancel", "stop", "không", "khong", "hủy", "huỷ", "huy", "thôi", "thoi"}
+
+
+def current_intent(state: Dict[str, Any]) -> Optional[str]:
+    """The intent in state; append_to_state may have stored a list of them."""
+    intent = state.get("intent")
+    if isinstance(intent, list):
+        intent = intent[-1] if intent else None
+    return intent.strip() if isinstance(intent, str) else None
+
+
+def is_crud_intent(intent: Optional[str]) -> bool:
+    return intent in INTENT_TOOLS
+
+
+def search_terms(message: str) -> List[str]:
+    """Words of `message` that may name a row: no stopwords, amounts or one-letter words."""
+    words = re.findall(r"\w+", (message or "").lower())
+    return sorted({w for w in words if len(w) > 1 and w not in _STOPWORDS and not _NUMBER.match(w)})
+
+
+def find_targets(intent: str, message: str, limit: int = CRUD_CANDIDATE_LIMIT) -> List[Dict[str, Any]]:
+    """
+    Rows an edit or delete of `intent` may target, newest first.
+
+    Rows whose name columns contain a word of `message` are returned; when
+    none do, the newest rows are, so the extractor can still ask the user.
+    """
+    table, fields, search_columns = TARGET_LOOKUPS[intent]
+    terms = search_terms(message)
+    rows = []
+    if terms:
+        rows = select_rows(table, fields, READ_ORDER[table], search_columns=search_columns, terms=terms, limit=limit)
+    if not rows:
+        rows = select_rows(table, fields, READ_ORDER[table], limit=limit)
+    return rows
+
+
+def confirmation_reply(message: str) -> Optional[bool]:
+    """True if `message` confirms a pending operation, False if it cancels it, None if it is neither."""
+    words = re.findall(r"\w+", (message or "").lower())
+    if not words:
+        return None
+    lead = {words[0], " ".join(words[:2])}
+    if lead & _NEGATIVE:
+        return False
+    # "yes, but the other one" is a new request, not a confirmation.
+    if len(words) <= 3 and lead & _AFFIRMATIVE:
+        return True
+    return None
+
+
+def describe_arguments(intent: str) -> str:
+    """Parameter list of the intent's tool, for the argument-extraction prompt."""
+    tool = INTENT_TOOLS[intent]
+    lines = [f"Tool `{tool.__name__}`: {inspect.cleandoc(tool.__doc__ or '')}", "Parameters:"]
+    for name, parameter in inspect.signature(tool).parameters.items():
+        annotation = getattr(parameter.annotation, "__name__", str(parameter.annotation))
+        if parameter.default is inspect.Parameter.empty:
+            lines.append(f"- {name} ({annotation}, required)")
+        else:
+            lines.append(f"- {name} ({annotation}, optional, default {parameter.default!r})")
+    return "\n".join(lines)
+
+
+def parse_arguments(text: str) -> Dict[str, Any]:
+    """Parse the extractor's JSON object, tolerating a ```json fence around it."""
+    match = re.search(r"\{.*\}", text or "", re.DOTALL)
+    if not match:
+        raise ValueError(f"No JSON object in argument extraction output: {text!r}")
+    arguments = json.loads(match.group(0))
+    if not isinstance(arguments, dict):
+        raise ValueError("Argument extraction output is not a JSON object")
+    return arguments
+
+
+def _coerce(value: Any, annotation: Any) -> Any:
+    """Convert an extracted value to the annotated parameter type; ValueError if it cannot be."""
+    if typing.get_origin(annotation) in (typing.Union, types.UnionType):
+        options = [option for option in typing.get_args(annotation) if option is not type(None)]
+        annotation = options[0] if len(options) == 1 else inspect.Parameter.empty
+    if annotation in (int, float):
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise ValueError(f"expected a number, got {value!r}")
+        number = float(value.replace(",", "").strip()) if isinstance(value, str) else float(value)
+        if annotation is int:
+            if not number.is_integer():
+                raise ValueError(f"expected a whole number, got {value!r}")
+            return int(number)
+        return number
+    if annotation is str:
+        if isinstance(value, (dict, list)):
+            raise ValueError(f"expected text, got {value!r}")
+        return str(value)
+    if annotation is dict:
+        if isinstance(value, str):
+            value = json.loads(value)
+        if not isinstance(value, dict) or not value:
+            raise ValueError(f"expected an object of fields to change, got {value!r}")
+        return value
+    # Dates are passed on as ISO strings (some tools annotate them with the
+    # `datetime.date` method rather than a type).
+    if annotation in (datetime, date, datetime.date):
+        if not isinstance(value, str):
+            raise ValueError(f"expected an ISO date, got {value!r}")
+        datetime.fromisoformat(value)
+        return value
+    return value
+
+
+def dispatch(intent: str, arguments: Optional[Dict[str, Any]] = None) -> dict:
+    """
+    Call the database tool of a CRUD intent.
+
+    Args:
+        intent: one of INTENT_TOOLS
+        arguments: keyword arguments for the tool; unknown keys are dropped and
+                   the rest are converted to the annotated parameter types
+                   ("2000000" -> 2000000.0 for a float) or rejected
+
+    Returns:
+        dict: status, intent, tool, the arguments used and the tool's result
+    """
+    tool = INTENT_TOOLS.get(intent)
+    if tool is None:
+        return {"status": "error", "message": f"No database tool for intent '{intent}'", "intent": intent}
+
+    parameters = inspect.signature(tool).parameters
+    arguments = {key: value for key, value in (arguments or {}).items() if key in parameters and value is not None}
+    missing = [
+        name for name, parameter in parameters.items()
+        if parameter.default is inspect.Parameter.empty and name not in arguments
+    ]
+    if missing:
+        return {
+            "status": "error",
+            "message": f"Missing required argument(s) for {tool.__name__}: {', '.join(missing)}",
+            "intent": intent,
+            "tool": tool.__name__,
+            "arguments": arguments,
+        }
+    for name, value in list(arguments.items()):
+        try:
+            arguments[name] = _coerce(value, parameters[name].annotation)
+        except (TypeError, ValueError) as e:
+            return {
+                "status": "error",
+                "message": f"Invalid argument '{name}' for {tool.__name__}: {str(e)}",
+                "intent": intent,
+                "tool": tool.__name__,
+                "arguments": arguments,
+            }
+
+    try:
+        result = tool(**arguments)
+    except Exception as e:
+        error_msg = f"Error calling {tool.__name__}: {str(e)}"
+        logger.error(error_msg)
+        return {"status": "error", "message": error_msg, "intent": intent, "tool": tool.__name__, "arguments": arguments}
+
+    response = {"status": "success", "intent": intent, "tool": tool.__name__, "arguments": arguments}
+    if isinstance(result, str):
+        # Read tools return encoded JSON; keep it as data so it is not escaped again.
+        try:
+            result = json.loads(result)
+        except ValueError:
+            pass
+    if result is not None:
+        response["result"] = result
+    return response
@@ -3,6 +3,9 @@ from supabase import create_client, Client
 from datetime import datetime 
 from datetime import timedelta
 
+from ..config import RESULT_MAX_ROWS
+from .result_encoding import encode_result
+
 url = os.getenv("SUPABASE_URL")
 key = os.getenv("SUPABASE_KEY")
 supabase: Client = create_client(url, key)
@@ -26,7 +29,7 @@ def insert_wallet(name: str, type: str, balance: float = 0.0):
     }).execute()
     
 
-def insert_investment(asset_name: str, type: str, amount_invested: float, from_wallet: str, start_date: datetime = datetime.now().isoformat()): 
+def insert_investment(asset_name: str, type: str, amount_invested: float, from_wallet: str, start_date: datetime = datetime.now().isoformat(), quantity: float | None = None): 
     '''
     id: auto increment primary key
     asset_name: name of the asset
@@ -37,8 +40,9 @@ def insert_investment(asset_name: str, type: str, amount_invested: float, from_w
     profit_percentage: profit or loss percentage
     start_date: date when the investment was made
     from_wallet: wallet from which the investment was made
+    quantity: optional number of units bought, used to mark the position to market
     '''
-    supabase.table("investments").insert({
+    investment = {
         "asset_name": asset_name,
         "type": type,
         "amount_invested": amount_invested,
@@ -47,7 +51,10 @@ def insert_investment(asset_name: str, type: str, amount_invested: float, from_w
         "profit_percent": 0.0,
         "start_date": start_date,
         "from_wallet": from_wallet,
-    }).execute()
+    }
+    if quantity is not None:
+        investment["quantity"] = quantity
+    supabase.table("investments").insert(investment).execute()
     
     supabase.table('wallets').update({
         "balance": supabase.table('wallets').select('balance').eq('name', from_wallet).execute().data[0]['balance'] - amount_invested
@@ -108,33 +115,96 @@ def insert_transaction(wallet: str, amount: float, category: str = "None", type:
     elif (type == "debt"):
         pass  # Debt handling is done in insert_debts
 
-def read_wallets():
-    '''
-    Read all wallets from the database.
-    '''
-    response = supabase.table("wallets").select("*").execute()
-    return response.data
-
-def read_investments():
-    '''
-    Read all investments from the database.
-    '''
-    response = supabase.table("investments").select("*").execute()
-    return response.data
-
-def read_debts():
-    '''
-    Read all debts from the database.
-    '''
-    response = supabase.table("debts").select("*").execute()
-    return response.data
-
-def read_transactions():
-    '''
-    Read all transactions from the database.
-    '''
-    response = supabase.table("transactions").select("*").execute()
-    return response.data
+def select_rows(
+    table: str,
+    fields: list[str] | None = None,
+    order_by: str | None = None,
+    descending: bool = True,
+    search_columns: list[str] | None = None,
+    terms: list[str] | None = None,
+    limit: int | None = None,
+) -> list[dict]:
+    '''
+    Read rows of a table as a list of dicts, selecting only `fields` when given.
+    order_by: optional column to sort by (newest/largest first unless descending=False)
+    search_columns, terms: keep only rows where one of the columns contains one of the
+        terms (case-insensitive); terms must be plain words
+    limit: optional maximum number of rows, applied by the database after ordering
+    '''
+    columns = ",".join(fields) if fields else "*"
+    query = supabase.table(table).select(columns)
+    if search_columns and terms:
+        query = query.or_(",".join(f"{column}.ilike.%{term}%" for column in search_columns for term in terms))
+    if order_by:
+        query = query.order(order_by, desc=descending)
+    if limit:
+        query = query.limit(limit)
+    response = query.execute()
+    return response.data or []
+
+# Read tools return the newest rows first, so the RESULT_MAX_ROWS cap drops the oldest.
+READ_ORDER = {
+    "wallets": "id",
+    "investments": "id",
+    "debts": "id",
+    "transactions": "time",
+}
+
+# Columns the read tools accept in `fields`.
+TABLE_COLUMNS = {
+    "wallets": ["id", "name", "type", "balance", "created_at", "updated_at"],
+    "investments": [
+        "id", "asset_name", "type", "amount_invested", "current_value", "profit",
+        "profit_percent", "start_date", "from_wallet", "quantity",
+    ],
+    "debts": ["id", "name", "amount", "interest_rate", "start_date", "due_date", "to_wallet"],
+    "transactions": ["id", "wallet", "category", "type", "amount", "description", "time"],
+}
+
+def _read_table(table: str, fields: list[str] | None, limit: int | None) -> str:
+    unknown = [field for field in fields or [] if field not in TABLE_COLUMNS[table]]
+    if unknown:
+        return encode_result({
+            "status": "error",
+            "message": f"Unknown field(s) for {table}: {', '.join(unknown)}. "
+                       f"Available fields: {', '.join(TABLE_COLUMNS[table])}",
+        })
+    # One extra row tells the encoder the result was truncated without reading the whole table.
+    capped = limit is not None and limit >= 0
+    rows = select_rows(table, fields, order_by=READ_ORDER[table], limit=limit + 1 if capped else None)
+    return encode_result(rows, fields=fields, max_rows=limit, exact_total=not capped)
+
+def read_wallets(fields: list[str] | None = None, limit: int | None = RESULT_MAX_ROWS):
+    '''
+    Read wallets from the database, newest first.
+    fields: optional list of columns to return (e.g., ["name", "balance"])
+    limit: maximum number of rows to return
+    '''
+    return _read_table("wallets", fields, limit)
+
+def read_investments(fields: list[str] | None = None, limit: int | None = RESULT_MAX_ROWS):
+    '''
+    Read investments from the database, newest first.
+    fields: optional list of columns to return (e.g., ["asset_name", "current_value", "profit_percent"])
+    limit: maximum number of rows to return
+    '''
+    return _read_table("investments", fields, limit)
+
+def read_debts(fields: list[str] | None = None, limit: int | None = RESULT_MAX_ROWS):
+    '''
+    Read debts from the database, newest first.
+    fields: optional list of columns to return (e.g., ["name", "amount", "due_date"])
+    limit: maximum number of rows to return
+    '''
+    return _read_table("debts", fields, limit)
+
+def read_transactions(fields: list[str] | None = None, limit: int | None = RESULT_MAX_ROWS):
+    '''
+    Read transactions from the database, newest first.
+    fields: optional list of columns to return (e.g., ["time", "amount", "category"])
+    limit: maximum number of rows to return
+    '''
+    return _read_table("transactions", fields, limit)
 
 def delete_transaction(transaction_id: int):
     '''
@@ -222,8 +292,8 @@ def financial_summary():
     input period (string), ISO timestamps for the start/end, aggregated totals
     and a short list of insights.
 
-    Note: This implementation reads all transactions/investments/debts via the
-    existing helper functions in this module and performs aggregation in
+    Note: This implementation reads all transactions/investments/debts via
+    `select_rows` (only the needed columns) and performs aggregation in
     Python. For high-volume datasets consider using a DB-side aggregation or
     implementing pagination.
     '''
@@ -255,9 +325,9 @@ def financial_summary():
     start_dt = now - timedelta(days=30)
 
     # Gather data
-    transactions = read_transactions() or []
-    investments = read_investments() or []
-    debts = read_debts() or []
+    transactions = select_rows("transactions", ["time", "type", "amount"])
+    investments = select_rows("investments", ["start_date", "amount_invested"])
+    debts = select_rows("debts", ["start_date", "amount"])
 
     total_income = 0.0
     total_expense = 0.0
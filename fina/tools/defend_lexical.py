@@ -0,0 +1,386 @@
+"""
+Lexical first tier of the prompt-safety screen.
+
+A hashed character/word n-gram logistic regression trained on MPDD runs
+before the transformer classifier. Its probability is confident when it falls
+outside thresholds calibrated on a held-out split to keep the recall loss
+under DEFEND_LEXICAL_MAX_RECALL_LOSS. Well-known injection phrasings (English
+and Vietnamese) are only a feature of that model: they also match ordinary
+finance prompts ("Tôi quên hướng dẫn nộp thuế", "I forgot my password"), so a
+match alone never blocks a prompt.
+
+The malicious threshold is additionally raised above every prompt of a
+labelled benign domain set (BENIGN_DOMAIN_PROMPTS, Vietnamese and English
+finance requests, plus any CSV given with --benign-csv), which is held out of
+training. A model without that calibration never returns malicious.
+
+Anything in between is escalated to the DeBERTa classifier. Until a model has
+been trained (`python -m fina.tools.defend_lexical train mpdd.csv`) every
+prompt is escalated.
+"""
+
+import argparse
+import csv
+import logging
+import os
+import re
+import threading
+import unicodedata
+import zlib
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..config import (
+    DEFEND_LEXICAL_MAX_RECALL_LOSS,
+    DEFEND_LEXICAL_MODEL_PATH,
+    DEFEND_MALICIOUS_CLASS_ID,
+)
+
+logger = logging.getLogger(__name__)
+
+BENIGN_CLASS_ID = 1 - DEFEND_MALICIOUS_CLASS_ID
+
+N_FEATURES = 2 ** 18
+_CHAR_NGRAMS = (3, 4, 5)
+
+INJECTION_PATTERNS = [
+    r"\b(ignore|disregard|forget|override)\b.{0,30}\b(previous|prior|above|earlier|all|your)\b.{0,20}\b(instructions?|prompts?|rules|directions|guidelines)\b",
+    r"\b(reveal|print|show|repeat|output|leak)\b.{0,30}\b(system|hidden|initial)\s+(prompt|instructions?|message)\b",
+    r"\byou\s+are\s+now\s+(dan|in\s+developer\s+mode|jailbroken|unrestricted)\b",
+    r"\b(do\s+anything\s+now|developer\s+mode\s+enabled|jailbreak)\b",
+    r"\bpretend\b.{0,40}\b(no|without)\s+(rules|restrictions|filters|policy|policies)\b",
+    r"^\s*(system|assistant)\s*:",
+    r"\b(api[_\s-]?key|supabase[_\s-]?key|credentials?|password)s?\b.{0,30}\b(reveal|print|show|output|give|send)\b",
+    r"\b(reveal|print|show|output|give|send)\b.{0,30}\b(api[_\s-]?key|supabase[_\s-]?key|credentials|passwords?)\b",
+    r"\bbỏ\s+qua\b.{0,30}\b(hướng\s+dẫn|chỉ\s+dẫn|quy\s+tắc|lệnh)\b",
+    r"\b(quên|phớt\s+lờ)\b.{0,30}\b(hướng\s+dẫn|quy\s+tắc|chỉ\s+dẫn)\b",
+    r"\b(tiết\s+lộ|in\s+ra|hiển\s+thị)\b.{0,30}\b(system\s+prompt|lời\s+nhắc\s+hệ\s+thống|mật\s+khẩu|khóa\s+api)\b",
+]
+# Ordinary requests of this app, including ones that look like injections to
+# the patterns above; the lexical tier must never block any of them.
+BENIGN_DOMAIN_PROMPTS = [
+    "Tôi quên hướng dẫn nộp thuế thu nhập cá nhân",
+    "Bỏ qua lệnh mua FPT hôm nay",
+    "Hiển thị mật khẩu ví của tôi",
+    "I forgot my password, show me how to reset it",
+    "Forget all the rules of thumb, give me your guidelines for saving",
+    "System: add expense 50k",
+    "what's the jailbreak risk of crypto?",
+    "Thêm chi tiêu 50k ăn sáng",
+    "Tôi vừa mua 10 cổ phiếu VNM giá 65 nghìn",
+    "Cho tôi xem số dư ví tiết kiệm",
+    "Hiển thị lịch sử giao dịch tháng này",
+    "Xóa khoản nợ của anh Nam",
+    "Sửa khoản đầu tư vàng của tôi",
+    "Tôi nên đầu tư Bitcoin hay ETH?",
+    "Lập kế hoạch tiết kiệm 100 triệu trong 2 năm",
+    "Bỏ qua khoản chi hôm qua, tôi nhập nhầm",
+    "Quên khoản nợ cũ đi, tôi đã trả rồi",
+    "Phân tích danh mục đầu tư của tôi",
+    "Giá vàng hôm nay bao nhiêu?",
+    "Vẽ biểu đồ chi tiêu theo danh mục",
+    "Show my spending history",
+    "What is my current balance?",
+    "Delete my Bitcoin investment",
+    "Edit my gold investment",
+    "Add a 200k grocery expense to my cash wallet",
+    "Ignore the coffee expense from yesterday, it was a duplicate",
+    "Show me the rules for the 50/30/20 budget",
+    "Print my transactions for last week",
+    "Reveal which of my stocks lost the most this year",
+    "How do I protect my exchange credentials from phishing?",
+    "Give me the previous month's instructions for paying my loan",
+    "Assistant: summarize my debts",
+    "Override my monthly budget to 10 million",
+    "What are the top 10 cryptocurrencies right now?",
+    "Backtest a 60/40 portfolio of VNM and FPT",
+    "Should I pay off my credit card before investing?",
+]
+_PATTERN = re.compile("|".join(f"(?:{p})" for p in INJECTION_PATTERNS), re.IGNORECASE | re.MULTILINE)
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip().casefold()
+
+
+def matches_injection_pattern(text: str) -> bool:
+    return _PATTERN.search(normalize(text)) is not None
+
+
+def _hashed_features(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed, L2-normalized n-gram counts of one prompt as (indices, values)."""
+    normalized = normalize(text)
+    padded = f" {normalized} "
+    grams = [padded[i:i + n] for n in _CHAR_NGRAMS for i in range(len(padded) - n + 1)]
+    words = normalized.split()
+    grams += [f"w:{w}" for w in words]
+    grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    if _PATTERN.search(normalized):
+        grams.append("pattern:injection")
+    if not grams:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    hashed = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.int64, count=len(grams))
+    indices, counts = np.unique(hashed % N_FEATURES, return_counts=True)
+    values = counts.astype(np.float64)
+    return indices, values / np.linalg.norm(values)
+
+
+def featurize(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sparse design matrix of `texts` in coordinate form (rows, cols, values)."""
+    rows, cols, values = [], [], []
+    for i, text in enumerate(texts):
+        idx, val = _hashed_features(text)
+        rows.append(np.full(idx.shape[0], i, dtype=np.int64))
+        cols.append(idx)
+        values.append(val)
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(values)
+
+
+class LexicalModel:
+    """Hashed n-gram logistic regression with calibrated decision thresholds."""
+
+    def __init__(
+        self,
+        weights: np.ndarray,
+        bias: float,
+        benign_below: float,
+        malicious_above: float,
+        domain_calibrated: bool = False,
+    ):
+        self.weights = weights
+        self.bias = float(bias)
+        self.benign_below = float(benign_below)
+        # Without a benign domain calibration no probability is high enough.
+        self.malicious_above = float(malicious_above) if domain_calibrated else 1.0
+        self.domain_calibrated = bool(domain_calibrated)
+
+    def malicious_probability(self, texts: Sequence[str]) -> np.ndarray:
+        rows, cols, values = featurize(texts)
+        logits = self.bias + np.bincount(rows, weights=values * self.weights[cols], minlength=len(texts))
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez_compressed(
+            path,
+            weights=self.weights.astype(np.float32),
+            bias=self.bias,
+            benign_below=self.benign_below,
+            malicious_above=self.malicious_above,
+            domain_calibrated=self.domain_calibrated,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalModel":
+        with np.load(path) as data:
+            return cls(
+                data["weights"].astype(np.float64),
+                float(data["bias"]),
+                float(data["benign_below"]),
+                float(data["malicious_above"]),
+                bool(data["domain_calibrated"]) if "domain_calibrated" in data else False,
+            )
+
+
+def _fit_logistic(
+    rows: np.ndarray,
+    cols: np.ndarray,
+    values: np.ndarray,
+    y: np.ndarray,
+    epochs: int,
+    learning_rate: float,
+    l2: float,
+) -> Tuple[np.ndarray, float]:
+    """Full-batch Adam on the sparse logistic loss."""
+    n = y.shape[0]
+    w = np.zeros(N_FEATURES)
+    b = 0.0
+    m_w, v_w = np.zeros_like(w), np.zeros_like(w)
+    m_b = v_b = 0.0
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+    for step in range(1, epochs + 1):
+        logits = b + np.bincount(rows, weights=values * w[cols], minlength=n)
+        error = 1.0 / (1.0 + np.exp(-logits)) - y
+        grad_w = np.bincount(cols, weights=values * error[rows], minlength=N_FEATURES) / n + l2 * w
+        grad_b = float(error.mean())
+        m_w = beta1 * m_w + (1 - beta1) * grad_w
+        v_w = beta2 * v_w + (1 - beta2) * grad_w ** 2
+        m_b = beta1 * m_b + (1 - beta1) * grad_b
+        v_b = beta2 * v_b + (1 - beta2) * grad_b ** 2
+        correction = np.sqrt(1 - beta2 ** step) / (1 - beta1 ** step)
+        w -= learning_rate * correction * m_w / (np.sqrt(v_w) + eps)
+        b -= learning_rate * correction * m_b / (np.sqrt(v_b) + eps)
+    return w, b
+
+
+def split_indices(n: int, validation_fraction: float = 0.2, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """(held-out, training) row indices of a labelled set, as used by `train_lexical_model`."""
+    order = np.random.default_rng(seed).permutation(n)
+    n_val = max(1, int(n * validation_fraction))
+    return order[:n_val], order[n_val:]
+
+
+def train_lexical_model(
+    texts: Sequence[str],
+    malicious: Sequence[int],
+    max_recall_loss: float = DEFEND_LEXICAL_MAX_RECALL_LOSS,
+    benign_domain: Sequence[str] = BENIGN_DOMAIN_PROMPTS,
+    validation_fraction: float = 0.2,
+    epochs: int = 200,
+    learning_rate: float = 0.05,
+    l2: float = 1e-6,
+    seed: int = 0,
+) -> Tuple[LexicalModel, dict]:
+    """
+    Train the lexical classifier and calibrate its confidence thresholds.
+
+    Args:
+        texts: prompts
+        malicious: 1 for malicious prompts, 0 for benign ones
+        max_recall_loss: largest fraction of held-out malicious prompts that
+                         may be passed as confidently benign (and, symmetrically,
+                         benign prompts confidently blocked)
+        benign_domain: held-out benign prompts of this app; the malicious
+                       threshold is raised above all of them, and the tier
+                       never blocks when this is empty
+        validation_fraction: share of the data held out for calibration
+
+    Returns:
+        (model, report) where report has the held-out accuracy, the share of
+        prompts the lexical tier decides on its own and the benign domain
+        prompts it would block (always 0)
+    """
+    y = np.asarray(malicious, dtype=np.float64)
+    val_idx, train_idx = split_indices(len(texts), validation_fraction, seed)
+    n_val = int(val_idx.shape[0])
+
+    rows, cols, values = featurize([texts[i] for i in train_idx])
+    w, b = _fit_logistic(rows, cols, values, y[train_idx], epochs, learning_rate, l2)
+
+    model = LexicalModel(w, b, 0.0, 1.0, domain_calibrated=bool(benign_domain))
+    val_prob = model.malicious_probability([texts[i] for i in val_idx])
+    val_y = y[val_idx]
+    # Thresholds are the max_recall_loss quantiles of the opposite class, so
+    # at most that share of held-out prompts is decided wrongly by this tier.
+    # They never cross 0.5, so the tier only decides where the model leans.
+    if (val_y == 1).any():
+        model.benign_below = min(float(np.quantile(val_prob[val_y == 1], max_recall_loss)), 0.5)
+    if (val_y == 0).any():
+        model.malicious_above = max(float(np.quantile(val_prob[val_y == 0], 1.0 - max_recall_loss)), 0.5)
+    domain_prob = model.malicious_probability(list(benign_domain)) if benign_domain else np.zeros(0)
+    if domain_prob.size:
+        model.malicious_above = max(model.malicious_above, float(domain_prob.max()))
+    else:
+        model.malicious_above = 1.0
+
+    decided = (val_prob < model.benign_below) | (val_prob > model.malicious_above)
+    report = {
+        "train_size": int(train_idx.shape[0]),
+        "validation_size": int(n_val),
+        "validation_accuracy": float(np.mean((val_prob >= 0.5) == (val_y == 1))),
+        "benign_below": model.benign_below,
+        "malicious_above": model.malicious_above,
+        "decided_fraction": float(decided.mean()),
+        "benign_domain_size": int(domain_prob.size),
+        "benign_domain_blocked": int((domain_prob > model.malicious_above).sum()),
+    }
+    return model, report
+
+
+def read_labeled_csv(path: str, text_column: str = "Prompt", label_column: str = "isMalicious") -> Tuple[List[str], List[int]]:
+    """Read prompts and 0/1 malicious labels from an MPDD-style CSV."""
+    texts, labels = [], []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            if row.get(text_column) and row.get(label_column) not in (None, ""):
+                texts.append(row[text_column])
+                labels.append(int(float(row[label_column])))
+    return texts, labels
+
+
+_MODEL: Optional[LexicalModel] = None
+_MODEL_LOADED = False
+_MODEL_LOCK = threading.Lock()
+
+
+def get_lexical_model(path: str = DEFEND_LEXICAL_MODEL_PATH) -> Optional[LexicalModel]:
+    """Load (once) the trained lexical model, or None if none has been trained."""
+    global _MODEL, _MODEL_LOADED
+    with _MODEL_LOCK:
+        if not _MODEL_LOADED:
+            _MODEL_LOADED = True
+            if os.path.exists(path):
+                try:
+                    _MODEL = LexicalModel.load(path)
+                except Exception as e:
+                    logger.warning(f"Could not load lexical safety model from {path}: {str(e)}")
+    return _MODEL
+
+
+def screen(texts: Sequence[str]) -> List[Optional[int]]:
+    """
+    First-tier verdicts for `texts`: DEFEND_MALICIOUS_CLASS_ID or
+    BENIGN_CLASS_ID when the lexical tier is confident, None to escalate.
+    """
+    verdicts: List[Optional[int]] = [None] * len(texts)
+    model = get_lexical_model()
+    if model is None or not texts:
+        return verdicts
+    for i, prob in enumerate(model.malicious_probability(list(texts))):
+        if prob < model.benign_below:
+            verdicts[i] = BENIGN_CLASS_ID
+        elif prob > model.malicious_above:
+            verdicts[i] = DEFEND_MALICIOUS_CLASS_ID
+    return verdicts
+
+
+def _main() -> None:
+    parser = argparse.ArgumentParser(description="Train or evaluate the lexical prompt-safety tier")
+    parser.add_argument("command", choices=["train", "evaluate"])
+    parser.add_argument("csv_path", help="CSV with prompt and 0/1 malicious label columns (MPDD format)")
+    parser.add_argument("--text-column", default="Prompt")
+    parser.add_argument("--label-column", default="isMalicious")
+    parser.add_argument("--output", default=DEFEND_LEXICAL_MODEL_PATH)
+    parser.add_argument(
+        "--benign-csv",
+        help="CSV of more domain prompts (same columns); the benign ones are added to the calibration set",
+    )
+    parser.add_argument("--validation-fraction", type=float, default=0.2, help="share of the CSV held out of training")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the held-out split")
+    parser.add_argument(
+        "--all-rows",
+        action="store_true",
+        help="evaluate on every row; only for a CSV that was not used for training",
+    )
+    parser.add_argument("--limit", type=int, default=0, help="evaluate on the first N held-out rows only")
+    args = parser.parse_args()
+
+    texts, labels = read_labeled_csv(args.csv_path, args.text_column, args.label_column)
+    if args.command == "train":
+        benign_domain = list(BENIGN_DOMAIN_PROMPTS)
+        if args.benign_csv:
+            domain_texts, domain_labels = read_labeled_csv(args.benign_csv, args.text_column, args.label_column)
+            benign_domain += [text for text, label in zip(domain_texts, domain_labels) if not label]
+        model, report = train_lexical_model(
+            texts, labels, benign_domain=benign_domain,
+            validation_fraction=args.validation_fraction, seed=args.seed,
+        )
+        model.save(args.output)
+        print(f"Saved lexical model to {args.output}: {report}")
+    else:
+        from .defend_tools import evaluate_cascade
+
+        if not args.all_rows:
+            # The rows `train` reserved with the same split; the others were fitted on.
+            held_out, _ = split_indices(len(texts), args.validation_fraction, args.seed)
+            texts, labels = [texts[i] for i in held_out], [labels[i] for i in held_out]
+        if args.limit:
+            texts, labels = texts[:args.limit], labels[:args.limit]
+        print(evaluate_cascade(texts, labels))
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,219 @@
+"""
+Shared prompt-safety classifier service.
+
+Without it, every server worker process loads its own copy of the defend
+model. Instead, run one daemon per host:
+
+    python -m fina.tools.defend_service --socket /run/fina/defend.sock
+
+and set DEFEND_SERVICE_SOCKET to that path in the workers. classify_prompt_safety
+then keeps only the lexical tier in-process and sends the remaining prompts to
+the daemon, which holds the single model, the verdict cache and the
+micro-batcher, so concurrent requests from all workers share forward passes.
+
+Protocol: one JSON object per line over a Unix domain socket.
+  {"op": "classify", "texts": [...], "model_name": "...", "max_length": 512}
+      -> {"status": "success", "verdicts": [0, 1, ...]}
+  {"op": "health"}
+      -> {"status": "success", "model": "...", "uptime_seconds": ..., "models": [...]}
+"""
+
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from ..config import (
+    DEFEND_MODEL_NAME,
+    DEFEND_SERVICE_SOCKET,
+    DEFEND_SERVICE_TIMEOUT_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = "/tmp/fina-defend.sock"
+_MAX_LINE_BYTES = 16 * 1024 * 1024
+
+
+class _Connection:
+    """Persistent client connection, one per thread."""
+
+    def __init__(self, path: str, timeout: float):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self.reader = self.sock.makefile("rb")
+
+    def request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        self.sock.sendall(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+        line = self.reader.readline(_MAX_LINE_BYTES)
+        if not line:
+            raise ConnectionError("Classifier service closed the connection")
+        return json.loads(line)
+
+    def close(self) -> None:
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+_local = threading.local()
+
+# Errors raised before the service received the request: connecting failed, or
+# the cached connection was closed by the other end. Anything else (a timeout
+# waiting for the answer, a malformed reply) may come after the service took
+# the request, so it is not retried.
+_NOT_DELIVERED = (ConnectionRefusedError, FileNotFoundError, ConnectionResetError, BrokenPipeError)
+
+
+def _request(payload: Dict[str, Any], path: Optional[str] = None) -> Dict[str, Any]:
+    """Send one request, reconnecting once if it could not be delivered."""
+    path = path or DEFEND_SERVICE_SOCKET or DEFAULT_SOCKET_PATH
+    if not hasattr(_local, "connections"):
+        _local.connections = {}
+    for attempt in range(2):
+        connection = _local.connections.get(path)
+        try:
+            if connection is None:
+                connection = _local.connections[path] = _Connection(path, DEFEND_SERVICE_TIMEOUT_SECONDS)
+            return connection.request(payload)
+        except (OSError, ValueError) as e:
+            if connection is not None:
+                connection.close()
+            _local.connections.pop(path, None)
+            if attempt or not isinstance(e, _NOT_DELIVERED):
+                raise
+    raise ConnectionError("unreachable")
+
+
+def classify_remote(texts: List[str], model_name: str = DEFEND_MODEL_NAME, max_length: int = 512) -> List[int]:
+    """Classify `texts` with the shared classifier service."""
+    if not texts:
+        return []
+    response = _request({"op": "classify", "texts": list(texts), "model_name": model_name, "max_length": max_length})
+    if response.get("status") != "success":
+        raise RuntimeError(f"Classifier service error: {response.get('message')}")
+    return [int(v) for v in response["verdicts"]]
+
+
+def service_health(path: Optional[str] = None) -> dict:
+    """
+    Health of the classifier service.
+
+    Returns:
+        dict: model, backend, uptime and request counters, or an error status
+        if the service cannot be reached
+    """
+    try:
+        return _request({"op": "health"}, path)
+    except Exception as e:
+        return {"status": "error", "message": f"Classifier service unavailable: {str(e)}"}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline(_MAX_LINE_BYTES)
+            if not line:
+                return
+            try:
+                response = self.server.dispatch(json.loads(line))
+            except Exception as e:
+                logger.error(f"Classifier service request failed: {str(e)}")
+                response = {"status": "error", "message": str(e)}
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class ClassifierServer(socketserver.ThreadingUnixStreamServer):
+    """Unix socket server holding the one in-memory copy of the classifier."""
+
+    daemon_threads = True
+    # Every worker thread keeps a connection open; allow bursts of connects.
+    request_queue_size = 256
+
+    def __init__(self, path: str, model_name: str = DEFEND_MODEL_NAME):
+        from . import defend_tools
+
+        self.tools = defend_tools
+        self.model_name = model_name
+        self.started_at = time.time()
+        self.requests = 0
+        self.prompts = 0
+        self._counter_lock = threading.Lock()
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o660)
+
+    def warm_up(self) -> None:
+        """Load the model and run one batch so the first real request is fast."""
+        from .defend_onnx import PARITY_SAMPLES
+
+        start = time.perf_counter()
+        self.tools.preload_models()
+        name, revision = self.tools.parse_model_spec(self.model_name)
+        self.tools._predict_batch(PARITY_SAMPLES, name, 512, revision)
+        logger.info(f"Classifier service warmed up in {time.perf_counter() - start:.2f}s")
+
+    def dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        op = request.get("op")
+        if op == "health":
+            with self._counter_lock:
+                requests, prompts = self.requests, self.prompts
+            return {
+                "status": "success",
+                "model": self.model_name,
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+                "requests": requests,
+                "prompts": prompts,
+                "models": self.tools.get_model_stats(),
+                "verdict_cache": self.tools.get_verdict_cache_stats(),
+            }
+        if op == "classify":
+            texts = request.get("texts") or []
+            model_name = request.get("model_name") or self.model_name
+            max_length = int(request.get("max_length") or 512)
+            with self._counter_lock:
+                self.requests += 1
+                self.prompts += len(texts)
+            # Clients already ran the lexical tier; single prompts go through
+            # the micro-batcher so concurrent workers share forward passes.
+            if len(texts) == 1:
+                verdicts = [self.tools._classify_local(texts[0], model_name, max_length, lexical=False)]
+            else:
+                verdicts = self.tools._classify_batch_local(texts, model_name, max_length, lexical=False)
+            return {"status": "success", "verdicts": verdicts}
+        return {"status": "error", "message": f"Unknown op '{op}'"}
+
+
+def serve(path: str, model_name: str = DEFEND_MODEL_NAME) -> None:
+    server = ClassifierServer(path, model_name)
+    try:
+        server.warm_up()
+        logger.info(f"Classifier service for '{model_name}' listening on {path}")
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def _main() -> None:
+    parser = argparse.ArgumentParser(description="Shared prompt-safety classifier service")
+    parser.add_argument("--socket", default=DEFEND_SERVICE_SOCKET or DEFAULT_SOCKET_PATH)
+    parser.add_argument("--model", default=DEFEND_MODEL_NAME)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    serve(args.socket, args.model)
+
+
+if __name__ == "__main__":
+    _main()
@@ -1,72 +1,665 @@
-from typing import Optional, Dict, Any
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
 import torch
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 
-# Simple module-level cache so repeated calls reuse the loaded model/tokenizer
-_TOKENIZER: Optional[AutoTokenizer] = None
-_MODEL: Optional[AutoModelForSequenceClassification] = None
+from ..config import (
+	DEFEND_BACKEND,
+	DEFEND_BATCH_MAX_SIZE,
+	DEFEND_BATCH_MAX_WAIT_MS,
+	DEFEND_CANARY_FRACTION,
+	DEFEND_CANARY_MODEL,
+	DEFEND_LEXICAL_ENABLED,
+	DEFEND_MALICIOUS_CLASS_ID,
+	DEFEND_MODEL_MAX_RESIDENT,
+	DEFEND_MODEL_NAME,
+	DEFEND_MODEL_REVISION,
+	DEFEND_PRELOAD_MODELS,
+	DEFEND_SERVICE_SOCKET,
+	DEFEND_VERDICT_CACHE_PATH,
+	DEFEND_VERDICT_CACHE_SIZE,
+	DEFEND_VERDICT_CACHE_TTL_SECONDS,
+	DEFEND_WINDOW_STRIDE,
+)
+from . import defend_lexical
+from .defend_onnx import OnnxClassifier, load_onnx_classifier
+from .defend_service import classify_remote
+
+logger = logging.getLogger(__name__)
+
+_DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+ModelKey = Tuple[str, str]
+
+
+def parse_model_spec(spec: str) -> ModelKey:
+	"""Split "name@revision" into (name, revision); the revision defaults to DEFEND_MODEL_REVISION."""
+	if "@" in spec:
+		name, revision = spec.rsplit("@", 1)
+		return name, revision
+	return spec, DEFEND_MODEL_REVISION
+
+
+_COMMIT_SHA = re.compile(r"^[0-9a-f]{40}$")
+_RESOLVED: Dict[ModelKey, str] = {}
+_RESOLVED_LOCK = threading.Lock()
+
+
+def _cached_ref(model_name: str, revision: str) -> Optional[str]:
+	"""Commit sha a branch or tag pointed to when the model was last downloaded."""
+	from huggingface_hub.constants import HF_HUB_CACHE
+
+	path = os.path.join(HF_HUB_CACHE, "models--" + model_name.replace("/", "--"), "refs", revision)
+	try:
+		with open(path, "r", encoding="utf-8") as f:
+			return f.read().strip() or None
+	except OSError:
+		return None
+
+
+def resolve_revision(model_name: str, revision: str) -> str:
+	"""Commit sha of `revision` (branch, tag or sha), resolved once per process.
+
+	Models, ONNX artifacts and cached verdicts are keyed on the sha, so moving
+	a branch such as "main" on the hub never serves results of the old weights.
+	"""
+	if _COMMIT_SHA.match(revision):
+		return revision
+	key = (model_name, revision)
+	with _RESOLVED_LOCK:
+		if key in _RESOLVED:
+			return _RESOLVED[key]
+	try:
+		from huggingface_hub import HfApi
+
+		sha = HfApi().model_info(model_name, revision=revision).sha
+	except Exception as e:
+		sha = _cached_ref(model_name, revision)
+		if sha is None:
+			logger.warning(f"Could not resolve {model_name}@{revision} to a commit, keying on '{revision}': {str(e)}")
+			sha = revision
+	with _RESOLVED_LOCK:
+		return _RESOLVED.setdefault(key, sha)
+
+
+def _load_torch_model(model_name: str, revision: str = DEFEND_MODEL_REVISION) -> AutoModelForSequenceClassification:
+	"""Load the PyTorch model, moved to the device and in eval mode."""
+	model = AutoModelForSequenceClassification.from_pretrained(model_name, revision=revision)
+	model.to(_DEVICE)
+	model.eval()
+	return model
+
+
+class _LoadedModel:
+	"""Tokenizer plus exactly one of a PyTorch model or an int8 ONNX classifier."""
+
+	def __init__(self, model_name: str, revision: str):
+		self.tokenizer = AutoTokenizer.from_pretrained(model_name, revision=revision)
+		self.onnx: Optional[OnnxClassifier] = None
+		self.model: Optional[AutoModelForSequenceClassification] = None
+		if DEFEND_BACKEND != "torch" and _DEVICE.type == "cpu":
+			# A model loaded for export or parity is reused if ONNX is not used.
+			self.onnx, self.model = load_onnx_classifier(
+				model_name, self.tokenizer, lambda: _load_torch_model(model_name, revision), revision
+			)
+		if self.onnx is None and self.model is None:
+			self.model = _load_torch_model(model_name, revision)
+
+
+class _ModelRegistry:
+	"""Loaded classifiers keyed by (model name, revision).
 
+	At most `max_resident` models stay in memory; the least recently used one
+	is evicted when another is loaded. Latency counters are kept per model
+	and survive evictions, so a canary can be compared with the primary.
+	"""
+
+	def __init__(self, max_resident: int):
+		self.max_resident = max(1, max_resident)
+		self._models: "OrderedDict[ModelKey, _LoadedModel]" = OrderedDict()
+		self._load_locks: Dict[ModelKey, threading.Lock] = {}
+		self._stats: Dict[ModelKey, Dict[str, float]] = {}
+		self._lock = threading.Lock()
+
+	def _counters(self, key: ModelKey) -> Dict[str, float]:
+		return self._stats.setdefault(key, {
+			"loads": 0, "load_seconds": 0.0, "evictions": 0,
+			"batches": 0, "prompts": 0, "windows": 0, "inference_seconds": 0.0,
+		})
+
+	def get(self, model_name: str, revision: str) -> _LoadedModel:
+		revision = resolve_revision(model_name, revision)
+		key = (model_name, revision)
+		with self._lock:
+			if key in self._models:
+				self._models.move_to_end(key)
+				return self._models[key]
+			load_lock = self._load_locks.setdefault(key, threading.Lock())
+		with load_lock:
+			with self._lock:
+				if key in self._models:
+					self._models.move_to_end(key)
+					return self._models[key]
+			start = time.perf_counter()
+			loaded = _LoadedModel(model_name, revision)
+			elapsed = time.perf_counter() - start
+			with self._lock:
+				counters = self._counters(key)
+				counters["loads"] += 1
+				counters["load_seconds"] += elapsed
+				self._models[key] = loaded
+				while len(self._models) > self.max_resident:
+					evicted, _ = self._models.popitem(last=False)
+					self._counters(evicted)["evictions"] += 1
+					logger.info(f"Evicted defend model {evicted[0]}@{evicted[1]}")
+			logger.info(f"Loaded defend model {model_name}@{revision} in {elapsed:.2f}s")
+			return loaded
+
+	def record(self, key: ModelKey, prompts: int, windows: int, batches: int, seconds: float) -> None:
+		with self._lock:
+			counters = self._counters(key)
+			counters["prompts"] += prompts
+			counters["windows"] += windows
+			counters["batches"] += batches
+			counters["inference_seconds"] += seconds
+
+	def stats(self) -> List[Dict[str, Any]]:
+		with self._lock:
+			result = []
+			for (name, revision), counters in self._stats.items():
+				loaded = self._models.get((name, revision))
+				result.append({
+					"model": name,
+					"revision": revision,
+					"resident": loaded is not None,
+					"backend": None if loaded is None else ("onnx" if loaded.onnx is not None else "torch"),
+					**{k: round(v, 4) if isinstance(v, float) else v for k, v in counters.items()},
+					"mean_batch_ms": round(1000.0 * counters["inference_seconds"] / max(counters["batches"], 1), 3),
+					"mean_ms_per_prompt": round(1000.0 * counters["inference_seconds"] / max(counters["prompts"], 1), 3),
+				})
+			return result
+
+
+_REGISTRY = _ModelRegistry(DEFEND_MODEL_MAX_RESIDENT)
+_CANARY: Optional[ModelKey] = parse_model_spec(DEFEND_CANARY_MODEL) if DEFEND_CANARY_MODEL else None
+
+
+def _load_model_and_tokenizer(model_name: str, revision: str = DEFEND_MODEL_REVISION):
+	"""Load (or reuse from the registry) the tokenizer and classifier for the model.
+
+	With DEFEND_BACKEND "auto" or "onnx" on CPU, the int8 ONNX classifier is
+	used when it can be prepared and passes the parity check; the PyTorch
+	model is then never kept in memory.
+
+	Returns (tokenizer, model, onnx_classifier); exactly one of the last two is set.
+	"""
+	loaded = _REGISTRY.get(model_name, revision)
+	return loaded.tokenizer, loaded.model, loaded.onnx
 
-def _load_model_and_tokenizer(model_name: str):
-	"""Load and cache the tokenizer and model for the given model_name.
 
-	Returns (tokenizer, model).
+def _route(model_name: str, text: str) -> ModelKey:
+	"""(name, commit sha) of the model that serves `text`.
+
+	Requests for the primary model are split to the canary for a stable
+	DEFEND_CANARY_FRACTION of prompts, chosen by hashing the normalized text
+	so the same prompt always sees the same model.
 	"""
-	global _TOKENIZER, _MODEL
-	if _TOKENIZER is None or _MODEL is None:
-		_TOKENIZER = AutoTokenizer.from_pretrained(model_name)
-		_MODEL = AutoModelForSequenceClassification.from_pretrained(model_name)
-	return _TOKENIZER, _MODEL
+	name, revision = parse_model_spec(model_name)
+	if _CANARY is not None and DEFEND_CANARY_FRACTION > 0 and name == DEFEND_MODEL_NAME:
+		digest = hashlib.sha256(defend_lexical.normalize(text).encode("utf-8")).digest()
+		if int.from_bytes(digest[:4], "big") / 2 ** 32 < DEFEND_CANARY_FRACTION:
+			name, revision = _CANARY
+	return name, resolve_revision(name, revision)
+
+
+def preload_models(specs: List[str] = DEFEND_PRELOAD_MODELS) -> None:
+	"""Load the given "name@revision" models (and the canary) into the registry."""
+	keys = [parse_model_spec(spec) for spec in specs]
+	if _CANARY is not None and DEFEND_CANARY_FRACTION > 0:
+		keys.append(_CANARY)
+	for name, revision in dict.fromkeys(keys):
+		try:
+			_REGISTRY.get(name, revision)
+		except Exception as e:
+			logger.error(f"Could not preload defend model {name}@{revision}: {str(e)}")
+
+
+def start_model_preload() -> bool:
+	"""Preload configured models in a background thread. Returns False if there is nothing to load."""
+	if not DEFEND_PRELOAD_MODELS and not (_CANARY is not None and DEFEND_CANARY_FRACTION > 0):
+		return False
+	threading.Thread(target=preload_models, name="defend-preload", daemon=True).start()
+	return True
+
+
+def get_model_stats() -> List[Dict[str, Any]]:
+	"""Residency, load time and inference latency counters of every defend model used so far."""
+	return _REGISTRY.stats()
+
+
+def _predict_batch(
+	texts: List[str],
+	model_name: str,
+	max_length: int,
+	revision: str = DEFEND_MODEL_REVISION,
+) -> List[int]:
+	"""Classify `texts` with as few padded forward passes as possible.
+
+	Prompts longer than `max_length` tokens are split into windows overlapping
+	by DEFEND_WINDOW_STRIDE tokens, so every token is seen. All windows of all
+	texts are sorted by token length and padded per chunk of
+	DEFEND_BATCH_MAX_SIZE, so a long prompt costs about one batched forward
+	pass. A text is malicious if any of its windows is (max-malicious).
+	Latency is recorded under the commit sha the revision resolves to, the
+	same key the registry loads the model under.
+	"""
+	if not texts:
+		return []
+	revision = resolve_revision(model_name, revision)
+	tokenizer, model, onnx_classifier = _load_model_and_tokenizer(model_name, revision)
+	started = time.perf_counter()
+	encoded = tokenizer(
+		list(texts),
+		truncation=True,
+		max_length=max_length,
+		stride=min(DEFEND_WINDOW_STRIDE, max_length // 2),
+		return_overflowing_tokens=True,
+	)
+	window_text = encoded.pop("overflow_to_sample_mapping")
+	n_windows = len(window_text)
+	order = sorted(range(n_windows), key=lambda i: len(encoded["input_ids"][i]))
+
+	malicious_prob = np.zeros(len(texts))
+	for start in range(0, n_windows, DEFEND_BATCH_MAX_SIZE):
+		chunk = order[start:start + DEFEND_BATCH_MAX_SIZE]
+		features = [{key: encoded[key][i] for key in encoded.keys()} for i in chunk]
+		if onnx_classifier is not None:
+			inputs = tokenizer.pad(features, padding="longest", return_tensors="np")
+			logits = onnx_classifier.logits(dict(inputs)).astype(np.float64)
+		else:
+			inputs = tokenizer.pad(features, padding="longest", return_tensors="pt")
+			inputs = {k: v.to(_DEVICE) for k, v in inputs.items()}
+			with torch.inference_mode():
+				logits = model(**inputs).logits.float().cpu().numpy().astype(np.float64)
+		probs = np.exp(logits - logits.max(axis=-1, keepdims=True))
+		probs /= probs.sum(axis=-1, keepdims=True)
+		np.maximum.at(malicious_prob, np.asarray([window_text[i] for i in chunk]), probs[:, DEFEND_MALICIOUS_CLASS_ID])
+	_REGISTRY.record(
+		(model_name, revision),
+		prompts=len(texts),
+		windows=n_windows,
+		batches=-(-n_windows // DEFEND_BATCH_MAX_SIZE),
+		seconds=time.perf_counter() - started,
+	)
+	return [
+		DEFEND_MALICIOUS_CLASS_ID if p >= 0.5 else 1 - DEFEND_MALICIOUS_CLASS_ID
+		for p in malicious_prob
+	]
+
+
+class _MicroBatcher:
+	"""Collects concurrent single-prompt requests into batched forward passes.
+
+	A worker thread takes the first waiting request, then keeps collecting for
+	up to `max_wait_ms` or until `max_batch_size` prompts are queued, runs one
+	batched prediction and resolves every waiting future.
+	"""
+
+	def __init__(self, model_name: str, revision: str, max_length: int, max_batch_size: int, max_wait_ms: float):
+		self.model_name = model_name
+		self.revision = revision
+		self.max_length = max_length
+		self.max_batch_size = max(1, max_batch_size)
+		self.max_wait = max(0.0, max_wait_ms) / 1000.0
+		self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+		self._thread = threading.Thread(target=self._run, name=f"defend-batcher-{model_name}@{revision}", daemon=True)
+		self._thread.start()
+
+	def submit(self, text: str) -> Future:
+		future: Future = Future()
+		self._queue.put((text, future))
+		return future
+
+	def _collect(self) -> List[Tuple[str, Future]]:
+		batch = [self._queue.get()]
+		deadline = time.monotonic() + self.max_wait
+		while len(batch) < self.max_batch_size:
+			remaining = deadline - time.monotonic()
+			try:
+				if remaining > 0:
+					batch.append(self._queue.get(timeout=remaining))
+				else:
+					batch.append(self._queue.get_nowait())
+			except queue.Empty:
+				break
+		return batch
+
+	def _run(self) -> None:
+		while True:
+			batch = self._collect()
+			try:
+				preds = _predict_batch([text for text, _ in batch], self.model_name, self.max_length, self.revision)
+			except Exception as e:
+				for _, future in batch:
+					future.set_exception(e)
+				continue
+			for (_, future), pred in zip(batch, preds):
+				future.set_result(pred)
+
+
+class _VerdictCache:
+	"""LRU + TTL cache of classifier verdicts.
+
+	Keys are a SHA-256 of the model name, model commit sha and normalized text,
+	so a new model version never serves verdicts of the previous one. When
+	`path` is set, entries are loaded from and saved to a JSON file so
+	verdicts survive restarts.
+	"""
+
+	def __init__(self, max_size: int, ttl_seconds: float, path: Optional[str] = None):
+		self.max_size = max_size
+		self.ttl = ttl_seconds
+		self.path = path
+		self._entries: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+		self._lock = threading.Lock()
+		self._dirty = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.expirations = 0
+		if path:
+			self._load()
+			atexit.register(self.save)
+
+	@staticmethod
+	def key(text: str, model_name: str, revision: str, max_length: int) -> str:
+		normalized = re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip().casefold()
+		raw = f"{model_name}\x00{revision}\x00{max_length}\x00{normalized}"
+		return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+	def get(self, key: str) -> Optional[int]:
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				self.misses += 1
+				return None
+			verdict, stored_at = entry
+			if time.time() - stored_at > self.ttl:
+				del self._entries[key]
+				self.expirations += 1
+				self.misses += 1
+				return None
+			self._entries.move_to_end(key)
+			self.hits += 1
+			return verdict
+
+	def put(self, key: str, verdict: int) -> None:
+		with self._lock:
+			self._entries[key] = (int(verdict), time.time())
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.max_size:
+				self._entries.popitem(last=False)
+				self.evictions += 1
+			self._dirty += 1
+			should_save = self.path and self._dirty >= 100
+		if should_save:
+			self.save()
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			lookups = self.hits + self.misses
+			return {
+				"size": len(self._entries),
+				"max_size": self.max_size,
+				"hits": self.hits,
+				"misses": self.misses,
+				"hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+				"evictions": self.evictions,
+				"expirations": self.expirations,
+				"persistent": bool(self.path),
+			}
+
+	def _load(self) -> None:
+		try:
+			with open(self.path, "r", encoding="utf-8") as f:
+				stored = json.load(f)
+		except (FileNotFoundError, ValueError):
+			return
+		now = time.time()
+		for key, (verdict, stored_at) in sorted(stored.items(), key=lambda item: item[1][1]):
+			if now - stored_at <= self.ttl:
+				self._entries[key] = (int(verdict), float(stored_at))
+		while len(self._entries) > self.max_size:
+			self._entries.popitem(last=False)
+
+	def save(self) -> None:
+		if not self.path:
+			return
+		with self._lock:
+			snapshot = dict(self._entries)
+			self._dirty = 0
+		try:
+			os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+			tmp_path = f"{self.path}.tmp"
+			with open(tmp_path, "w", encoding="utf-8") as f:
+				json.dump(snapshot, f)
+			os.replace(tmp_path, self.path)
+		except OSError as e:
+			logger.warning(f"Could not persist verdict cache: {str(e)}")
+
+
+_VERDICT_CACHE = _VerdictCache(DEFEND_VERDICT_CACHE_SIZE, DEFEND_VERDICT_CACHE_TTL_SECONDS, DEFEND_VERDICT_CACHE_PATH)
+
+
+def get_verdict_cache_stats() -> Dict[str, Any]:
+	"""Size and hit-rate metrics of the prompt-safety verdict cache."""
+	return _VERDICT_CACHE.stats()
+
+
+_TIER_COUNTS = {"lexical_benign": 0, "lexical_malicious": 0, "escalated": 0}
+_TIER_LOCK = threading.Lock()
+
+
+def _lexical_screen(texts: List[str]) -> List[Optional[int]]:
+	"""First-tier verdicts (None means escalate to the transformer)."""
+	if not DEFEND_LEXICAL_ENABLED:
+		return [None] * len(texts)
+	verdicts = defend_lexical.screen(texts)
+	with _TIER_LOCK:
+		for verdict in verdicts:
+			if verdict is None:
+				_TIER_COUNTS["escalated"] += 1
+			elif verdict == DEFEND_MALICIOUS_CLASS_ID:
+				_TIER_COUNTS["lexical_malicious"] += 1
+			else:
+				_TIER_COUNTS["lexical_benign"] += 1
+	return verdicts
+
+
+def get_screening_stats() -> Dict[str, Any]:
+	"""How many screened prompts each tier of the cascade decided."""
+	with _TIER_LOCK:
+		counts = dict(_TIER_COUNTS)
+	total = sum(counts.values())
+	counts["escalation_rate"] = round(counts["escalated"] / total, 4) if total else 0.0
+	return counts
+
+
+_BATCHERS: Dict[Tuple[str, str, int], _MicroBatcher] = {}
+_BATCHERS_LOCK = threading.Lock()
+
+
+def _get_batcher(model_name: str, revision: str, max_length: int) -> _MicroBatcher:
+	with _BATCHERS_LOCK:
+		key = (model_name, revision, max_length)
+		if key not in _BATCHERS:
+			_BATCHERS[key] = _MicroBatcher(
+				model_name, revision, max_length, DEFEND_BATCH_MAX_SIZE, DEFEND_BATCH_MAX_WAIT_MS
+			)
+		return _BATCHERS[key]
+
+
+def _classify_local(text: str, model_name: str, max_length: int, lexical: bool = True) -> int:
+	name, revision = _route(model_name, text)
+	key = _VERDICT_CACHE.key(text, name, revision, max_length)
+	verdict = _VERDICT_CACHE.get(key)
+	if verdict is not None:
+		return verdict
+	verdict = _lexical_screen([text])[0] if lexical else None
+	if verdict is None:
+		verdict = _get_batcher(name, revision, max_length).submit(text).result()
+		_VERDICT_CACHE.put(key, verdict)
+	return verdict
+
+
+def _classify_batch_local(texts: List[str], model_name: str, max_length: int, lexical: bool = True) -> List[int]:
+	routes = [_route(model_name, text) for text in texts]
+	keys = [_VERDICT_CACHE.key(text, name, revision, max_length) for text, (name, revision) in zip(texts, routes)]
+	verdicts = [_VERDICT_CACHE.get(key) for key in keys]
+	pending = [i for i, verdict in enumerate(verdicts) if verdict is None]
+	if pending and lexical:
+		for i, verdict in zip(pending, _lexical_screen([texts[i] for i in pending])):
+			verdicts[i] = verdict
+		pending = [i for i in pending if verdicts[i] is None]
+	for route in dict.fromkeys(routes[i] for i in pending):
+		group = [i for i in pending if routes[i] == route]
+		for i, verdict in zip(group, _predict_batch([texts[i] for i in group], route[0], max_length, route[1])):
+			verdicts[i] = verdict
+			_VERDICT_CACHE.put(keys[i], verdict)
+	return verdicts
+
+
+def _classify_remote(texts: List[str], model_name: str, max_length: int) -> List[int]:
+	"""Screen lexically in-process and send the rest to the classifier service."""
+	verdicts = _lexical_screen(texts)
+	pending = [i for i, verdict in enumerate(verdicts) if verdict is None]
+	if pending:
+		remote = classify_remote([texts[i] for i in pending], model_name, max_length)
+		for i, verdict in zip(pending, remote):
+			verdicts[i] = verdict
+	return verdicts
 
 
 def classify_prompt_safety(
 	text: str,
-	model_name: str = "Mustartoo/defend-model-v1",
+	model_name: str = DEFEND_MODEL_NAME,
 	max_length: int = 512,
 ) -> int:
 	"""
 	Classify whether `text` is malicious (policy-violating) or benign using a
 	sequence-classification model.
 
-	Returns a dictionary with keys:
-	  - label: str (human-friendly label, derived from model.config.id2label when available)
-	  - class_id: int (predicted class index)
-	  - scores: list[float] (softmax probabilities for each class)
+	Returns the predicted class index (0: malicious, 1: benign).
 
 	Notes:
 	  - The function caches the tokenizer and model at module level so repeated
 		calls don't re-download or re-instantiate the model.
-	  - The function runs inference in eval mode under torch.no_grad().
+	  - Concurrent calls are micro-batched: requests arriving within
+		DEFEND_BATCH_MAX_WAIT_MS of each other share one forward pass.
+	  - Verdicts are cached by normalized text and model version, so repeated
+		prompts skip inference.
+	  - A lexical first tier (see defend_lexical) decides clear-cut prompts;
+		only uncertain ones reach the transformer.
+	  - Prompts longer than `max_length` tokens are scored as overlapping
+		windows in one batch; any malicious window blocks the prompt.
+	  - With DEFEND_SERVICE_SOCKET set, the transformer runs in the shared
+		classifier service (see defend_service) instead of this process.
 	"""
-	tokenizer, model = _load_model_and_tokenizer(model_name)
+	if DEFEND_SERVICE_SOCKET:
+		return _classify_remote([text], model_name, max_length)[0]
+	return _classify_local(text, model_name, max_length)
 
-	device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-	model.to(device)
-	model.eval()
 
-	inputs = tokenizer(text, truncation=True, max_length=max_length, return_tensors="pt")
-	# move tensors to device
-	inputs = {k: v.to(device) for k, v in inputs.items()}
+def classify_prompt_safety_batch(
+	texts: List[str],
+	model_name: str = DEFEND_MODEL_NAME,
+	max_length: int = 512,
+) -> List[int]:
+	"""
+	Classify several prompts at once with length-sorted, dynamically padded
+	batches.
 
-	with torch.no_grad():
-		outputs = model(**inputs)
+	Returns the predicted class index for each text, in input order
+	(0: malicious, 1: benign). Cached verdicts are reused and the lexical
+	tier decides clear-cut prompts; only the rest is sent to the model.
+	"""
+	if DEFEND_SERVICE_SOCKET:
+		return _classify_remote(list(texts), model_name, max_length)
+	return _classify_batch_local(list(texts), model_name, max_length)
 
-	logits = outputs.logits
-	pred = int(torch.argmax(logits, dim=-1).item())
 
-	# Determine a human-readable label from model config if available
-	label = None
-	try:
-		id2label = getattr(model.config, "id2label", None)
-		if id2label:
-			# id2label keys may be strings or ints
-			label = id2label.get(pred) if isinstance(id2label, dict) else None
-	except Exception:
-		label = None
+def evaluate_cascade(
+	texts: List[str],
+	malicious: List[int],
+	model_name: str = DEFEND_MODEL_NAME,
+	max_length: int = 512,
+) -> Dict[str, Any]:
+	"""
+	Measure the lexical + transformer cascade against the transformer alone.
+
+	Args:
+		texts: labelled prompts
+		malicious: 1 for malicious prompts, 0 for benign ones
+
+	Returns:
+		dict: the model and commit sha measured, escalation rate, recall and
+		precision of both setups, the recall lost by the cascade, and
+		per-prompt latency of each tier
+	"""
+	labels = np.asarray(malicious, dtype=bool)
+	name, revision = parse_model_spec(model_name)
+	revision = resolve_revision(name, revision)
+
+	start = time.perf_counter()
+	lexical = defend_lexical.screen(texts)
+	lexical_seconds = time.perf_counter() - start
+
+	start = time.perf_counter()
+	model_preds = _predict_batch(list(texts), name, max_length, revision)
+	model_seconds = time.perf_counter() - start
+
+	model_flags = np.array([pred == DEFEND_MALICIOUS_CLASS_ID for pred in model_preds])
+	cascade_flags = np.array([
+		(lex if lex is not None else pred) == DEFEND_MALICIOUS_CLASS_ID
+		for lex, pred in zip(lexical, model_preds)
+	])
+	escalated = np.array([lex is None for lex in lexical])
 
-	if label is None:
-		# fallback mapping commonly used: 0 -> Benign, 1 -> Malicious
-		label = "Malicious" if pred == 1 else "Benign"
+	def _recall(flags):
+		return float(flags[labels].mean()) if labels.any() else 0.0
 
-	return pred
+	def _precision(flags):
+		return float(labels[flags].mean()) if flags.any() else 0.0
 
+	n = max(len(texts), 1)
+	escalation_rate = float(escalated.mean()) if len(texts) else 0.0
+	lexical_ms = 1000.0 * lexical_seconds / n
+	model_ms = 1000.0 * model_seconds / n
+	return {
+		"model": name,
+		"revision": revision,
+		"samples": len(texts),
+		"escalation_rate": round(escalation_rate, 4),
+		"lexical_accuracy": round(float((cascade_flags == labels)[~escalated].mean()), 4) if (~escalated).any() else None,
+		"model_recall": round(_recall(model_flags), 4),
+		"cascade_recall": round(_recall(cascade_flags), 4),
+		"recall_loss": round(_recall(model_flags) - _recall(cascade_flags), 4),
+		"model_precision": round(_precision(model_flags), 4),
+		"cascade_precision": round(_precision(cascade_flags), 4),
+		"lexical_ms_per_prompt": round(lexical_ms, 4),
+		"model_ms_per_prompt": round(model_ms, 4),
+		"cascade_ms_per_prompt": round(lexical_ms + escalation_rate * model_ms, 4),
+	}
@@ -0,0 +1,75 @@
+"""
+Text embeddings for the RAG tools.
+
+With RAG_EMBEDDING_BACKEND "vertex" texts are embedded with the same Vertex AI
+model the corpora use (DEFAULT_EMBEDDING_MODEL); with "local" they are
+embedded in-process by a sentence-transformers model
+(RAG_LOCAL_EMBEDDING_MODEL), which needs the optional `sentence-transformers`
+package. Vectors are returned L2-normalized, so dot products are cosine
+similarities.
+"""
+
+import logging
+import threading
+from typing import Any, Dict, List
+
+import numpy as np
+
+from ..config import (
+    DEFAULT_EMBEDDING_MODEL,
+    RAG_EMBEDDING_BACKEND,
+    RAG_LOCAL_EMBEDDING_MODEL,
+)
+
+logger = logging.getLogger(__name__)
+
+# Vertex AI accepts at most 250 inputs per embedding request.
+_VERTEX_BATCH_SIZE = 250
+
+_MODELS: Dict[str, Any] = {}
+_MODEL_LOCK = threading.Lock()
+
+
+def _load_model(backend: str):
+    with _MODEL_LOCK:
+        if backend not in _MODELS:
+            if backend == "local":
+                from sentence_transformers import SentenceTransformer
+
+                _MODELS[backend] = SentenceTransformer(RAG_LOCAL_EMBEDDING_MODEL)
+            else:
+                from vertexai.language_models import TextEmbeddingModel
+
+                _MODELS[backend] = TextEmbeddingModel.from_pretrained(DEFAULT_EMBEDDING_MODEL.split("/")[-1])
+    return _MODELS[backend]
+
+
+def embed_texts(texts: List[str], task: str = "RETRIEVAL_QUERY", backend: str = RAG_EMBEDDING_BACKEND) -> np.ndarray:
+    """
+    Embed `texts` as an (n, d) float32 array of unit vectors.
+
+    Args:
+        texts: texts to embed
+        task: Vertex AI task type, "RETRIEVAL_QUERY" or "RETRIEVAL_DOCUMENT"
+        backend: "vertex" or "local"
+    """
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    model = _load_model(backend)
+    if backend == "local":
+        vectors = np.asarray(model.encode(list(texts), batch_size=64, show_progress_bar=False), dtype=np.float32)
+    else:
+        from vertexai.language_models import TextEmbeddingInput
+
+        vectors = []
+        for start in range(0, len(texts), _VERTEX_BATCH_SIZE):
+            inputs = [TextEmbeddingInput(text, task) for text in texts[start:start + _VERTEX_BATCH_SIZE]]
+            vectors.extend(embedding.values for embedding in model.get_embeddings(inputs))
+        vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def embed_query(text: str) -> np.ndarray:
+    """Embed a single query as a unit vector."""
+    return embed_texts([text])[0]
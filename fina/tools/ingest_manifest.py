@@ -0,0 +1,250 @@
+"""
+Incremental corpus ingestion.
+
+A manifest per corpus (RAG_MANIFEST_DIR/<corpus_id>.json) records, for every
+ingested source file, its content hash, the chunking config and the
+embedding model it was indexed with. `sync_sources` compares the given
+sources against it and only pays for the delta:
+  - unchanged files (same hash, chunking and embedding model) are skipped,
+  - changed files have their old copy deleted from the corpus and are re-imported,
+  - files already in the corpus but not in the manifest (corpora built before
+    it existed, or imported by other means) are handled like changed files,
+    since their content cannot be checked, so they are never duplicated,
+  - new files are imported.
+Imports run in batches of RAG_INGEST_BATCH_SIZE, RAG_INGEST_PARALLELISM at a
+time. Each batch waits for its import operation to finish and is written to
+the manifest as soon as it succeeds, so an interrupted sync resumes where it
+stopped.
+
+Content hashes are SHA-256 of local files and the MD5/CRC32C that Cloud
+Storage already keeps for gs:// objects (no download needed). Google Drive
+links cannot be hashed without downloading them and are always re-imported.
+
+Nightly re-sync of a document folder:
+
+    python -m fina.tools.ingest_manifest sync tax_docs gs://my-bucket/tax/ --prune
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from ..config import (
+    DEFAULT_CHUNK_OVERLAP,
+    DEFAULT_CHUNK_SIZE,
+    RAG_INGEST_BATCH_SIZE,
+    RAG_INGEST_PARALLELISM,
+    RAG_MANIFEST_DIR,
+)
+from .rag_backends import expand_local_paths, get_backend
+
+logger = logging.getLogger(__name__)
+
+
+class IngestManifest:
+    """Per-corpus record of ingested sources, persisted as JSON."""
+
+    def __init__(self, resource_name: str, directory: str = RAG_MANIFEST_DIR):
+        self.path = os.path.join(directory, f"{resource_name.split('/')[-1]}.json")
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.sources: Dict[str, Dict[str, Any]] = json.load(f).get("sources", {})
+        except FileNotFoundError:
+            self.sources = {}
+
+    def is_current(self, uri: str, content_hash: Optional[str], ingest_config: Dict[str, Any]) -> bool:
+        entry = self.sources.get(uri)
+        return (
+            entry is not None
+            and content_hash is not None
+            and entry.get("content_hash") == content_hash
+            and all(entry.get(key) == value for key, value in ingest_config.items())
+        )
+
+    def record(self, uri: str, content_hash: Optional[str], ingest_config: Dict[str, Any]) -> None:
+        with self._lock:
+            self.sources[uri] = {
+                "content_hash": content_hash,
+                **ingest_config,
+                "ingested_at": datetime.now(timezone.utc).isoformat(),
+            }
+
+    def forget(self, uri: str) -> None:
+        with self._lock:
+            self.sources.pop(uri, None)
+
+    def save(self) -> None:
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"sources": self.sources}, f, ensure_ascii=False, indent=2)
+            os.replace(self.path + ".tmp", self.path)
+
+
+def delete_manifest(resource_name: str) -> None:
+    """Remove the manifest of a deleted corpus."""
+    manifest = IngestManifest(resource_name)
+    if os.path.exists(manifest.path):
+        os.remove(manifest.path)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _gcs_objects(uri: str) -> Dict[str, Optional[str]]:
+    """gs:// objects under `uri` (an object or a prefix) and their stored hashes."""
+    from google.cloud import storage
+
+    bucket, _, prefix = uri[len("gs://"):].partition("/")
+    objects = {}
+    for blob in storage.Client().list_blobs(bucket, prefix=prefix):
+        if blob.name.endswith("/"):
+            continue
+        content_hash = f"md5:{blob.md5_hash}" if blob.md5_hash else (f"crc32c:{blob.crc32c}" if blob.crc32c else None)
+        objects[f"gs://{bucket}/{blob.name}"] = content_hash
+    return objects
+
+
+def expand_sources(paths: List[str]) -> Dict[str, Optional[str]]:
+    """
+    Expand folders and prefixes in `paths` to individual files with their content hashes.
+
+    Returns:
+        dict: file uri -> content hash, or None if the source cannot be hashed
+    """
+    sources: Dict[str, Optional[str]] = {}
+    local = [path for path in paths if os.path.exists(path)]
+    for path in paths:
+        if path.startswith("gs://"):
+            sources.update(_gcs_objects(path))
+        elif path not in local:
+            sources[path] = None
+    local_files = expand_local_paths(local)
+    with ThreadPoolExecutor(max_workers=max(1, RAG_INGEST_PARALLELISM)) as pool:
+        for path, content_hash in zip(local_files, pool.map(_sha256, local_files)):
+            sources[path] = f"sha256:{content_hash}"
+    return sources
+
+
+def sync_sources(resource_name: str, paths: List[str], prune: bool = False) -> Dict[str, Any]:
+    """
+    Bring the corpus in line with `paths`, importing only new and changed files.
+
+    Args:
+        resource_name: corpus resource name
+        paths: files, folders, gs:// objects or prefixes, and Drive links
+        prune: also delete files that were ingested from these paths before
+               but no longer exist there
+
+    Returns:
+        dict: files_added, files_updated, files_unchanged, files_removed,
+              files_failed (uri -> error) and batches (per-batch status)
+    """
+    backend = get_backend()
+    manifest = IngestManifest(resource_name)
+    ingest_config = {
+        "chunk_size": DEFAULT_CHUNK_SIZE,
+        "chunk_overlap": DEFAULT_CHUNK_OVERLAP,
+        "embedding_model": backend.embedding_model,
+        "backend": backend.name,
+    }
+    sources = expand_sources(paths)
+    # Files deleted from the corpus since (delete_document, console) count as new.
+    file_ids: Dict[str, List[str]] = {}
+    for record in backend.list_files(resource_name):
+        file_ids.setdefault(record["source_uri"], []).append(record["file_id"])
+
+    unchanged = [
+        uri for uri, content_hash in sources.items()
+        if uri in file_ids and manifest.is_current(uri, content_hash, ingest_config)
+    ]
+    stale = [uri for uri in sources if uri not in unchanged and (uri in manifest.sources or uri in file_ids)]
+    new = [uri for uri in sources if uri not in unchanged and uri not in stale]
+    removed = []
+    if prune:
+        # Sources under the synced paths that have disappeared from them.
+        roots = tuple(path.rstrip("/") for path in paths)
+        removed = [
+            uri for uri in manifest.sources
+            if uri not in sources and uri.startswith(roots)
+        ]
+
+    # Drop the old copies of changed and removed files.
+    to_delete = set(stale) | set(removed)
+    failed: Dict[str, str] = {}
+    if to_delete:
+        for uri in sorted(to_delete):
+            try:
+                for file_id in file_ids.get(uri, []):
+                    backend.delete_file(resource_name, file_id)
+                manifest.forget(uri)
+            except Exception as e:
+                logger.error(f"Could not delete the old copy of '{uri}': {str(e)}")
+                failed[uri] = str(e)
+        manifest.save()
+
+    to_import = [uri for uri in stale + new if uri not in failed]
+    batch_size = max(1, RAG_INGEST_BATCH_SIZE)
+    batches = [to_import[i:i + batch_size] for i in range(0, len(to_import), batch_size)]
+    batch_status: List[Dict[str, Any]] = []
+
+    def import_batch(batch: List[str]) -> int:
+        imported = backend.add_files(resource_name, batch)
+        for uri in batch:
+            manifest.record(uri, sources[uri], ingest_config)
+        manifest.save()
+        return imported
+
+    with ThreadPoolExecutor(max_workers=max(1, RAG_INGEST_PARALLELISM)) as pool:
+        futures = {pool.submit(import_batch, batch): (number, batch) for number, batch in enumerate(batches)}
+        for future in as_completed(futures):
+            number, batch = futures[future]
+            try:
+                imported = future.result()
+                batch_status.append({"batch": number, "files": len(batch), "imported": imported, "status": "success"})
+                logger.info(f"Ingestion batch {number + 1}/{len(batches)} done: {imported} file(s) imported")
+            except Exception as e:
+                logger.error(f"Ingestion batch {number + 1}/{len(batches)} failed: {str(e)}")
+                batch_status.append({"batch": number, "files": len(batch), "status": "error", "message": str(e)})
+                failed.update({uri: str(e) for uri in batch})
+
+    return {
+        "files_added": len([uri for uri in new if uri not in failed]),
+        "files_updated": len([uri for uri in stale if uri not in failed]),
+        "files_unchanged": len(unchanged),
+        "files_removed": len([uri for uri in removed if uri not in failed]),
+        "files_failed": failed,
+        "batches": sorted(batch_status, key=lambda status: status["batch"]),
+    }
+
+
+def _main() -> None:
+    from .utils import get_corpus_resource_name
+
+    parser = argparse.ArgumentParser(description="Incremental RAG corpus ingestion")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sync = sub.add_parser("sync", help="import new and changed files into a corpus")
+    sync.add_argument("corpus", help="corpus display name or resource name")
+    sync.add_argument("paths", nargs="+")
+    sync.add_argument("--prune", action="store_true", help="delete files that disappeared from the paths")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    resource_name = get_corpus_resource_name(args.corpus)
+    print(json.dumps(sync_sources(resource_name, args.paths, prune=args.prune), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    _main()
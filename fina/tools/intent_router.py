@@ -0,0 +1,847 @@
+"""
+Local intent router for the main flow.
+
+Classifies a user message into one of the fixed FINA intents without an LLM
+call, by nearest-centroid classification over labeled example messages
+(English and Vietnamese, with and without diacritics):
+  - "hashed" encoder (default): IDF-weighted hashed syllables, syllable
+    bigrams and character n-grams, diacritic-folded so "xoa khoan no" and
+    "xóa khoản nợ" look alike; no extra dependencies
+  - "embedding" encoder: the local sentence-transformers model
+    (RAG_LOCAL_EMBEDDING_MODEL), which needs `sentence-transformers`
+
+Confidences are softmaxes over the cosine similarities to the centroids (see
+IntentRouter for the two stages). The router only answers when it is
+confident enough; every other message, and every message it classifies as
+"unknown" (greetings, off-topic or vague requests), is left to the
+user_context_agent LLM.
+
+The confidence thresholds are calibrated when the router is built: the lowest
+thresholds at which the leave-one-out predictions on the built-in examples
+reach INTENT_ROUTER_TARGET_ACCURACY, and INTENT_ROUTER_WRITE_TARGET_ACCURACY
+for insert/edit/delete intents, which change the user's data; those also need
+INTENT_ROUTER_WRITE_MARGIN more confidence than the other intents. Set
+INTENT_ROUTER_THRESHOLD / INTENT_ROUTER_WRITE_THRESHOLD to fix them instead.
+
+Evaluate accuracy, coverage and latency at the calibrated thresholds, or
+calibrate for other targets (leave-one-out on the built-in examples, or on a
+CSV with text and intent columns):
+
+    python -m fina.tools.intent_router evaluate
+    python -m fina.tools.intent_router evaluate labeled.csv
+    python -m fina.tools.intent_router calibrate --target 0.99
+"""
+
+import argparse
+import csv
+import json
+import logging
+import threading
+import time
+import unicodedata
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..config import (
+    INTENT_ROUTER_ENCODER,
+    INTENT_ROUTER_TARGET_ACCURACY,
+    INTENT_ROUTER_TEMPERATURE,
+    INTENT_ROUTER_THRESHOLD,
+    INTENT_ROUTER_WRITE_MARGIN,
+    INTENT_ROUTER_WRITE_TARGET_ACCURACY,
+    INTENT_ROUTER_WRITE_THRESHOLD,
+)
+
+logger = logging.getLogger(__name__)
+
+N_FEATURES = 2 ** 14
+_CHAR_NGRAMS = (3, 4)
+
+INTENT_EXAMPLES: Dict[str, List[str]] = {
+    "insert_wallet": [
+        "Add a new wallet called savings with 5 million",
+        "Create a wallet for my cash",
+        "I opened a new bank account at Vietcombank",
+        "Thêm ví mới tên tiết kiệm",
+        "Tạo ví tiền mặt với số dư 2 triệu",
+        "tao vi moi cho tai khoan ngan hang",
+        "Tôi mới mở tài khoản ngân hàng Techcombank",
+        "Add my MoMo e-wallet with 1 million",
+        "Thêm tài khoản ngân hàng mới",
+        "new wallet",
+        "Add a wallet for my Techcombank account",
+        "Create a new e-wallet for ZaloPay",
+        "Tạo ví mới cho tài khoản MB Bank",
+        "Thêm ví ZaloPay số dư 500 nghìn",
+        "them vi momo",
+        "I want to add another wallet",
+        "Set up a wallet named travel fund",
+        "Mở ví mới tên quỹ du lịch",
+    ],
+    "insert_investment": [
+        "I just bought 0.1 Bitcoin",
+        "Add my investment of 100 FPT shares",
+        "Record that I invested 10 million in gold",
+        "Tôi vừa đầu tư Bitcoin",
+        "Tôi vừa mua 200 cổ phiếu VNM",
+        "them khoan dau tu vang 5 chi",
+        "Ghi lại khoản đầu tư 50 triệu vào quỹ ETF",
+        "I bought 50 shares of HPG today",
+        "Tôi mới mua 2 chỉ vàng",
+        "ghi nhan mua 0.5 ETH",
+        "I invested 20 million in VNM stock",
+        "Add 0.5 ETH to my investments",
+        "Record my purchase of 3 taels of gold",
+        "I put 50 million into a bond fund",
+        "Thêm khoản đầu tư 100 cổ phiếu FPT",
+        "Tôi vừa đầu tư 30 triệu vào cổ phiếu HPG",
+        "Tôi đã mua thêm 0.05 BTC",
+        "toi vua dau tu bitcoin",
+        "Ghi lại việc tôi mua 1000 đơn vị chứng chỉ quỹ",
+        "add a new investment in Ethereum",
+        "I just invested in Bitcoin",
+        "Log a new stock purchase: 100 MWG at 50k",
+    ],
+    "insert_debt": [
+        "I borrowed 20 million from my brother",
+        "Add a new loan of 500 million from the bank",
+        "Record a debt I owe to Minh",
+        "Tôi vừa vay anh trai 20 triệu",
+        "Thêm khoản nợ vay mua nhà 500 triệu",
+        "ghi no the tin dung 3 trieu",
+        "Tôi nợ bạn 1 triệu",
+        "I took a loan of 100 million",
+        "Tôi vừa vay ngân hàng 100 triệu",
+        "them khoan vay moi",
+        "Add a debt of 5 million to my friend Lan",
+        "I owe my sister 2 million",
+        "Record a new credit card debt of 10 million",
+        "Ghi lại khoản vay 50 triệu từ ngân hàng",
+        "Tôi mượn chị Lan 5 triệu",
+        "them no vay anh Nam 2 trieu",
+        "Log a loan I took for my car",
+        "Tôi vừa vay tiền mua xe máy",
+    ],
+    "insert_transaction": [
+        "Add a new transaction: $100 for groceries",
+        "I spent 50k on lunch today",
+        "Record my salary of 15 million",
+        "Tôi vừa chi 200 nghìn tiền xăng",
+        "Hôm nay ăn trưa hết 50k",
+        "them giao dich tien dien 800 nghin",
+        "Nhận lương 15 triệu tháng này",
+        "Paid 300k for the electricity bill",
+        "I received 2 million from freelance work",
+        "Chi 150k đi chợ",
+        "Mua cà phê 45k",
+        "income of 5 million today",
+        "Log an expense of 120k for taxi",
+        "Add 2 million rent payment",
+        "Record income: 3 million bonus",
+        "I paid 500k for internet",
+        "Ghi lại chi tiêu 300 nghìn tiền điện",
+        "Thêm giao dịch mua sắm 1 triệu",
+        "Hôm qua tôi tiêu 200k tiền cà phê",
+        "Tôi được thưởng 5 triệu",
+        "ghi chi 80k an sang",
+        "Spent 90k on a movie ticket",
+    ],
+    "edit_wallet": [
+        "Change my wallet balance to 3 million",
+        "Rename my savings wallet to emergency fund",
+        "Update the balance of my cash wallet",
+        "Sửa số dư ví tiền mặt thành 3 triệu",
+        "Đổi tên ví tiết kiệm",
+        "cap nhat so du vi ngan hang",
+        "Correct the balance of my MoMo wallet",
+        "Sửa lại ví MoMo",
+        "Edit my wallet",
+        "Update my Vietcombank wallet balance to 10 million",
+        "Change the name of my MoMo wallet",
+        "Chỉnh sửa ví ngân hàng",
+        "Cập nhật số dư ví MoMo thành 1 triệu",
+        "doi ten vi tien mat",
+        "Modify my cash wallet",
+        "Sửa tên ví thành quỹ khẩn cấp",
+    ],
+    "edit_investment": [
+        "Update my Bitcoin amount to 0.2",
+        "Change the buy price of my FPT shares",
+        "Edit my gold investment",
+        "Sửa số lượng cổ phiếu VNM thành 300",
+        "Cập nhật giá mua Bitcoin",
+        "sua khoan dau tu vang",
+        "Fix the quantity of my HPG shares",
+        "Sửa giá mua vàng thành 7 triệu",
+        "Edit my Bitcoin investment",
+        "Change my ETH quantity to 1.5",
+        "Update the purchase price of my gold investment",
+        "Modify my VNM investment",
+        "Chỉnh sửa khoản đầu tư Bitcoin",
+        "Sửa khoản đầu tư cổ phiếu FPT",
+        "Cập nhật số lượng vàng thành 5 chỉ",
+        "sua so luong bitcoin thanh 0.3",
+        "Correct the amount of my bond investment",
+        "Update my investment in HPG",
+    ],
+    "edit_debt": [
+        "Edit my debt to $500",
+        "Change the interest rate of my bank loan",
+        "Update the amount I owe my brother",
+        "Sửa khoản nợ thành 10 triệu",
+        "Cập nhật lãi suất khoản vay mua nhà",
+        "sua han tra no the tin dung",
+        "Change the due date of my loan",
+        "Sửa lãi suất khoản nợ",
+        "Edit the loan from my brother",
+        "Update my credit card debt to 4 million",
+        "Change my mortgage amount",
+        "Chỉnh sửa khoản vay ngân hàng",
+        "Cập nhật số tiền tôi nợ chị Lan",
+        "sua khoan no anh trai thanh 15 trieu",
+        "Modify my car loan",
+        "Đổi ngày trả nợ thẻ tín dụng",
+    ],
+    "edit_transaction": [
+        "Change yesterday's lunch expense to 70k",
+        "Edit the grocery transaction amount",
+        "Fix the category of my last transaction",
+        "Sửa lại khoản chi tiêu hôm qua thành 500$",
+        "Cập nhật giao dịch tiền điện thành 900 nghìn",
+        "sua giao dich an trua hom qua",
+        "Update the amount of my coffee purchase",
+        "Sửa danh mục giao dịch cuối cùng",
+        "Edit my lunch transaction",
+        "Change the date of my rent payment",
+        "Update the taxi expense to 150k",
+        "Modify the amount of yesterday's grocery expense",
+        "Chỉnh sửa giao dịch tiền xăng",
+        "Sửa số tiền chi ăn sáng thành 40k",
+        "cap nhat khoan chi tien nha",
+        "Đổi ngày giao dịch lương",
+    ],
+    "delete_wallet": [
+        "Delete my old wallet",
+        "Remove the cash wallet",
+        "Close my savings wallet",
+        "Xóa ví tiền mặt",
+        "Xoá ví cũ đi",
+        "xoa vi tiet kiem",
+        "Remove my MoMo wallet",
+        "Xóa tài khoản ngân hàng cũ",
+        "Delete the Techcombank wallet",
+        "Remove my travel fund wallet",
+        "Get rid of my ZaloPay wallet",
+        "Xóa ví ZaloPay",
+        "Bỏ ví quỹ du lịch đi",
+        "xoa vi momo",
+        "Delete wallet",
+        "Xóa ví ngân hàng Vietcombank",
+    ],
+    "delete_investment": [
+        "Delete my Bitcoin investment",
+        "Remove the FPT shares from my portfolio",
+        "I sold all my gold, remove it",
+        "Xóa khoản đầu tư vàng",
+        "Bỏ cổ phiếu VNM khỏi danh mục",
+        "xoa khoan dau tu bitcoin",
+        "Delete my HPG shares",
+        "Xóa cổ phiếu HPG",
+        "Remove my Ethereum investment",
+        "Delete the gold investment",
+        "Remove my bond fund investment",
+        "Delete my VNM stock investment",
+        "Xóa khoản đầu tư Bitcoin của tôi",
+        "Xóa khoản đầu tư cổ phiếu FPT",
+        "xoa dau tu ETH",
+        "Tôi đã bán hết vàng, xóa khoản đầu tư đó đi",
+        "Get rid of my HPG investment",
+        "Remove the Bitcoin from my investments",
+    ],
+    "delete_debt": [
+        "Delete the loan from my brother",
+        "Remove my credit card debt, it's paid off",
+        "I paid off the bank loan, delete it",
+        "Xóa khoản nợ anh trai",
+        "Đã trả hết nợ thẻ tín dụng, xóa đi",
+        "xoa khoan vay mua nha",
+        "Delete my debt",
+        "Xóa nợ đi",
+        "Remove the loan from Lan",
+        "Delete my mortgage",
+        "Delete the credit card debt",
+        "Xóa khoản vay ngân hàng",
+        "Xóa khoản nợ chị Lan",
+        "xoa no the tin dung",
+        "Remove my car loan",
+        "Tôi trả hết nợ anh Nam rồi, xóa đi",
+    ],
+    "delete_transaction": [
+        "Delete my lunch expense",
+        "Remove yesterday's grocery transaction",
+        "Undo the last transaction",
+        "Xóa khoản thu nhập ngày 1/9",
+        "Xóa giao dịch tiền xăng hôm qua",
+        "xoa khoan chi an trua",
+        "Delete the coffee transaction",
+        "Xóa giao dịch cà phê",
+        "Delete the taxi expense",
+        "Remove my rent payment from yesterday",
+        "Delete the duplicate grocery transaction",
+        "Remove the bonus income record",
+        "Xóa khoản chi tiền điện",
+        "Xóa giao dịch ăn trưa hôm qua",
+        "xoa giao dich mua sam",
+        "Bỏ giao dịch bị trùng đi",
+    ],
+    "read_wallet": [
+        "Show my wallet balance",
+        "How much money is in my wallets?",
+        "List all my wallets",
+        "Cho tôi xem số dư ví",
+        "Tôi còn bao nhiêu tiền trong ví",
+        "xem danh sach vi",
+        "What is my current balance?",
+        "Số dư tài khoản của tôi",
+        "What is my balance?",
+        "Show my balance",
+        "How much cash do I have?",
+        "Check my wallet balances",
+        "Số dư hiện tại của tôi là bao nhiêu",
+        "Kiểm tra số dư ví MoMo",
+        "xem so du",
+        "Which wallets do I have?",
+        "Tổng số dư các ví của tôi",
+    ],
+    "read_investment": [
+        "Show my investments",
+        "What is my portfolio worth?",
+        "List the stocks I own",
+        "Cho tôi xem danh mục đầu tư",
+        "Tôi đang có những khoản đầu tư nào",
+        "xem lai cac khoan dau tu",
+        "What stocks do I hold?",
+        "Xem các cổ phiếu tôi đang nắm giữ",
+        "Danh mục đầu tư hiện tại của tôi lời lỗ thế nào",
+        "Show my investment portfolio",
+        "How are my investments doing?",
+        "How much Bitcoin do I have?",
+        "What is the profit on my investments?",
+        "Xem lời lỗ các khoản đầu tư",
+        "Tôi có bao nhiêu Bitcoin",
+        "xem danh muc dau tu",
+        "List my crypto holdings",
+    ],
+    "read_debt": [
+        "Show my debts",
+        "How much do I owe in total?",
+        "List my loans",
+        "Cho tôi xem các khoản nợ",
+        "Tôi còn nợ bao nhiêu",
+        "xem danh sach khoan vay",
+        "Who do I owe money to?",
+        "Danh sách nợ của tôi",
+        "What loans do I have?",
+        "Show my credit card debt",
+        "When is my loan due?",
+        "Xem khoản vay ngân hàng",
+        "Khi nào đến hạn trả nợ",
+        "xem cac khoan no",
+        "How much do I still owe the bank?",
+        "Tổng nợ của tôi là bao nhiêu",
+    ],
+    "read_transaction": [
+        "Show my transactions this month",
+        "How much did I spend last week?",
+        "List my expenses for September",
+        "Cho tôi xem tổng chi tiêu tháng này",
+        "Tháng trước tôi tiêu hết bao nhiêu",
+        "xem lich su giao dich",
+        "Show my spending history",
+        "Xem các khoản chi tháng 9",
+        "What did I spend money on yesterday?",
+        "Show my spending",
+        "Show my transaction history",
+        "What were my expenses last month?",
+        "List my income this year",
+        "Show my recent transactions",
+        "Xem lịch sử chi tiêu",
+        "Lịch sử giao dịch tháng trước",
+        "Tuần này tôi đã tiêu những gì",
+        "xem chi tieu thang nay",
+        "How much did I spend on food?",
+        "Show my spending history for last month",
+    ],
+    "tax": [
+        "How much tax will I pay this year?",
+        "Calculate my personal income tax",
+        "What are the tax brackets in Vietnam?",
+        "Tính thuế thu nhập cá nhân",
+        "Giảm trừ gia cảnh là bao nhiêu",
+        "han nop to khai quyet toan thue",
+        "Do I need to file a tax return?",
+        "Income tax for a 30 million salary",
+        "thuế TNCN",
+        "Tôi phải nộp bao nhiêu thuế",
+        "tax deduction for dependents",
+        "Thuế suất đối với thu nhập từ chứng khoán",
+        "How do I file my tax settlement?",
+        "What is the personal income tax rate?",
+        "How is tax calculated on my bonus?",
+        "Tax on stock trading in Vietnam",
+        "Cách tính thuế TNCN từ tiền lương",
+        "Thuế cho thuê nhà tính thế nào",
+        "quyet toan thue TNCN",
+        "Do I pay tax on crypto gains?",
+        "Mức giảm trừ cho người phụ thuộc",
+    ],
+    "invest": [
+        "Suggest some crypto investments",
+        "Should I invest in stocks or gold?",
+        "What should I invest 100 million in?",
+        "Tôi muốn đầu tư vào cổ phiếu",
+        "Gợi ý danh mục đầu tư cho tôi",
+        "nen dau tu gi voi 50 trieu",
+        "Is Bitcoin a good investment now?",
+        "Which stocks should I buy?",
+        "Tư vấn đầu tư cho tôi",
+        "Có nên mua vàng lúc này không",
+        "Build me an investment portfolio",
+        "recommend a coin to buy",
+        "Nên đầu tư crypto hay gửi tiết kiệm",
+        "Is it a good time to buy gold?",
+        "What crypto should I buy?",
+        "Recommend some Vietnamese stocks",
+        "How should I diversify my investments?",
+        "Tôi nên đầu tư vào đâu",
+        "Có nên mua Bitcoin bây giờ không",
+        "nen mua co phieu nao",
+        "Give me investment advice for 200 million",
+        "Optimize my portfolio",
+        "Should I buy ETH or BTC?",
+    ],
+    "planner": [
+        "Create a saving plan for next month",
+        "Make me a budget for this month",
+        "Help me plan to save 100 million in a year",
+        "Lập kế hoạch chi tiêu tháng tới",
+        "Lên ngân sách cho tháng này",
+        "lap ke hoach tiet kiem mua nha",
+        "Plan my expenses for next month",
+        "Help me budget my salary",
+        "Kế hoạch tiết kiệm để mua xe",
+        "Tôi muốn tiết kiệm 20 triệu mỗi tháng, lập kế hoạch giúp tôi",
+        "set a financial goal of 500 million",
+        "Help me save for a house",
+        "Create a monthly budget",
+        "How can I save more money each month?",
+        "Plan my savings for a car",
+        "Lập ngân sách tháng sau",
+        "Giúp tôi lên kế hoạch tiết kiệm",
+        "ke hoach chi tieu tuan nay",
+        "Set a budget of 10 million for next month",
+    ],
+    "visualize": [
+        "Show me a chart of my expenses",
+        "Plot my spending by category",
+        "Draw a graph of my income over time",
+        "Vẽ biểu đồ chi tiêu của tôi",
+        "Biểu đồ thu chi tháng này",
+        "ve do thi thu nhap",
+        "Visualize my transactions",
+        "Show a pie chart of spending categories",
+        "Vẽ biểu đồ thu nhập theo tháng",
+        "graph my expenses",
+        "Biểu đồ tròn chi tiêu theo danh mục",
+        "Chart my spending history",
+        "Plot my balance over time",
+        "Show a bar chart of monthly income",
+        "Visualize my expenses by category",
+        "Vẽ đồ thị chi tiêu tháng này",
+        "Biểu đồ cột thu nhập",
+        "ve bieu do chi tieu",
+        "Graph my spending for the last 6 months",
+    ],
+    "research": [
+        "Research the latest trends in cryptocurrency",
+        "What is happening in the Vietnamese stock market?",
+        "Explain what an ETF is",
+        "Tìm hiểu về cổ phiếu công nghệ",
+        "Tin tức thị trường chứng khoán hôm nay",
+        "lai suat tiet kiem ngan hang hien nay",
+        "What is the news about gold prices?",
+        "Giá vàng hôm nay thế nào",
+        "Current bank interest rates in Vietnam",
+        "Thông tin về công ty FPT",
+        "Explain how bonds work",
+        "Tìm hiểu về quỹ ETF",
+        "What is the current gold price?",
+        "Tell me about Bitcoin halving",
+        "How does the stock market work?",
+        "Latest news on VN-Index",
+        "Giá Bitcoin hiện tại bao nhiêu",
+        "Tin tức về lãi suất ngân hàng",
+        "tim hieu ve trai phieu",
+        "What is a mutual fund?",
+        "What is the exchange rate of USD to VND?",
+        "Explain compound interest",
+    ],
+    "unknown": [
+        "Hello",
+        "Hi there",
+        "Xin chào",
+        "Thanks!",
+        "Cảm ơn bạn",
+        "What can you do?",
+        "Bạn là ai",
+        "What's the weather today?",
+        "Tell me a joke",
+        "ok",
+        "Hôm nay trời đẹp quá",
+        "Who won the football match?",
+        "Write me a poem",
+        "Dịch câu này sang tiếng Anh",
+        "asdfgh",
+        "Bạn có khỏe không",
+        "help",
+        "Recommend a good restaurant",
+    ],
+}
+
+
+def _fold(text: str) -> str:
+    """Lower-case `text` and strip Vietnamese diacritics."""
+    text = unicodedata.normalize("NFC", text).lower().replace("đ", "d")
+    return "".join(c for c in unicodedata.normalize("NFD", text) if not unicodedata.combining(c))
+
+
+def _hashed_terms(text: str) -> np.ndarray:
+    folded = _fold(text)
+    words = "".join(c if c.isalnum() else " " for c in folded).split()
+    padded = f" {' '.join(words)} "
+    terms = [f"w:{w}" for w in words]
+    terms += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    terms += [padded[i:i + n] for n in _CHAR_NGRAMS for i in range(len(padded) - n + 1)]
+    return np.fromiter((zlib.crc32(t.encode("utf-8")) % N_FEATURES for t in terms), dtype=np.int64, count=len(terms))
+
+
+class HashedEncoder:
+    """IDF-weighted hashed term vectors."""
+
+    def __init__(self):
+        self.idf = np.ones(N_FEATURES, dtype=np.float32)
+
+    def _counts(self, texts: Sequence[str]) -> np.ndarray:
+        counts = np.zeros((len(texts), N_FEATURES), dtype=np.float32)
+        for i, text in enumerate(texts):
+            np.add.at(counts[i], _hashed_terms(text), 1.0)
+        return counts
+
+    def fit(self, texts: Sequence[str]) -> None:
+        df = (self._counts(texts) > 0).sum(axis=0)
+        self.idf = np.log((1.0 + len(texts)) / (1.0 + df)).astype(np.float32) + 1.0
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.log1p(self._counts(texts)) * self.idf
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+class EmbeddingEncoder:
+    """Sentence-transformers embeddings."""
+
+    def fit(self, texts: Sequence[str]) -> None:
+        pass
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        from .embeddings import embed_texts
+
+        return embed_texts(list(texts), backend="local")
+
+
+_ENCODERS = {"hashed": HashedEncoder, "embedding": EmbeddingEncoder}
+_CRUD_ACTIONS = ("insert", "edit", "delete", "read")
+_WRITE_ACTIONS = ("insert", "edit", "delete")
+UNKNOWN_INTENT = "unknown"
+
+
+def _split_intent(intent: str) -> Tuple[str, Optional[str]]:
+    """"delete_debt" -> ("delete", "debt"); "tax" -> ("tax", None)."""
+    action, _, entity = intent.partition("_")
+    return (action, entity) if action in _CRUD_ACTIONS and entity else (intent, None)
+
+
+def is_write_intent(intent: str) -> bool:
+    """Whether `intent` inserts, edits or deletes the user's data."""
+    return _split_intent(intent)[0] in _WRITE_ACTIONS
+
+
+def _lowest_threshold(confidences: Sequence[float], correct: Sequence[bool], target: float) -> float:
+    """Lowest confidence threshold at which the predictions kept reach `target` accuracy (1.0 keeps none)."""
+    order = np.argsort(-np.asarray(confidences, dtype=np.float64))
+    if order.shape[0] == 0:
+        return 1.0
+    ranked = np.asarray(confidences, dtype=np.float64)[order]
+    # Accuracy of the predictions kept by a threshold equal to each confidence.
+    kept_accuracy = np.cumsum(np.asarray(correct, dtype=np.float64)[order]) / np.arange(1, order.shape[0] + 1)
+    # Ties are all kept or all dropped, so only the last of each run of equal confidences counts.
+    last_of_tie = np.append(ranked[1:] != ranked[:-1], True)
+    reaching = np.flatnonzero((kept_accuracy >= target) & last_of_tie)
+    return float(ranked[reaching[-1]]) if reaching.shape[0] else 1.0
+
+
+def calibrate_thresholds(
+    labels: Sequence[str],
+    predictions: Sequence[Tuple[str, float]],
+    target: float = INTENT_ROUTER_TARGET_ACCURACY,
+    write_target: float = INTENT_ROUTER_WRITE_TARGET_ACCURACY,
+    write_margin: float = INTENT_ROUTER_WRITE_MARGIN,
+) -> Tuple[float, float]:
+    """
+    Confidence thresholds at which routed messages reach the target accuracies.
+
+    Predictions of write intents and of the other intents are calibrated
+    separately, so a misroute into insert/edit/delete is held to
+    `write_target`, and the write threshold is at least `write_margin` above
+    the other one; "unknown" predictions are never routed.
+
+    Returns:
+        (threshold, write_threshold)
+    """
+    groups = {True: ([], []), False: ([], [])}
+    for label, (intent, confidence) in zip(labels, predictions):
+        if intent == UNKNOWN_INTENT:
+            continue
+        confidences, correct = groups[is_write_intent(intent)]
+        confidences.append(confidence)
+        correct.append(intent == label)
+    threshold = _lowest_threshold(*groups[False], target)
+    return threshold, max(_lowest_threshold(*groups[True], write_target), min(threshold + write_margin, 1.0))
+
+
+class _NearestCentroid:
+    """Cosine nearest-centroid classifier with softmax confidences."""
+
+    def __init__(self, vectors: np.ndarray, labels: Sequence[str], temperature: float):
+        self.classes = sorted(set(labels))
+        self.labels = np.asarray([self.classes.index(label) for label in labels])
+        self.temperature = temperature
+        self.sums = np.stack([vectors[self.labels == i].sum(axis=0) for i in range(len(self.classes))])
+        self.centroids = _normalize(self.sums)
+
+    def probabilities(self, vectors: np.ndarray, centroids: Optional[np.ndarray] = None) -> np.ndarray:
+        logits = vectors @ (self.centroids if centroids is None else centroids).T / self.temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def held_out_probabilities(self, vector: np.ndarray, label: int) -> np.ndarray:
+        """Class probabilities of a training vector with it removed from its centroid."""
+        sums = self.sums.copy()
+        sums[label] -= vector
+        return self.probabilities(vector[None, :], _normalize(sums))[0]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+class IntentRouter:
+    """
+    Two-stage nearest-centroid intent classifier.
+
+    The CRUD intents are action x entity (insert_debt, read_wallet, ...), so
+    the first stage picks the action or standalone intent (insert, edit,
+    delete, read, tax, invest, ...) and, for CRUD actions, the second stage
+    picks the entity (wallet, investment, debt, transaction). Every CRUD
+    example then trains both its action and its entity centroid, which
+    generalizes far better than one centroid per combined intent. The
+    confidence is the product of the two stages' probabilities.
+    """
+
+    def __init__(
+        self,
+        examples: Dict[str, List[str]],
+        encoder: str = INTENT_ROUTER_ENCODER,
+        temperature: float = INTENT_ROUTER_TEMPERATURE,
+    ):
+        if encoder not in _ENCODERS:
+            raise ValueError(f"Unknown intent router encoder '{encoder}'. Expected one of: {', '.join(_ENCODERS)}")
+        self.encoder = _ENCODERS[encoder]()
+        self.texts = [text for intent in sorted(examples) for text in examples[intent]]
+        self.intents = [intent for intent in sorted(examples) for _ in examples[intent]]
+        self.encoder.fit(self.texts)
+        self.vectors = self.encoder.encode(self.texts)
+        actions, entities = zip(*(_split_intent(intent) for intent in self.intents))
+        self.crud = np.asarray([entity is not None for entity in entities])
+        self.action = _NearestCentroid(self.vectors, actions, temperature)
+        self.entity = _NearestCentroid(
+            self.vectors[self.crud], [entity for entity in entities if entity is not None], temperature
+        )
+        self.threshold, self.write_threshold = calibrate_thresholds(self.intents, self.leave_one_out())
+        if INTENT_ROUTER_THRESHOLD:
+            self.threshold = float(INTENT_ROUTER_THRESHOLD)
+        if INTENT_ROUTER_WRITE_THRESHOLD:
+            self.write_threshold = float(INTENT_ROUTER_WRITE_THRESHOLD)
+
+    def _combine(self, action_probs: np.ndarray, entity_probs: np.ndarray) -> Tuple[str, float]:
+        action = int(action_probs.argmax())
+        name = self.action.classes[action]
+        if name not in _CRUD_ACTIONS:
+            return name, float(action_probs[action])
+        entity = int(entity_probs.argmax())
+        return f"{name}_{self.entity.classes[entity]}", float(action_probs[action] * entity_probs[entity])
+
+    def predict(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        """(intent, confidence) of each text."""
+        if not texts:
+            return []
+        vectors = self.encoder.encode(texts)
+        return [
+            self._combine(action_probs, entity_probs)
+            for action_probs, entity_probs in zip(self.action.probabilities(vectors), self.entity.probabilities(vectors))
+        ]
+
+    def routes(self, intent: str, confidence: float) -> bool:
+        """Whether a prediction is confident enough to skip the LLM."""
+        if intent == UNKNOWN_INTENT:
+            return False
+        return confidence >= (self.write_threshold if is_write_intent(intent) else self.threshold)
+
+    def leave_one_out(self) -> List[Tuple[str, float]]:
+        """Predictions for each built-in example with that example left out of its centroids."""
+        predictions = []
+        entity_row = np.cumsum(self.crud) - 1
+        for i, vector in enumerate(self.vectors):
+            action_probs = self.action.held_out_probabilities(vector, self.action.labels[i])
+            if self.crud[i]:
+                entity_probs = self.entity.held_out_probabilities(vector, self.entity.labels[entity_row[i]])
+            else:
+                entity_probs = self.entity.probabilities(vector[None, :])[0]
+            predictions.append(self._combine(action_probs, entity_probs))
+        return predictions
+
+
+_ROUTER: Optional[IntentRouter] = None
+_ROUTER_LOCK = threading.Lock()
+
+
+def get_intent_router() -> IntentRouter:
+    global _ROUTER
+    with _ROUTER_LOCK:
+        if _ROUTER is None:
+            _ROUTER = IntentRouter(INTENT_EXAMPLES)
+    return _ROUTER
+
+
+def classify_intent(text: str) -> Tuple[Optional[str], float]:
+    """
+    Classify one user message.
+
+    Returns:
+        (intent, confidence): intent is None when the router is not confident
+        enough (or the message is "unknown") and it should go to the LLM instead
+    """
+    router = get_intent_router()
+    intent, confidence = router.predict([text])[0]
+    return (intent if router.routes(intent, confidence) else None), confidence
+
+
+def _report(
+    router: IntentRouter,
+    texts: Sequence[str],
+    labels: Sequence[str],
+    predictions: Sequence[Tuple[str, float]],
+    latency_ms: List[float],
+) -> dict:
+    routed = [
+        (text, label, intent, confidence)
+        for text, label, (intent, confidence) in zip(texts, labels, predictions)
+        if router.routes(intent, confidence)
+    ]
+    writes = [(label, intent) for _, label, intent, _ in routed if is_write_intent(intent)]
+    correct = sum(label == intent for label, (intent, _) in zip(labels, predictions))
+    routed_correct = sum(label == intent for _, label, intent, _ in routed)
+    return {
+        "examples": len(labels),
+        "threshold": round(router.threshold, 4),
+        "write_threshold": round(router.write_threshold, 4),
+        "accuracy": round(correct / len(labels), 4) if labels else 0.0,
+        # Share of messages answered locally, and how often those are right.
+        "coverage": round(len(routed) / len(labels), 4) if labels else 0.0,
+        "routed_accuracy": round(routed_correct / len(routed), 4) if routed else 0.0,
+        "write_routed_accuracy": round(sum(l == i for l, i in writes) / len(writes), 4) if writes else 0.0,
+        "routed_errors": [
+            {"text": text, "label": label, "intent": intent, "confidence": round(confidence, 4)}
+            for text, label, intent, confidence in routed if label != intent
+        ],
+        "latency_ms_p50": round(float(np.percentile(latency_ms, 50)), 3) if latency_ms else 0.0,
+        "latency_ms_p95": round(float(np.percentile(latency_ms, 95)), 3) if latency_ms else 0.0,
+    }
+
+
+def _predictions(
+    router: IntentRouter,
+    texts: Optional[Sequence[str]],
+    labels: Optional[Sequence[str]],
+) -> Tuple[Sequence[str], Sequence[str], List[Tuple[str, float]], List[float]]:
+    """(texts, labels, predictions, latency_ms); leave-one-out on the built-in examples without `texts`."""
+    latency_ms = []
+    if texts is None:
+        texts, labels = router.texts, router.intents
+        predictions = router.leave_one_out()
+        for text in texts:
+            start = time.perf_counter()
+            router.predict([text])
+            latency_ms.append((time.perf_counter() - start) * 1000)
+    else:
+        predictions = []
+        for text in texts:
+            start = time.perf_counter()
+            predictions.append(router.predict([text])[0])
+            latency_ms.append((time.perf_counter() - start) * 1000)
+    return texts, labels, predictions, latency_ms
+
+
+def evaluate_router(texts: Optional[Sequence[str]] = None, labels: Optional[Sequence[str]] = None) -> dict:
+    """
+    Accuracy, coverage and routed accuracy at the router's thresholds, and per-message latency.
+
+    Without `texts`, the built-in examples are scored leave-one-out.
+    """
+    router = get_intent_router()
+    return _report(router, *_predictions(router, texts, labels))
+
+
+def _main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluate or calibrate the local intent router")
+    parser.add_argument("command", choices=["evaluate", "calibrate"])
+    parser.add_argument("csv_path", nargs="?", help="CSV with text and intent columns; built-in examples if omitted")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--label-column", default="intent")
+    parser.add_argument("--target", type=float, default=INTENT_ROUTER_TARGET_ACCURACY)
+    parser.add_argument("--write-target", type=float, default=INTENT_ROUTER_WRITE_TARGET_ACCURACY)
+    parser.add_argument("--write-margin", type=float, default=INTENT_ROUTER_WRITE_MARGIN)
+    args = parser.parse_args()
+
+    texts = labels = None
+    if args.csv_path:
+        with open(args.csv_path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        texts = [row[args.text_column] for row in rows]
+        labels = [row[args.label_column] for row in rows]
+    if args.command == "evaluate":
+        print(json.dumps(evaluate_router(texts, labels), ensure_ascii=False, indent=2))
+        return
+    router = get_intent_router()
+    _, labels, predictions, _ = _predictions(router, texts, labels)
+    threshold, write_threshold = calibrate_thresholds(
+        labels, predictions, args.target, args.write_target, args.write_margin
+    )
+    print(f"INTENT_ROUTER_THRESHOLD={threshold:.4f}")
+    print(f"INTENT_ROUTER_WRITE_THRESHOLD={write_threshold:.4f}")
+
+
+if __name__ == "__main__":
+    _main()
@@ -1,17 +1,17 @@
 # investment_tools.py
-import requests
 from vnstock import Vnstock
 import os
-import json
+
+from ..config import PROVIDER_TIMEOUT_SECONDS
+from .portfolio_analytics import optimize_portfolio
+from .provider_replay import get_http_session, replay_call
+from .result_encoding import encode_result, to_table
 
 COINMARKETCAP_API_KEY = os.getenv("COINMARKETCAP_API_KEY")
 
 
-def get_top_10_crypto():
-    """
-    Fetch top 10 cryptocurrencies by market cap from CoinMarketCap.
-    Returns: JSON string with list of crypto info
-    """
+def _fetch_top_10_crypto() -> list:
+    """Top 10 cryptocurrencies by market cap as a list of dicts."""
     url = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/listings/latest"
     headers = {
         "Accepts": "application/json",
@@ -19,31 +19,24 @@ def get_top_10_crypto():
     }
     params = {"start": 1, "limit": 10, "convert": "USD"}
 
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        data = response.json()
-
-        top_10_crypto = []
-        for item in data.get("data", []):
-            crypto_info = {
-                "name": item["name"],
-                "symbol": item["symbol"],
-                "price_usd": round(item["quote"]["USD"]["price"], 2),
-                "percent_change_24h": round(item["quote"]["USD"]["percent_change_24h"], 2),
-                "market_cap": round(item["quote"]["USD"]["market_cap"], 2)
-            }
-            top_10_crypto.append(crypto_info)
-
-        return json.dumps(top_10_crypto, indent=4)
-    except Exception as e:
-        return json.dumps({"error": str(e)}, indent=4)
+    response = get_http_session().get(url, headers=headers, params=params, timeout=PROVIDER_TIMEOUT_SECONDS)
+    data = response.json()
+
+    top_10_crypto = []
+    for item in data.get("data", []):
+        crypto_info = {
+            "name": item["name"],
+            "symbol": item["symbol"],
+            "price_usd": item["quote"]["USD"]["price"],
+            "percent_change_24h": item["quote"]["USD"]["percent_change_24h"],
+            "market_cap": item["quote"]["USD"]["market_cap"]
+        }
+        top_10_crypto.append(crypto_info)
+    return top_10_crypto
 
 
-def get_crypto_details(symbol: str):
-    """
-    Fetch detailed data for a specific cryptocurrency by symbol (e.g., BTC, ETH).
-    Returns: JSON string with crypto detail info
-    """
+def _fetch_crypto_details(symbol: str) -> dict:
+    """Details of one cryptocurrency, or {"error": ...} if not found."""
     url = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
     headers = {
         "Accepts": "application/json",
@@ -51,80 +44,114 @@ def get_crypto_details(symbol: str):
     }
     params = {"symbol": symbol.upper(), "convert": "USD"}
 
+    response = get_http_session().get(url, headers=headers, params=params, timeout=PROVIDER_TIMEOUT_SECONDS)
+    data = response.json()
+
+    if "data" in data and symbol.upper() in data["data"]:
+        info = data["data"][symbol.upper()]
+        return {
+            "name": info["name"],
+            "symbol": info["symbol"],
+            "price_usd": info["quote"]["USD"]["price"],
+            "percent_change_24h": info["quote"]["USD"]["percent_change_24h"],
+            "market_cap": info["quote"]["USD"]["market_cap"],
+            "volume_24h": info["quote"]["USD"]["volume_24h"],
+            "circulating_supply": info["circulating_supply"],
+            "rank": info["cmc_rank"]
+        }
+    return {"error": "Symbol not found"}
+
+
+def _fetch_top_10_vn_stocks() -> list:
+    """Top 10 Vietnamese stocks by market cap as a list of dicts."""
+    df = replay_call(
+        "vnstock.stock_top",
+        lambda: Vnstock().stock_top(symbol='VNINDEX', page=0, size=10, sort='marketCap', order='desc'),
+        symbol='VNINDEX', size=10, sort='marketCap',
+    )
+
+    top_10_stocks = []
+    for _, row in df.iterrows():
+        stock_info = {
+            "ticker": row["ticker"],
+            "price": row["price"],
+            "percent_change": row["percentPriceChange"],
+            "volume": row["totalMatchVolume"],
+            "market_cap": row["marketCap"],
+            "industry": row.get("industryName", "N/A")
+        }
+        top_10_stocks.append(stock_info)
+    return top_10_stocks
+
+
+def _fetch_stock_details(symbol: str) -> dict:
+    """Details of one VN stock."""
+    def _profile_and_quote():
+        stock = Vnstock().stock(symbol)
+        return stock.profile(), stock.quote()
+
+    profile, quote = replay_call("vnstock.stock_details", _profile_and_quote, symbol=symbol.upper())
+
+    return {
+        "ticker": symbol.upper(),
+        "company_name": profile.get("companyName", "N/A"),
+        "industry": profile.get("industryName", "N/A"),
+        "price": quote.get("price", "N/A"),
+        "change_percent": quote.get("percentPriceChange", "N/A"),
+        "market_cap": profile.get("marketCap", "N/A"),
+        "pe_ratio": profile.get("pe", "N/A"),
+        "roe": profile.get("roe", "N/A"),
+        "eps": profile.get("eps", "N/A")
+    }
+
+
+def get_top_10_crypto():
+    """
+    Fetch top 10 cryptocurrencies by market cap from CoinMarketCap.
+    Returns: compact JSON table with list of crypto info
+    """
+    try:
+        return encode_result(_fetch_top_10_crypto())
+    except Exception as e:
+        return encode_result({"error": str(e)})
+
+
+def get_crypto_details(symbol: str):
+    """
+    Fetch detailed data for a specific cryptocurrency by symbol (e.g., BTC, ETH).
+    Returns: compact JSON with crypto detail info
+    """
     try:
-        response = requests.get(url, headers=headers, params=params)
-        data = response.json()
-
-        if "data" in data and symbol.upper() in data["data"]:
-            info = data["data"][symbol.upper()]
-            return json.dumps({
-                "name": info["name"],
-                "symbol": info["symbol"],
-                "price_usd": round(info["quote"]["USD"]["price"], 2),
-                "percent_change_24h": round(info["quote"]["USD"]["percent_change_24h"], 2),
-                "market_cap": round(info["quote"]["USD"]["market_cap"], 2),
-                "volume_24h": round(info["quote"]["USD"]["volume_24h"], 2),
-                "circulating_supply": round(info["circulating_supply"], 2),
-                "rank": info["cmc_rank"]
-            }, indent=4)
-        else:
-            return json.dumps({"error": "Symbol not found"}, indent=4)
+        return encode_result(_fetch_crypto_details(symbol))
     except Exception as e:
-        return json.dumps({"error": str(e)}, indent=4)
+        return encode_result({"error": str(e)})
 
 def get_top_10_vn_stocks():
     """
     Fetch top 10 Vietnamese stocks by market cap.
-    Returns: JSON string with list of stock info
+    Returns: compact JSON table with list of stock info
     """
     try:
-        df = Vnstock().stock_top(symbol='VNINDEX', page=0, size=10, sort='marketCap', order='desc')
-
-        top_10_stocks = []
-        for _, row in df.iterrows():
-            stock_info = {
-                "ticker": row["ticker"],
-                "price": row["price"],
-                "percent_change": row["percentPriceChange"],
-                "volume": row["totalMatchVolume"],
-                "market_cap": row["marketCap"],
-                "industry": row.get("industryName", "N/A")
-            }
-            top_10_stocks.append(stock_info)
-
-        return json.dumps(top_10_stocks, indent=4)
+        return encode_result(_fetch_top_10_vn_stocks())
     except Exception as e:
-        return json.dumps({"error": str(e)}, indent=4)
+        return encode_result({"error": str(e)})
 
 
 def get_stock_details(symbol: str):
     """
     Get detailed info of a specific VN stock.
-    Returns: JSON string with stock detail info
+    Returns: compact JSON with stock detail info
     """
     try:
-        stock = Vnstock().stock(symbol)
-        profile = stock.profile()
-        quote = stock.quote()
-
-        return json.dumps({
-            "ticker": symbol.upper(),
-            "company_name": profile.get("companyName", "N/A"),
-            "industry": profile.get("industryName", "N/A"),
-            "price": quote.get("price", "N/A"),
-            "change_percent": quote.get("percentPriceChange", "N/A"),
-            "market_cap": profile.get("marketCap", "N/A"),
-            "pe_ratio": profile.get("pe", "N/A"),
-            "roe": profile.get("roe", "N/A"),
-            "eps": profile.get("eps", "N/A")
-        }, indent=4)
+        return encode_result(_fetch_stock_details(symbol))
     except Exception as e:
-        return json.dumps({"error": str(e)}, indent=4)
+        return encode_result({"error": str(e)})
 
-def compare_assets(asset_list: list):
+def compare_assets(asset_list: list, fields: list[str] | None = None):
     """
     Compare performance of given assets (mix of crypto symbols and stock tickers).
-    Returns: JSON string of asset comparisons
+    fields: optional list of columns to keep (e.g., ["symbol", "price_usd", "percent_change_24h"])
+    Returns: compact JSON table of asset comparisons
     """
     results = []
     for asset in asset_list:
@@ -132,41 +159,49 @@ def compare_assets(asset_list: list):
             if asset.isalpha() and len(asset) <= 5:
                 # Try stock first
                 try:
-                    stock_data = json.loads(get_stock_details(asset))
-                    if "error" not in stock_data:
-                        stock_data["type"] = "stock"
-                        results.append(stock_data)
-                        continue
+                    stock_data = _fetch_stock_details(asset)
+                    stock_data["type"] = "stock"
+                    results.append(stock_data)
+                    continue
                 except Exception:
                     pass
                 # Fallback to crypto
-                crypto_data = json.loads(get_crypto_details(asset))
+                crypto_data = _fetch_crypto_details(asset)
                 crypto_data["type"] = "crypto"
                 results.append(crypto_data)
         except Exception as e:
             results.append({"asset": asset, "error": str(e)})
 
-    return json.dumps(results, indent=4)
+    return encode_result(results, fields=fields)
 
 
-def get_investment_summary():
+def get_investment_summary(crypto_fields: list[str] | None = None, stock_fields: list[str] | None = None):
     """
     Combine top cryptos + top VN stocks into one market summary.
-    Returns: JSON string of market overview
+    crypto_fields: optional list of columns to keep in the crypto table (name, symbol, price_usd, percent_change_24h, market_cap)
+    stock_fields: optional list of columns to keep in the stock table (ticker, price, percent_change, volume, market_cap, industry)
+    Returns: compact JSON of market overview
     """
-    crypto_data = json.loads(get_top_10_crypto())
-    stock_data = json.loads(get_top_10_vn_stocks())
+    summary = {}
+    try:
+        summary["top_cryptos"] = to_table(_fetch_top_10_crypto(), crypto_fields)
+    except Exception as e:
+        summary["top_cryptos"] = {"error": str(e)}
+    try:
+        summary["top_vn_stocks"] = to_table(_fetch_top_10_vn_stocks(), stock_fields)
+    except Exception as e:
+        summary["top_vn_stocks"] = {"error": str(e)}
 
-    return json.dumps({
-        "top_cryptos": crypto_data,
-        "top_vn_stocks": stock_data
-    }, indent=4)
+    return encode_result(summary)
 
 
 def suggest_investment_portfolio(user_profile: dict):
     """
     Suggest an investment portfolio based on user's risk tolerance and goals.
-    Example input: {"risk": "low", "goal": "long-term"}
+    Example input: {"risk": "low", "goal": "long-term", "assets": ["FPT", "VNM", "ACB"],
+                    "holdings": {"FPT": 10000000}}
+    When "assets" or "holdings" are given, the VN stock part is optimized from
+    price history with mean-variance allocation for the risk profile.
     Returns: JSON string with recommended allocation
     """
     risk = user_profile.get("risk", "medium").lower()
@@ -191,8 +226,22 @@ def suggest_investment_portfolio(user_profile: dict):
             "cash_or_etf": 20
         }
 
-    return json.dumps({
+    suggestion = {
         "risk_profile": risk,
         "goal": goal,
         "recommended_allocation": allocation
-    }, indent=4)
+    }
+
+    assets = user_profile.get("assets") or []
+    holdings = user_profile.get("holdings") or {}
+    if assets or holdings:
+        optimized = optimize_portfolio(assets, risk=risk, holdings=holdings)
+        if optimized.get("status") == "success":
+            suggestion["stock_allocation"] = optimized["weights"]
+            suggestion["stock_portfolio_stats"] = optimized["portfolio"]
+            if "current_portfolio" in optimized:
+                suggestion["current_portfolio_stats"] = optimized["current_portfolio"]
+        else:
+            suggestion["stock_allocation_error"] = optimized.get("message")
+
+    return encode_result(suggestion)
@@ -0,0 +1,245 @@
+"""
+Vectorized portfolio analytics and allocation on top of the local price store.
+
+Prices for all assets are aligned into one (days x assets) matrix so returns,
+volatility, covariance, drawdown and Sharpe ratios are computed with a handful
+of NumPy operations. Allocations are solved as long-only, weight-capped
+mean-variance or risk-parity problems without external solvers.
+"""
+
+import logging
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import (
+    DEFAULT_PRICE_INTERVAL,
+    RISK_FREE_RATE,
+    TRADING_DAYS_PER_YEAR,
+)
+from .price_history import is_stored, read_history, sync_in_background
+from .provider_replay import today as provider_today
+
+logger = logging.getLogger(__name__)
+
+MISSING_HISTORY_HINT = " History of missing symbols is being downloaded; try again in a minute."
+
+# Risk aversion used for mean-variance allocation per risk profile.
+RISK_AVERSION = {"low": 10.0, "medium": 4.0, "high": 1.5}
+
+
+def load_price_matrix(
+    symbols: List[str],
+    start,
+    end=None,
+    interval: str = DEFAULT_PRICE_INTERVAL,
+) -> Tuple[np.ndarray, np.ndarray, List[str], List[str]]:
+    """
+    Load close prices for `symbols` aligned on the dates all of them traded.
+
+    Only the local store is read, so the request never waits on the provider.
+    Symbols the store does not fully cover are queued for one background sync
+    and use what is stored meanwhile.
+
+    Returns:
+        (times, prices, symbols, missing): int64 epoch seconds of shape (T,),
+        prices of shape (T, N), the symbols kept and those without history.
+    """
+    unique = list(dict.fromkeys(s.upper() for s in symbols))
+    sync_in_background([s for s in unique if not is_stored(s, start, end, interval)], start, end, interval)
+
+    series = {}
+    missing = []
+    for symbol in unique:
+        try:
+            bars = read_history(symbol, start, end, interval)
+        except Exception as e:
+            logger.warning(f"Could not load history for '{symbol}': {str(e)}")
+            bars = None
+        if bars is None or bars["time"].shape[0] < 2:
+            missing.append(symbol)
+            continue
+        series[symbol] = bars
+
+    kept = list(series)
+    if not kept:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0)), [], missing
+
+    times = series[kept[0]]["time"]
+    for symbol in kept[1:]:
+        times = np.intersect1d(times, series[symbol]["time"], assume_unique=True)
+    prices = np.column_stack([
+        series[symbol]["close"][np.searchsorted(series[symbol]["time"], times)] for symbol in kept
+    ]).astype(np.float64)
+    return np.asarray(times), prices, kept, missing
+
+
+def simple_returns(prices: np.ndarray) -> np.ndarray:
+    """Period-over-period returns of a (T, N) price matrix, shape (T-1, N)."""
+    return prices[1:] / prices[:-1] - 1.0
+
+
+def max_drawdown(values: np.ndarray) -> np.ndarray:
+    """Maximum drawdown (as a positive fraction) along axis 0."""
+    peaks = np.maximum.accumulate(values, axis=0)
+    return np.max(1.0 - values / peaks, axis=0)
+
+
+def annualized_stats(returns: np.ndarray, periods_per_year: int = TRADING_DAYS_PER_YEAR) -> Dict[str, np.ndarray]:
+    """
+    Annualized return, volatility, Sharpe ratio and max drawdown for each
+    column of a (T, N) returns matrix.
+    """
+    mean = returns.mean(axis=0) * periods_per_year
+    volatility = returns.std(axis=0, ddof=1) * np.sqrt(periods_per_year)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(volatility > 0, (mean - RISK_FREE_RATE) / volatility, 0.0)
+    growth = np.cumprod(1.0 + returns, axis=0)
+    drawdown = max_drawdown(np.vstack([np.ones((1,) + returns.shape[1:]), growth]))
+    return {
+        "annual_return": mean,
+        "annual_volatility": volatility,
+        "sharpe_ratio": sharpe,
+        "max_drawdown": drawdown,
+    }
+
+
+def _project_capped_simplex(v: np.ndarray, cap: float) -> np.ndarray:
+    """
+    Euclidean projection onto {w : 0 <= w <= cap, sum(w) = 1}; needs cap * len(v) >= 1.
+
+    The projection is clip(v - tau, 0, cap) for the shift tau at which the
+    weights sum to 1. That sum is piecewise linear in tau with breakpoints at
+    v and v - cap, so tau is found exactly by locating the segment that
+    crosses 1 among the sorted breakpoints and interpolating within it.
+    """
+    breakpoints = np.sort(np.concatenate([v, v - cap]))
+    sums = np.clip(v[None, :] - breakpoints[:, None], 0.0, cap).sum(axis=1)
+    # sums is non-increasing, from len(v) * cap >= 1 down to 0.
+    j = int(np.flatnonzero(sums >= 1.0)[-1])
+    if j + 1 == len(breakpoints) or sums[j] == sums[j + 1]:
+        tau = breakpoints[j]
+    else:
+        tau = breakpoints[j] + (sums[j] - 1.0) / (sums[j] - sums[j + 1]) * (breakpoints[j + 1] - breakpoints[j])
+    return np.clip(v - tau, 0.0, cap)
+
+
+def mean_variance_weights(
+    mu: np.ndarray,
+    cov: np.ndarray,
+    risk_aversion: float = RISK_AVERSION["medium"],
+    max_weight: float = 1.0,
+    iterations: int = 300,
+) -> np.ndarray:
+    """
+    Long-only weights maximizing mu.w - risk_aversion / 2 * w'.cov.w with each
+    weight capped at `max_weight`, solved by accelerated projected gradient.
+    """
+    n = mu.shape[0]
+    cap = max(max_weight, 1.0 / n)
+    step = 1.0 / (risk_aversion * max(np.linalg.eigvalsh(cov)[-1], 1e-12))
+    w = np.full(n, 1.0 / n)
+    y, t = w, 1.0
+    for _ in range(iterations):
+        w_next = _project_capped_simplex(y + step * (mu - risk_aversion * cov @ y), cap)
+        if np.abs(w_next - w).max() < 1e-7:
+            w = w_next
+            break
+        t_next = (1.0 + np.sqrt(1.0 + 4.0 * t * t)) / 2.0
+        y = w_next + ((t - 1.0) / t_next) * (w_next - w)
+        w, t = w_next, t_next
+    return w
+
+
+def risk_parity_weights(cov: np.ndarray, iterations: int = 500) -> np.ndarray:
+    """Long-only weights with equal risk contribution from every asset."""
+    n = cov.shape[0]
+    w = 1.0 / np.sqrt(np.clip(np.diag(cov), 1e-12, None))
+    w /= w.sum()
+    for _ in range(iterations):
+        contrib = w * (cov @ w)
+        target = contrib.sum() / n
+        if np.abs(contrib - target).max() < 1e-10:
+            break
+        w = w * np.sqrt(target / np.clip(contrib, 1e-18, None))
+        w /= w.sum()
+    return w
+
+
+def _portfolio_summary(returns: np.ndarray, weights: np.ndarray) -> dict:
+    stats = annualized_stats((returns @ weights)[:, None])
+    return {name: round(float(values[0]), 4) for name, values in stats.items()}
+
+
+def optimize_portfolio(
+    symbols: List[str],
+    method: str = "mean_variance",
+    risk: str = "medium",
+    lookback_years: int = 5,
+    max_weight: float = 0.4,
+    holdings: Optional[Dict[str, float]] = None,
+) -> dict:
+    """
+    Compute analytics for a set of VN stocks and an optimized allocation across them.
+
+    Args:
+        symbols (List[str]): Candidate stock tickers (e.g., ["FPT", "VNM", "ACB"])
+        method (str): "mean_variance" or "risk_parity"
+        risk (str): Risk profile for mean-variance: "low", "medium" or "high"
+        lookback_years (int): Years of daily history to use
+        max_weight (float): Maximum weight of a single asset (0-1)
+        holdings (dict, optional): Current holdings as {ticker: market value}; they are
+                                   added to the candidates and analysed as the current portfolio
+
+    Returns:
+        dict: Per-asset statistics, recommended weights and portfolio statistics
+    """
+    try:
+        holdings = {k.upper(): float(v) for k, v in (holdings or {}).items()}
+        universe = list(dict.fromkeys([s.upper() for s in symbols] + list(holdings)))
+        start = provider_today() - timedelta(days=int(365 * lookback_years))
+        _, prices, kept, missing = load_price_matrix(universe, start)
+        if len(kept) < 2 or prices.shape[0] < 3:
+            return {
+                "status": "error",
+                "message": "Need price history for at least two assets to build a portfolio."
+                + (MISSING_HISTORY_HINT if missing else ""),
+                "symbols": kept,
+                "missing_symbols": missing,
+            }
+
+        returns = simple_returns(prices)
+        mu = returns.mean(axis=0) * TRADING_DAYS_PER_YEAR
+        cov = np.cov(returns, rowvar=False) * TRADING_DAYS_PER_YEAR
+        if method == "risk_parity":
+            weights = risk_parity_weights(cov)
+        else:
+            method = "mean_variance"
+            aversion = RISK_AVERSION.get((risk or "medium").lower(), RISK_AVERSION["medium"])
+            weights = mean_variance_weights(mu, cov, aversion, max_weight)
+
+        stats = annualized_stats(returns)
+        assets = [
+            {"symbol": symbol, **{name: round(float(values[i]), 4) for name, values in stats.items()}}
+            for i, symbol in enumerate(kept)
+        ]
+        result = {
+            "status": "success",
+            "message": f"Optimized {method} allocation over {len(kept)} asset(s) and {returns.shape[0]} trading days",
+            "method": method,
+            "risk_profile": risk,
+            "assets": assets,
+            "weights": {symbol: round(float(w), 4) for symbol, w in zip(kept, weights) if w >= 1e-4},
+            "portfolio": _portfolio_summary(returns, weights),
+            "missing_symbols": missing,
+        }
+
+        held = np.array([holdings.get(symbol, 0.0) for symbol in kept])
+        if held.sum() > 0:
+            result["current_portfolio"] = _portfolio_summary(returns, held / held.sum())
+        return result
+    except Exception as e:
+        error_msg = f"Error optimizing portfolio: {str(e)}"
+        logger.error(error_msg)
+        return {"status": "error", "message": error_msg, "symbols": symbols}
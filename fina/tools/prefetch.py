@@ -0,0 +1,66 @@
+"""
+Concurrent prefetch of the data the invest and planner agents start from.
+
+Once the intent is known, the financial summary and, for invest questions,
+the top cryptocurrencies and top VN stocks are fetched at the same time
+instead of one tool call per LLM turn. The blocking fetches run in worker
+threads, so the wait is that of the slowest one.
+
+Every prefetch key is written on every turn, as None when it was not fetched,
+failed or came back empty, so an agent never reads the data of an earlier
+turn as if it were current. The plan uses the raising fetchers rather than the
+agent tools, which turn failures into an {"error": ...} result that would be
+stored as data.
+"""
+
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from .database import financial_summary
+from .investment_tools import _fetch_top_10_crypto, _fetch_top_10_vn_stocks
+from .result_encoding import encode_result
+
+logger = logging.getLogger(__name__)
+
+# state key -> fetch function, per intent
+PREFETCH_PLAN: Dict[str, Dict[str, Callable[[], Any]]] = {
+    "invest": {
+        "summary": financial_summary,
+        "top_crypto": _fetch_top_10_crypto,
+        "top_vn_stocks": _fetch_top_10_vn_stocks,
+    },
+    "planner": {
+        "summary": financial_summary,
+    },
+}
+
+PREFETCH_KEYS = sorted({key for plan in PREFETCH_PLAN.values() for key in plan})
+
+
+async def prefetch_state(intent: Optional[str]) -> Dict[str, Any]:
+    """
+    Fetch the prefetch data of `intent` concurrently.
+
+    Args:
+        intent: the classified intent; intents without a plan fetch nothing
+
+    Returns:
+        dict: state delta with every PREFETCH_KEYS key (None unless fetched
+              with a non-empty result, so the agent falls back to calling the
+              tool itself; lists are stored as the compact table the tools
+              return) and "prefetched", the sorted keys that were fetched
+    """
+    plan = PREFETCH_PLAN.get(intent or "", {})
+    state: Dict[str, Any] = {key: None for key in PREFETCH_KEYS}
+    results = await asyncio.gather(
+        *(asyncio.to_thread(fetch) for fetch in plan.values()),
+        return_exceptions=True,
+    )
+    for key, result in zip(plan, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error prefetching '{key}' for intent '{intent}': {str(result)}")
+        elif result:
+            state[key] = encode_result(result) if isinstance(result, list) else result
+    state["prefetched"] = sorted(key for key in PREFETCH_KEYS if state[key] is not None)
+    return state
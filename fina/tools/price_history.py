@@ -0,0 +1,367 @@
+"""
+Local columnar OHLCV store for market price history.
+
+Bars are kept on disk partitioned by interval and symbol:
+
+    PRICE_HISTORY_DIR/<interval>/<SYMBOL>/{time,open,high,low,close,volume}.npy
+    PRICE_HISTORY_DIR/<interval>/<SYMBOL>/meta.json
+
+Each column is a flat NumPy array (``time`` as int64 epoch seconds, prices and
+volume as float64) so reads are memory-mapped and slicing a date window costs a
+binary search. ``meta.json`` records the date range that has already been
+fetched, which lets the store ask the provider only for the missing ranges.
+Today's bar is still forming, so it is never part of that range; it is
+refetched at most once per PRICE_HISTORY_LIVE_TTL_SECONDS, and the columns
+are only rewritten when a fetch adds or changes rows.
+
+Request paths that need many symbols at once read the store with
+`read_history` and queue the symbols it does not fully cover with
+`sync_in_background`, so they never wait on the provider.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import numpy as np
+from vnstock import Vnstock
+
+from ..config import (
+    DEFAULT_PRICE_INTERVAL,
+    PRICE_HISTORY_DIR,
+    PRICE_HISTORY_LIVE_TTL_SECONDS,
+    PRICE_HISTORY_SOURCE,
+)
+from .provider_replay import replay_call, today as provider_today
+from .result_encoding import to_table
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ("time", "open", "high", "low", "close", "volume")
+_DTYPES = {"time": np.int64}
+
+# One lock per (symbol, interval) partition so concurrent tool calls do not
+# fetch or rewrite the same partition twice.
+_PARTITION_LOCKS: Dict[Tuple[str, str], threading.Lock] = {}
+_PARTITION_LOCKS_GUARD = threading.Lock()
+
+# Background syncs queued by `sync_in_background`, one worker so a batch makes
+# its provider calls one after another.
+_SYNC_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="price-sync")
+_SYNC_QUEUED: Set[Tuple[str, str]] = set()
+
+DateLike = Union[str, date, datetime, None]
+
+
+def _to_date(value: DateLike, default: Optional[date] = None) -> Optional[date]:
+    """Accept ISO strings, dates or datetimes and return a date."""
+    if value is None or value == "":
+        return default
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")[:10]).date()
+
+
+def _normalize_symbol(symbol: str) -> str:
+    return re.sub(r"[^A-Z0-9]", "", symbol.upper())
+
+
+def _normalize_interval(interval: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]", "", interval or DEFAULT_PRICE_INTERVAL)
+
+
+def _partition_dir(symbol: str, interval: str) -> str:
+    return os.path.join(PRICE_HISTORY_DIR, interval, symbol)
+
+
+def _partition_lock(symbol: str, interval: str) -> threading.Lock:
+    with _PARTITION_LOCKS_GUARD:
+        return _PARTITION_LOCKS.setdefault((symbol, interval), threading.Lock())
+
+
+def _read_meta(path: str) -> dict:
+    try:
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _read_columns(path: str) -> Dict[str, np.ndarray]:
+    """Memory-map every column of a partition (empty arrays if missing)."""
+    columns = {}
+    for name in COLUMNS:
+        file_path = os.path.join(path, f"{name}.npy")
+        if os.path.exists(file_path):
+            columns[name] = np.load(file_path, mmap_mode="r")
+        else:
+            columns[name] = np.empty(0, dtype=_DTYPES.get(name, np.float64))
+    return columns
+
+
+def _write_partition(path: str, columns: Optional[Dict[str, np.ndarray]], meta: dict) -> None:
+    """Write columns (unless None) then metadata, replacing each file atomically."""
+    os.makedirs(path, exist_ok=True)
+    for name in COLUMNS if columns is not None else ():
+        tmp_path = os.path.join(path, f"{name}.tmp.npy")
+        np.save(tmp_path, np.ascontiguousarray(columns[name]))
+        os.replace(tmp_path, os.path.join(path, f"{name}.npy"))
+    tmp_meta = os.path.join(path, "meta.json.tmp")
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_meta, os.path.join(path, "meta.json"))
+
+
+def _fetch_bars(symbol: str, start: date, end: date, interval: str) -> Dict[str, np.ndarray]:
+    """Fetch bars for [start, end] from Vnstock as column arrays."""
+    logger.info(f"Fetching {symbol} {interval} bars from {start} to {end}")
+    df = replay_call(
+        "vnstock.quote.history",
+        lambda: Vnstock().stock(symbol=symbol, source=PRICE_HISTORY_SOURCE).quote.history(
+            start=start.isoformat(), end=end.isoformat(), interval=interval
+        ),
+        symbol=symbol, source=PRICE_HISTORY_SOURCE, start=start, end=end, interval=interval,
+    )
+    if df is None or len(df) == 0:
+        return {
+            name: np.empty(0, dtype=_DTYPES.get(name, np.float64)) for name in COLUMNS
+        }
+    times = np.asarray(df["time"], dtype="datetime64[s]").astype(np.int64)
+    columns = {"time": times}
+    for name in COLUMNS[1:]:
+        columns[name] = np.asarray(df[name], dtype=np.float64)
+    return columns
+
+
+def _merge(old: Dict[str, np.ndarray], new: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Merge two column sets by time; rows from `new` win on duplicates."""
+    times = np.concatenate([new["time"], old["time"]])
+    # np.unique keeps the first occurrence, so the fresh rows take priority.
+    _, index = np.unique(times, return_index=True)
+    return {name: np.concatenate([new[name], old[name]])[index] for name in COLUMNS}
+
+
+def _live_is_fresh(meta: dict, today: date) -> bool:
+    """Whether today's forming bar was fetched less than PRICE_HISTORY_LIVE_TTL_SECONDS ago."""
+    return (
+        meta.get("live_date") == today.isoformat()
+        and time.time() - float(meta.get("live_fetched_at") or 0) < PRICE_HISTORY_LIVE_TTL_SECONDS
+    )
+
+
+def _missing_ranges(meta: dict, start: date, end: date, today: date) -> List[Tuple[date, date]]:
+    """
+    Return the ranges to fetch so the partition covers [start, end].
+
+    Ranges are extended up to the covered span so that coverage stays a single
+    contiguous interval and `meta.json` never claims a gap as fetched. A range
+    of only today is skipped while the stored forming bar is still fresh.
+    """
+    if not meta.get("covered_start") or not meta.get("covered_end"):
+        ranges = [(start, end)]
+    else:
+        covered_start = _to_date(meta["covered_start"])
+        covered_end = _to_date(meta["covered_end"])
+        ranges = []
+        if start < covered_start:
+            ranges.append((start, covered_start - timedelta(days=1)))
+        if end > covered_end:
+            ranges.append((covered_end + timedelta(days=1), end))
+    if ranges and ranges[-1] == (today, today) and _live_is_fresh(meta, today):
+        ranges.pop()
+    return ranges
+
+
+def _same_columns(old: Dict[str, np.ndarray], new: Dict[str, np.ndarray]) -> bool:
+    return all(np.array_equal(old[name], new[name]) for name in COLUMNS)
+
+
+def sync_history(symbol: str, start: DateLike, end: DateLike = None, interval: str = DEFAULT_PRICE_INTERVAL) -> dict:
+    """
+    Make sure the local store covers [start, end] for the symbol, fetching only
+    the missing date ranges from the provider.
+
+    Returns:
+        dict: The partition metadata after the sync
+    """
+    symbol = _normalize_symbol(symbol)
+    interval = _normalize_interval(interval)
+    today = provider_today()
+    start_d = _to_date(start)
+    end_d = min(_to_date(end, today), today)
+    if start_d is None or start_d > end_d:
+        raise ValueError(f"Invalid date range: {start} -> {end}")
+
+    path = _partition_dir(symbol, interval)
+    with _partition_lock(symbol, interval):
+        meta = _read_meta(path)
+        ranges = _missing_ranges(meta, start_d, end_d, today)
+        if not ranges:
+            return meta
+
+        stored = {name: np.array(values) for name, values in _read_columns(path).items()}
+        columns = stored
+        for range_start, range_end in ranges:
+            columns = _merge(columns, _fetch_bars(symbol, range_start, range_end, interval))
+        fetched_live = ranges[-1][1] == today
+
+        covered = [start_d, end_d]
+        if meta.get("covered_start"):
+            covered = [
+                min(start_d, _to_date(meta["covered_start"])),
+                max(end_d, _to_date(meta["covered_end"])),
+            ]
+        # Today's bar is still forming, so never mark it as covered.
+        covered[1] = min(covered[1], today - timedelta(days=1))
+        has_coverage = covered[0] <= covered[1]
+        meta = {
+            "symbol": symbol,
+            "interval": interval,
+            "source": PRICE_HISTORY_SOURCE,
+            "covered_start": covered[0].isoformat() if has_coverage else None,
+            "covered_end": covered[1].isoformat() if has_coverage else None,
+            "live_date": today.isoformat() if fetched_live else meta.get("live_date"),
+            "live_fetched_at": time.time() if fetched_live else meta.get("live_fetched_at"),
+            "rows": int(columns["time"].shape[0]),
+            "updated_at": datetime.now().isoformat(),
+        }
+        _write_partition(path, None if _same_columns(stored, columns) else columns, meta)
+        return meta
+
+
+def read_history(symbol: str, start: DateLike, end: DateLike = None, interval: str = DEFAULT_PRICE_INTERVAL) -> Dict[str, np.ndarray]:
+    """
+    Return the stored OHLCV columns for [start, end] as read-only memory-mapped
+    arrays, without contacting the provider.
+    """
+    columns = _read_columns(_partition_dir(_normalize_symbol(symbol), _normalize_interval(interval)))
+
+    start_ts = np.datetime64(_to_date(start), "s").astype(np.int64)
+    end_d = _to_date(end, provider_today()) + timedelta(days=1)
+    end_ts = np.datetime64(end_d, "s").astype(np.int64)
+    lo = int(np.searchsorted(columns["time"], start_ts, side="left"))
+    hi = int(np.searchsorted(columns["time"], end_ts, side="left"))
+    return {name: values[lo:hi] for name, values in columns.items()}
+
+
+def load_history(symbol: str, start: DateLike, end: DateLike = None, interval: str = DEFAULT_PRICE_INTERVAL) -> Dict[str, np.ndarray]:
+    """
+    Return OHLCV columns for [start, end] as read-only memory-mapped arrays.
+
+    Missing ranges are fetched and persisted first. ``time`` is int64 epoch
+    seconds; use ``.astype('datetime64[s]')`` for calendar values.
+    """
+    sync_history(symbol, start, end, interval)
+    return read_history(symbol, start, end, interval)
+
+
+def is_stored(symbol: str, start: DateLike, end: DateLike = None, interval: str = DEFAULT_PRICE_INTERVAL) -> bool:
+    """Whether the store covers [start, end] up to yesterday; today's forming bar is not required."""
+    today = provider_today()
+    end_d = min(_to_date(end, today), today - timedelta(days=1))
+    start_d = _to_date(start)
+    if start_d > end_d:
+        return True
+    meta = _read_meta(_partition_dir(_normalize_symbol(symbol), _normalize_interval(interval)))
+    return not _missing_ranges(meta, start_d, end_d, today)
+
+
+def _sync_batch(symbols: List[str], start: DateLike, end: DateLike, interval: str) -> None:
+    for symbol in symbols:
+        try:
+            sync_history(symbol, start, end, interval)
+        except Exception as e:
+            logger.warning(f"Background sync of '{symbol}' failed: {str(e)}")
+        finally:
+            with _PARTITION_LOCKS_GUARD:
+                _SYNC_QUEUED.discard((symbol, interval))
+
+
+def sync_in_background(symbols: Iterable[str], start: DateLike, end: DateLike = None, interval: str = DEFAULT_PRICE_INTERVAL) -> List[str]:
+    """
+    Queue one background sync of [start, end] for `symbols`, skipping those
+    already queued.
+
+    Returns:
+        list: The normalized symbols that were queued
+    """
+    interval = _normalize_interval(interval)
+    with _PARTITION_LOCKS_GUARD:
+        queued = [
+            symbol for symbol in dict.fromkeys(_normalize_symbol(s) for s in symbols)
+            if (symbol, interval) not in _SYNC_QUEUED
+        ]
+        _SYNC_QUEUED.update((symbol, interval) for symbol in queued)
+    if queued:
+        _SYNC_POOL.submit(_sync_batch, queued, start, end, interval)
+    return queued
+
+
+def get_price_history(
+    symbol: str,
+    start_date: str,
+    end_date: str = "",
+    interval: str = DEFAULT_PRICE_INTERVAL,
+    max_bars: int = 250,
+) -> dict:
+    """
+    Get an OHLCV price history window for a Vietnamese stock from the local store.
+    Only date ranges that are not stored yet are downloaded from the provider.
+
+    Args:
+        symbol (str): Stock ticker (e.g., "ACB", "FPT")
+        start_date (str): First date of the window, ISO format (YYYY-MM-DD)
+        end_date (str): Last date of the window, ISO format. Empty means today.
+        interval (str): Bar interval supported by Vnstock (e.g., "1D", "1W", "1H")
+        max_bars (int): Maximum number of most recent bars to return
+
+    Returns:
+        dict: The bars of the window and status
+    """
+    try:
+        bars = load_history(symbol, start_date, end_date or None, interval)
+        count = int(bars["time"].shape[0])
+        if count == 0:
+            return {
+                "status": "warning",
+                "message": f"No price history found for '{symbol}' between {start_date} and {end_date or 'today'}",
+                "symbol": symbol.upper(),
+                "interval": interval,
+                "bars": [],
+                "bars_count": 0,
+            }
+
+        first = max(count - max_bars, 0) if max_bars and max_bars > 0 else 0
+        window = {name: values[first:] for name, values in bars.items()}
+        times = window["time"].astype("datetime64[s]").astype(str)
+        rows = [
+            {"time": str(times[i]), **{name: float(window[name][i]) for name in COLUMNS[1:]}}
+            for i in range(len(times))
+        ]
+        bars_table = to_table(rows, list(COLUMNS), max_rows=None)
+        return {
+            "status": "success",
+            "message": f"Loaded {count} bar(s) for '{symbol.upper()}'",
+            "symbol": symbol.upper(),
+            "interval": interval,
+            "bars": bars_table,
+            "bars_count": count,
+            "bars_returned": len(rows),
+        }
+    except Exception as e:
+        error_msg = f"Error loading price history: {str(e)}"
+        logger.error(error_msg)
+        return {
+            "status": "error",
+            "message": error_msg,
+            "symbol": symbol,
+            "interval": interval,
+        }
@@ -0,0 +1,251 @@
+"""
+Record/replay layer for market data providers.
+
+Set PROVIDER_REPLAY_MODE to:
+  - "off":    call providers directly (default)
+  - "record": call providers and save every response under PROVIDER_FIXTURE_DIR
+  - "replay": serve responses from PROVIDER_FIXTURE_DIR without network access
+
+In replay mode PROVIDER_REPLAY_LATENCY_MS and PROVIDER_REPLAY_ERROR_RATE inject
+a fixed delay and random connection errors per call. Every provider call is
+timed in all modes (see `provider_stats`) so our own overhead can be measured
+separately from the providers'.
+
+HTTP providers (CoinMarketCap) plug in through `get_http_session()`, whose
+transport adapter does the recording/replaying. Vnstock calls are wrapped with
+`replay_call`. Vnstock fixtures are pickled DataFrames, so only replay
+fixture directories you recorded yourself.
+
+Date ranges relative to today (price history syncs, lookback windows) are
+part of the fixture keys. Code that computes them uses `today()`, which a
+recording saves to the fixture directory and replay returns, so a fixture
+set recorded on one day still replays on every later day.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import pickle
+import random
+import re
+import threading
+import time
+from datetime import date
+from typing import Any, Callable, Dict, Optional, TypeVar
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from ..config import (
+    PROVIDER_FIXTURE_DIR,
+    PROVIDER_REPLAY_ERROR_RATE,
+    PROVIDER_REPLAY_LATENCY_MS,
+    PROVIDER_REPLAY_MODE,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+
+_TODAY_FILE = "today.json"
+_TODAY: Optional[date] = None
+_TODAY_LOCK = threading.Lock()
+
+_STATS: Dict[str, Dict[str, float]] = {}
+_STATS_LOCK = threading.Lock()
+
+
+def _record_timing(provider: str, seconds: float, error: bool = False) -> None:
+    with _STATS_LOCK:
+        stats = _STATS.setdefault(provider, {"calls": 0, "errors": 0, "total_seconds": 0.0})
+        stats["calls"] += 1
+        stats["errors"] += int(error)
+        stats["total_seconds"] += seconds
+
+
+def provider_stats() -> Dict[str, Dict[str, float]]:
+    """Call counts, errors and cumulative wall time per provider."""
+    with _STATS_LOCK:
+        return {
+            provider: {**stats, "mean_ms": 1000.0 * stats["total_seconds"] / max(stats["calls"], 1)}
+            for provider, stats in _STATS.items()
+        }
+
+
+def reset_provider_stats() -> None:
+    with _STATS_LOCK:
+        _STATS.clear()
+
+
+def today() -> date:
+    """
+    The current date for provider calls: the recording date in replay mode,
+    the real date otherwise (saved with the fixtures in record mode).
+    """
+    global _TODAY
+    if PROVIDER_REPLAY_MODE not in ("record", "replay"):
+        return date.today()
+    with _TODAY_LOCK:
+        if _TODAY is None:
+            path = os.path.join(PROVIDER_FIXTURE_DIR, _TODAY_FILE)
+            if PROVIDER_REPLAY_MODE == "replay":
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        _TODAY = date.fromisoformat(json.load(f)["today"])
+                except FileNotFoundError:
+                    logger.warning(f"No {_TODAY_FILE} in {PROVIDER_FIXTURE_DIR}; replaying with the real date")
+                    _TODAY = date.today()
+            else:
+                _TODAY = date.today()
+                os.makedirs(PROVIDER_FIXTURE_DIR, exist_ok=True)
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump({"today": _TODAY.isoformat()}, f)
+        return _TODAY
+
+
+def _fixture_path(name: str, key: str, extension: str) -> str:
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+    return os.path.join(PROVIDER_FIXTURE_DIR, f"{safe_name}-{digest}.{extension}")
+
+
+def _inject_faults(name: str) -> None:
+    """Apply the configured replay latency and error rate."""
+    if PROVIDER_REPLAY_LATENCY_MS > 0:
+        time.sleep(PROVIDER_REPLAY_LATENCY_MS / 1000.0)
+    if PROVIDER_REPLAY_ERROR_RATE > 0 and random.random() < PROVIDER_REPLAY_ERROR_RATE:
+        raise requests.exceptions.ConnectionError(f"Injected replay error for '{name}'")
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    requests transport adapter that records responses to fixtures or replays
+    them. Fixtures are keyed by method, URL (including query string) and body;
+    headers such as API keys are never stored.
+    """
+
+    def __init__(self, mode: str = PROVIDER_REPLAY_MODE):
+        super().__init__()
+        self.mode = mode
+        self.delegate = HTTPAdapter()
+
+    def _path(self, request: requests.PreparedRequest) -> str:
+        body = request.body or b""
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        key = f"{request.method} {request.url} {hashlib.sha1(body).hexdigest()}"
+        host = urlparse(request.url).hostname or "http"
+        return _fixture_path(host, key, "json")
+
+    def send(self, request, **kwargs):
+        path = self._path(request)
+        if self.mode == "replay":
+            _inject_faults(request.url)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    fixture = json.load(f)
+            except FileNotFoundError:
+                raise requests.exceptions.ConnectionError(
+                    f"No recorded fixture for {request.method} {request.url}"
+                )
+            response = requests.Response()
+            response.status_code = fixture["status_code"]
+            response.headers = CaseInsensitiveDict(fixture["headers"])
+            response._content = base64.b64decode(fixture["body"])
+            response.encoding = fixture.get("encoding")
+            response.url = request.url
+            response.request = request
+            response.reason = fixture.get("reason", "")
+            return response
+
+        response = self.delegate.send(request, **kwargs)
+        if self.mode == "record":
+            os.makedirs(PROVIDER_FIXTURE_DIR, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "method": request.method,
+                    "url": request.url,
+                    "status_code": response.status_code,
+                    "reason": response.reason,
+                    "headers": dict(response.headers),
+                    "encoding": response.encoding,
+                    "body": base64.b64encode(response.content).decode("ascii"),
+                }, f, indent=2)
+        return response
+
+    def close(self):
+        self.delegate.close()
+
+
+class _TimedSession(requests.Session):
+    """Session that records per-host timing for `provider_stats`."""
+
+    def request(self, method, url, *args, **kwargs):
+        provider = urlparse(url).hostname or "http"
+        start = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except Exception:
+            _record_timing(provider, time.perf_counter() - start, error=True)
+            raise
+        _record_timing(provider, time.perf_counter() - start)
+        return response
+
+
+def get_http_session() -> requests.Session:
+    """
+    Shared HTTP session for provider calls. It reuses connections and, when
+    record/replay is enabled, routes every request through `ReplayAdapter`.
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            session = _TimedSession()
+            if PROVIDER_REPLAY_MODE in ("record", "replay"):
+                adapter = ReplayAdapter(PROVIDER_REPLAY_MODE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+            _SESSION = session
+        return _SESSION
+
+
+def replay_call(name: str, fn: Callable[[], T], **key: Any) -> T:
+    """
+    Run a non-HTTP provider call (e.g. Vnstock) through the record/replay layer.
+
+    Args:
+        name: provider call name, e.g. "vnstock.quote.history"
+        fn: zero-argument callable doing the real call
+        **key: arguments that identify the call for fixture lookup
+
+    Returns:
+        The provider result, recorded or replayed as configured
+    """
+    path = _fixture_path(name, json.dumps(key, sort_keys=True, default=str), "pkl")
+    start = time.perf_counter()
+    try:
+        if PROVIDER_REPLAY_MODE == "replay":
+            _inject_faults(name)
+            try:
+                with open(path, "rb") as f:
+                    result = pickle.load(f)
+            except FileNotFoundError:
+                raise requests.exceptions.ConnectionError(f"No recorded fixture for {name} {key}")
+        else:
+            result = fn()
+            if PROVIDER_REPLAY_MODE == "record":
+                os.makedirs(PROVIDER_FIXTURE_DIR, exist_ok=True)
+                with open(path, "wb") as f:
+                    pickle.dump(result, f)
+    except Exception:
+        _record_timing(name, time.perf_counter() - start, error=True)
+        raise
+    _record_timing(name, time.perf_counter() - start)
+    return result
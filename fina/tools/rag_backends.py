@@ -0,0 +1,530 @@
+"""
+Retrieval backends for the RAG tools.
+
+RAG_BACKEND selects where corpora live:
+  - "vertex": Vertex AI RAG Engine (default)
+  - "local":  an on-disk index queried in-process, for development, CI and
+              air-gapped deployments
+
+Both backends expose the same operations and result shapes, so rag_query.py
+and utils.py do not depend on which one is active.
+
+Local corpora live under RAG_LOCAL_INDEX_DIR/<corpus_id>/:
+  corpus.json     display name, timestamps, embedding model, file records and
+                  the name of the array directory of the current version
+  v<version>-<id>/
+    vectors.npy     (n_chunks, dim) float32 unit vectors, memory-mapped
+    offsets.npy     (n_chunks + 1,) int64 byte offsets of each chunk in text.bin
+    file_index.npy  (n_chunks,) int32 index of each chunk's file record
+    text.bin        UTF-8 chunk texts, memory-mapped
+Every write puts the arrays of the new version in a fresh directory and then
+atomically replaces corpus.json, so a reader in another process (for example
+during a cron sync) always pairs the vectors, offsets, text and file records
+of one version. The previous version is kept for readers that already read
+the old corpus.json. Queries are an exact dot-product scan over the
+memory-mapped vectors.
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from vertexai import rag
+
+from ..config import (
+    DEFAULT_CHUNK_OVERLAP,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_EMBEDDING_MODEL,
+    DEFAULT_EMBEDDING_REQUESTS_PER_MIN,
+    LOCATION,
+    PROJECT_ID,
+    RAG_BACKEND,
+    RAG_LOCAL_EMBEDDING_MODEL,
+    RAG_LOCAL_INDEX_DIR,
+)
+
+logger = logging.getLogger(__name__)
+
+_TEXT_EXTENSIONS = (".txt", ".md", ".csv", ".json", ".html", ".htm", ".xml")
+
+
+class RetrievalBackend(ABC):
+    """Operations the RAG tools need from a corpus store."""
+
+    name = "base"
+    # Embedding model the backend indexes documents with.
+    embedding_model = ""
+    # Whether add_files accepts paths on the local filesystem.
+    accepts_local_paths = False
+
+    @abstractmethod
+    def resource_name(self, corpus_id: str) -> str:
+        """Full resource name of the corpus with id `corpus_id`."""
+
+    @abstractmethod
+    def is_resource_name(self, name: str) -> bool:
+        """Whether `name` is a corpus resource name of this backend."""
+
+    @abstractmethod
+    def list_corpora(self) -> List[Dict[str, str]]:
+        """Corpora as dicts with resource_name, display_name, create_time and update_time."""
+
+    @abstractmethod
+    def create_corpus(self, display_name: str) -> Dict[str, str]:
+        """Create a corpus and return its resource_name and display_name."""
+
+    @abstractmethod
+    def delete_corpus(self, resource_name: str) -> None:
+        """Delete the corpus and all of its files."""
+
+    @abstractmethod
+    def add_files(self, resource_name: str, paths: List[str]) -> int:
+        """Import `paths` into the corpus and return the number of files imported."""
+
+    @abstractmethod
+    def delete_file(self, resource_name: str, file_id: str) -> None:
+        """Delete one file and its chunks from the corpus."""
+
+    @abstractmethod
+    def list_files(self, resource_name: str) -> List[Dict[str, str]]:
+        """Files as dicts with file_id, display_name, source_uri, create_time and update_time."""
+
+    @abstractmethod
+    def query(self, resource_name: str, text: str, top_k: int, distance_threshold: float) -> List[Dict[str, Any]]:
+        """Chunks as dicts with source_uri, source_name, text and score (vector distance)."""
+
+    def corpus_revision(self, resource_name: str) -> str:
+        """
+        Identifier of the corpus contents as stored by the backend.
+
+        It changes whenever a file is added, re-imported or deleted, by this
+        process or any other, so indexes derived from the corpus can tell
+        when they are stale.
+        """
+        files = sorted((f["file_id"], f.get("update_time", "")) for f in self.list_files(resource_name))
+        return hashlib.sha256(json.dumps(files).encode("utf-8")).hexdigest()
+
+    def list_chunks(self, resource_name: str) -> List[Dict[str, str]]:
+        """Every chunk of the corpus as dicts with source_uri, source_name and text."""
+        chunks = []
+        for record in self.list_files(resource_name):
+            try:
+                text = read_document(record["source_uri"])
+            except Exception as e:
+                logger.warning(f"Could not read '{record['source_uri']}' for the keyword index: {str(e)}")
+                continue
+            chunks.extend(
+                {"source_uri": record["source_uri"], "source_name": record["display_name"], "text": chunk}
+                for chunk in chunk_text(text)
+            )
+        return chunks
+
+
+class VertexBackend(RetrievalBackend):
+    """Vertex AI RAG Engine."""
+
+    name = "vertex"
+    embedding_model = DEFAULT_EMBEDDING_MODEL
+
+    def resource_name(self, corpus_id: str) -> str:
+        return f"projects/{PROJECT_ID}/locations/{LOCATION}/ragCorpora/{corpus_id}"
+
+    def is_resource_name(self, name: str) -> bool:
+        return re.match(r"^projects/[^/]+/locations/[^/]+/ragCorpora/[^/]+$", name) is not None
+
+    def list_corpora(self) -> List[Dict[str, str]]:
+        return [
+            {
+                "resource_name": corpus.name,
+                "display_name": corpus.display_name,
+                "create_time": str(corpus.create_time) if hasattr(corpus, "create_time") else "",
+                "update_time": str(corpus.update_time) if hasattr(corpus, "update_time") else "",
+            }
+            for corpus in rag.list_corpora()
+        ]
+
+    def create_corpus(self, display_name: str) -> Dict[str, str]:
+        embedding_model_config = rag.RagEmbeddingModelConfig(
+            vertex_prediction_endpoint=rag.VertexPredictionEndpoint(
+                publisher_model=DEFAULT_EMBEDDING_MODEL
+            )
+        )
+        rag_corpus = rag.create_corpus(
+            display_name=display_name,
+            backend_config=rag.RagVectorDbConfig(
+                rag_embedding_model_config=embedding_model_config
+            ),
+        )
+        return {"resource_name": rag_corpus.name, "display_name": rag_corpus.display_name}
+
+    def delete_corpus(self, resource_name: str) -> None:
+        rag.delete_corpus(resource_name)
+
+    def add_files(self, resource_name: str, paths: List[str]) -> int:
+        transformation_config = rag.TransformationConfig(
+            chunking_config=rag.ChunkingConfig(
+                chunk_size=DEFAULT_CHUNK_SIZE,
+                chunk_overlap=DEFAULT_CHUNK_OVERLAP,
+            ),
+        )
+        import_result = rag.import_files(
+            resource_name,
+            paths,
+            transformation_config=transformation_config,
+            max_embedding_requests_per_min=DEFAULT_EMBEDDING_REQUESTS_PER_MIN,
+        )
+        return import_result.imported_rag_files_count
+
+    def delete_file(self, resource_name: str, file_id: str) -> None:
+        rag.delete_file(f"{resource_name}/ragFiles/{file_id}")
+
+    def list_files(self, resource_name: str) -> List[Dict[str, str]]:
+        files = []
+        for rag_file in rag.list_files(resource_name):
+            try:
+                files.append({
+                    "file_id": rag_file.name.split("/")[-1],
+                    "display_name": rag_file.display_name if hasattr(rag_file, "display_name") else "",
+                    "source_uri": rag_file.source_uri if hasattr(rag_file, "source_uri") else "",
+                    "create_time": str(rag_file.create_time) if hasattr(rag_file, "create_time") else "",
+                    "update_time": str(rag_file.update_time) if hasattr(rag_file, "update_time") else "",
+                })
+            except Exception:
+                # Continue to the next file
+                continue
+        return files
+
+    def query(self, resource_name: str, text: str, top_k: int, distance_threshold: float) -> List[Dict[str, Any]]:
+        response = rag.retrieval_query(
+            rag_resources=[rag.RagResource(rag_corpus=resource_name)],
+            text=text,
+            rag_retrieval_config=rag.RagRetrievalConfig(
+                top_k=top_k,
+                filter=rag.Filter(vector_distance_threshold=distance_threshold),
+            ),
+        )
+        results = []
+        if hasattr(response, "contexts") and response.contexts:
+            for ctx_group in response.contexts.contexts:
+                results.append({
+                    "source_uri": ctx_group.source_uri if hasattr(ctx_group, "source_uri") else "",
+                    "source_name": (
+                        ctx_group.source_display_name if hasattr(ctx_group, "source_display_name") else ""
+                    ),
+                    "text": ctx_group.text if hasattr(ctx_group, "text") else "",
+                    "score": ctx_group.score if hasattr(ctx_group, "score") else 0.0,
+                })
+        return results
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def chunk_text(text: str, chunk_size: int = DEFAULT_CHUNK_SIZE, overlap: int = DEFAULT_CHUNK_OVERLAP) -> List[str]:
+    """Split `text` into chunks of about `chunk_size` words overlapping by `overlap` words."""
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, chunk_size - overlap)
+    return [" ".join(words[i:i + chunk_size]) for i in range(0, max(len(words) - overlap, 1), step)]
+
+
+def read_document(path: str) -> str:
+    """Read a local or gs:// document as plain text."""
+    if path.startswith("gs://"):
+        from google.cloud import storage
+
+        bucket, _, blob = path[len("gs://"):].partition("/")
+        data = storage.Client().bucket(bucket).blob(blob).download_as_bytes()
+        if path.lower().endswith(".pdf"):
+            return _pdf_text(data)
+        return data.decode("utf-8", errors="replace")
+    if path.lower().endswith(".pdf"):
+        with open(path, "rb") as f:
+            return _pdf_text(f.read())
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    if path.lower().endswith((".html", ".htm")):
+        text = re.sub(r"<[^>]+>", " ", text)
+    return text
+
+
+def _pdf_text(data: bytes) -> str:
+    import io
+
+    from pypdf import PdfReader
+
+    return "\n".join(page.extract_text() or "" for page in PdfReader(io.BytesIO(data)).pages)
+
+
+def expand_local_paths(paths: List[str]) -> List[str]:
+    """Replace local directories in `paths` by the supported documents they contain."""
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in sorted(os.walk(path)):
+                expanded.extend(
+                    os.path.join(root, n) for n in sorted(names) if n.lower().endswith(_TEXT_EXTENSIONS + (".pdf",))
+                )
+        else:
+            expanded.append(path)
+    return expanded
+
+
+class _LocalIndex:
+    """Memory-mapped arrays of one local corpus."""
+
+    def __init__(self, directory: str):
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        self.file_index = np.load(os.path.join(directory, "file_index.npy"))
+        text_path = os.path.join(directory, "text.bin")
+        self.text = np.memmap(text_path, dtype=np.uint8, mode="r") if os.path.getsize(text_path) else np.zeros(0, np.uint8)
+
+    def chunk(self, i: int) -> str:
+        return bytes(self.text[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+
+_ARRAY_FILES = ("vectors.npy", "offsets.npy", "file_index.npy", "text.bin")
+
+
+def _prune_versions(directory: str, keep: set) -> None:
+    """Remove the array directories of a local corpus other than `keep`."""
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name not in keep and re.match(r"^v\d+-[0-9a-f]+$", name) and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+    if None not in keep:
+        # Arrays of a corpus written before versioned directories.
+        for name in _ARRAY_FILES:
+            if os.path.exists(os.path.join(directory, name)):
+                os.remove(os.path.join(directory, name))
+
+
+class LocalBackend(RetrievalBackend):
+    """On-disk corpora with in-process embedding and exact vector search."""
+
+    name = "local"
+    accepts_local_paths = True
+
+    def __init__(self, root: str = RAG_LOCAL_INDEX_DIR, embedding_model: str = RAG_LOCAL_EMBEDDING_MODEL):
+        self.root = root
+        self.embedding_model = embedding_model
+        self._indexes: Dict[str, Tuple[Tuple[int, str], _LocalIndex]] = {}
+        self._lock = threading.RLock()
+
+    def resource_name(self, corpus_id: str) -> str:
+        return f"local/ragCorpora/{corpus_id}"
+
+    def is_resource_name(self, name: str) -> bool:
+        return re.match(r"^local/ragCorpora/[^/]+$", name) is not None
+
+    def _dir(self, resource_name: str) -> str:
+        return os.path.join(self.root, resource_name.split("/")[-1])
+
+    def _meta(self, resource_name: str) -> Dict[str, Any]:
+        path = os.path.join(self._dir(resource_name), "corpus.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ValueError(f"Local corpus '{resource_name}' does not exist")
+
+    def _write(self, resource_name: str, meta: Dict[str, Any], vectors, offsets, file_index, text: bytes) -> None:
+        """Write a new version of the corpus arrays to a fresh directory, then swap corpus.json to it."""
+        directory = self._dir(resource_name)
+        os.makedirs(directory, exist_ok=True)
+        previous = meta.get("arrays")
+        meta["version"] = meta.get("version", 0) + 1
+        meta["update_time"] = _now()
+        meta["arrays"] = f"v{meta['version']}-{uuid.uuid4().hex[:8]}"
+        arrays_dir = os.path.join(directory, meta["arrays"])
+        os.makedirs(arrays_dir)
+        for name, array in (("vectors", vectors), ("offsets", offsets), ("file_index", file_index)):
+            np.save(os.path.join(arrays_dir, f"{name}.npy"), array)
+        with open(os.path.join(arrays_dir, "text.bin"), "wb") as f:
+            f.write(text)
+        with open(os.path.join(directory, "corpus.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(os.path.join(directory, "corpus.json.tmp"), os.path.join(directory, "corpus.json"))
+        self._indexes.pop(resource_name, None)
+        _prune_versions(directory, {meta["arrays"], previous})
+
+    def _index(self, resource_name: str) -> Tuple[Dict[str, Any], _LocalIndex]:
+        meta = self._meta(resource_name)
+        # Corpora written before versioned directories keep their arrays next to corpus.json.
+        arrays = meta.get("arrays", "")
+        with self._lock:
+            cached = self._indexes.get(resource_name)
+            if cached is None or cached[0] != (meta["version"], arrays):
+                cached = ((meta["version"], arrays), _LocalIndex(os.path.join(self._dir(resource_name), arrays)))
+                self._indexes[resource_name] = cached
+        return meta, cached[1]
+
+    def _arrays(self, resource_name: str):
+        """Current corpus arrays as in-memory copies, for rewriting."""
+        meta, index = self._index(resource_name)
+        return meta, np.array(index.vectors), index.offsets.copy(), index.file_index.copy(), bytes(index.text)
+
+    def list_corpora(self) -> List[Dict[str, str]]:
+        corpora = []
+        for path in sorted(glob.glob(os.path.join(self.root, "*", "corpus.json"))):
+            with open(path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            corpora.append({
+                "resource_name": self.resource_name(os.path.basename(os.path.dirname(path))),
+                "display_name": meta["display_name"],
+                "create_time": meta.get("create_time", ""),
+                "update_time": meta.get("update_time", ""),
+            })
+        return corpora
+
+    def create_corpus(self, display_name: str) -> Dict[str, str]:
+        resource_name = self.resource_name(uuid.uuid4().hex[:16])
+        meta = {
+            "display_name": display_name,
+            "create_time": _now(),
+            "embedding_model": self.embedding_model,
+            "files": [],
+        }
+        with self._lock:
+            self._write(
+                resource_name, meta,
+                np.zeros((0, 0), dtype=np.float32), np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32), b"",
+            )
+        return {"resource_name": resource_name, "display_name": display_name}
+
+    def delete_corpus(self, resource_name: str) -> None:
+        with self._lock:
+            self._meta(resource_name)
+            shutil.rmtree(self._dir(resource_name))
+            self._indexes.pop(resource_name, None)
+
+    def add_files(self, resource_name: str, paths: List[str]) -> int:
+        from .embeddings import embed_texts
+
+        with self._lock:
+            meta, vectors, offsets, file_index, text = self._arrays(resource_name)
+            if meta.get("embedding_model", self.embedding_model) != self.embedding_model:
+                raise ValueError(
+                    f"Corpus was built with embedding model '{meta['embedding_model']}', "
+                    f"not '{self.embedding_model}'"
+                )
+            new_chunks, new_file_index, added = [], [], 0
+            for path in expand_local_paths(paths):
+                chunks = chunk_text(read_document(path))
+                if not chunks:
+                    continue
+                meta["files"].append({
+                    "file_id": uuid.uuid4().hex[:16],
+                    "display_name": os.path.basename(path.rstrip("/")),
+                    "source_uri": path,
+                    "create_time": _now(),
+                    "update_time": _now(),
+                })
+                new_chunks.extend(chunks)
+                new_file_index.extend([len(meta["files"]) - 1] * len(chunks))
+                added += 1
+            if not new_chunks:
+                return 0
+
+            new_vectors = embed_texts(new_chunks, task="RETRIEVAL_DOCUMENT", backend="local")
+            encoded = [chunk.encode("utf-8") for chunk in new_chunks]
+            new_offsets = offsets[-1] + np.cumsum([len(e) for e in encoded])
+            self._write(
+                resource_name,
+                meta,
+                new_vectors if vectors.size == 0 else np.vstack([vectors, new_vectors]),
+                np.concatenate([offsets, new_offsets]).astype(np.int64),
+                np.concatenate([file_index, np.asarray(new_file_index, dtype=np.int32)]),
+                text + b"".join(encoded),
+            )
+            return added
+
+    def delete_file(self, resource_name: str, file_id: str) -> None:
+        with self._lock:
+            meta, vectors, offsets, file_index, text = self._arrays(resource_name)
+            position = next((i for i, f in enumerate(meta["files"]) if f["file_id"] == file_id), None)
+            if position is None:
+                raise ValueError(f"File '{file_id}' not found in corpus '{resource_name}'")
+            keep = np.flatnonzero(file_index != position)
+            lengths = offsets[1:] - offsets[:-1]
+            pieces = [text[offsets[i]:offsets[i + 1]] for i in keep]
+            del meta["files"][position]
+            remaining = file_index[keep]
+            self._write(
+                resource_name,
+                meta,
+                vectors[keep] if keep.size else np.zeros((0, 0), dtype=np.float32),
+                np.concatenate([[0], np.cumsum(lengths[keep])]).astype(np.int64),
+                np.where(remaining > position, remaining - 1, remaining).astype(np.int32),
+                b"".join(pieces),
+            )
+
+    def list_files(self, resource_name: str) -> List[Dict[str, str]]:
+        return list(self._meta(resource_name)["files"])
+
+    def corpus_revision(self, resource_name: str) -> str:
+        meta = self._meta(resource_name)
+        return f"{meta['version']}:{meta.get('update_time', '')}"
+
+    def list_chunks(self, resource_name: str) -> List[Dict[str, str]]:
+        meta, index = self._index(resource_name)
+        return [
+            {
+                "source_uri": meta["files"][index.file_index[i]]["source_uri"],
+                "source_name": meta["files"][index.file_index[i]]["display_name"],
+                "text": index.chunk(i),
+            }
+            for i in range(index.file_index.shape[0])
+        ]
+
+    def query(self, resource_name: str, text: str, top_k: int, distance_threshold: float) -> List[Dict[str, Any]]:
+        from .embeddings import embed_texts
+
+        meta, index = self._index(resource_name)
+        if index.vectors.shape[0] == 0:
+            return []
+        query_vector = embed_texts([text], backend="local")[0]
+        # Cosine distance, as reported by Vertex AI for COSINE indexes.
+        distances = 1.0 - index.vectors @ query_vector
+        k = min(top_k, distances.shape[0])
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        results = []
+        for i in top:
+            if distances[i] > distance_threshold:
+                continue
+            record = meta["files"][index.file_index[i]]
+            results.append({
+                "source_uri": record["source_uri"],
+                "source_name": record["display_name"],
+                "text": index.chunk(int(i)),
+                "score": float(distances[i]),
+            })
+        return results
+
+
+_BACKENDS = {"vertex": VertexBackend, "local": LocalBackend}
+_BACKEND: Optional[RetrievalBackend] = None
+
+
+def get_backend() -> RetrievalBackend:
+    """The retrieval backend selected by RAG_BACKEND."""
+    global _BACKEND
+    if _BACKEND is None:
+        if RAG_BACKEND not in _BACKENDS:
+            raise ValueError(f"Unknown RAG_BACKEND '{RAG_BACKEND}'. Expected one of: {', '.join(_BACKENDS)}")
+        _BACKEND = _BACKENDS[RAG_BACKEND]()
+    return _BACKEND
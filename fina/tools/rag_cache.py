@@ -0,0 +1,189 @@
+"""
+Semantic cache in front of `rag_query`.
+
+Answered queries are kept with their embedding in an in-memory NumPy index.
+A new query whose embedding has cosine similarity of at least
+RAG_CACHE_SIMILARITY_THRESHOLD with a cached query on the same corpus is
+served the cached retrieval contexts without calling the retrieval backend.
+Queries that differ only in a number (year, amount) or in an article or
+section reference embed almost identically, so a hit also needs the same
+`key_tokens` as the cached query.
+
+Each corpus has a version counter that add_data, delete_document and
+delete_corpus bump; entries recorded under an older version are never served,
+and the hybrid retriever rebuilds its keyword index when it changes.
+"""
+
+import logging
+import re
+import threading
+import unicodedata
+import time
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import (
+    RAG_CACHE_MAX_ENTRIES,
+    RAG_CACHE_SIMILARITY_THRESHOLD,
+    RAG_CACHE_TTL_SECONDS,
+)
+from .embeddings import embed_query
+
+logger = logging.getLogger(__name__)
+
+# Article, section and similar references, e.g. "Điều 5", "khoản 2", "Article IV", "điểm a".
+_REFERENCE = re.compile(
+    r"\b(article|art|section|sec|chapter|clause|paragraph|điều|khoản|điểm|chương|mục|phần)\.?\s*"
+    r"(\d+[a-z]?|[ivxlcdm]+|[a-zđ])\b"
+)
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def key_tokens(query: str) -> FrozenSet[str]:
+    """Numbers and article/section references of `query`; a cache hit needs the same set."""
+    text = unicodedata.normalize("NFC", query).lower()
+    references = {f"{marker}:{value}" for marker, value in _REFERENCE.findall(text)}
+    # "5.000.000" and "5,000,000" are the same amount.
+    numbers = {re.sub(r"[.,]", "", number) for number in _NUMBER.findall(text)}
+    return frozenset(references | numbers)
+
+
+class SemanticCache:
+    """Nearest-neighbour cache of retrieval results keyed by query embedding."""
+
+    def __init__(self, max_entries: int, threshold: float, ttl_seconds: float):
+        self.max_entries = max(1, max_entries)
+        self.threshold = threshold
+        self.ttl = ttl_seconds
+        self._vectors: Optional[np.ndarray] = None  # (max_entries, d), allocated on first store
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * self.max_entries
+        self._corpus = np.full(self.max_entries, -1, dtype=np.int64)
+        self._version = np.zeros(self.max_entries, dtype=np.int64)
+        self._stored_at = np.zeros(self.max_entries)
+        self._last_used = np.zeros(self.max_entries)
+        self._corpus_ids: Dict[str, int] = {}
+        self._corpus_versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _corpus_id(self, corpus: str) -> int:
+        return self._corpus_ids.setdefault(corpus, len(self._corpus_ids))
+
+    def corpus_version(self, corpus: str) -> int:
+        with self._lock:
+            return self._corpus_versions.get(corpus, 0)
+
+    def bump_corpus_version(self, corpus: str) -> None:
+        """Invalidate every cached result of `corpus`."""
+        with self._lock:
+            self._corpus_versions[corpus] = self._corpus_versions.get(corpus, 0) + 1
+            stale = self._corpus == self._corpus_id(corpus)
+            self._corpus[stale] = -1
+            for i in np.flatnonzero(stale):
+                self._entries[i] = None
+
+    def lookup(self, corpus: str, vector: np.ndarray, query: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry most similar to `vector` with the key tokens of `query`, if similar enough."""
+        with self._lock:
+            if self._vectors is None or corpus not in self._corpus_ids:
+                self.misses += 1
+                return None
+            now = time.time()
+            valid = (
+                (self._corpus == self._corpus_ids[corpus])
+                & (self._version == self._corpus_versions.get(corpus, 0))
+                & (now - self._stored_at <= self.ttl)
+            )
+            keys = key_tokens(query)
+            for i in np.flatnonzero(valid):
+                valid[i] = self._entries[i]["keys"] == keys
+            if not valid.any():
+                self.misses += 1
+                return None
+            similarity = np.where(valid, self._vectors @ vector, -np.inf)
+            best = int(np.argmax(similarity))
+            if similarity[best] < self.threshold:
+                self.misses += 1
+                return None
+            self._last_used[best] = now
+            self.hits += 1
+            return {**self._entries[best], "similarity": float(similarity[best])}
+
+    def store(self, corpus: str, version: int, vector: np.ndarray, query: str, results: List[Dict[str, Any]]) -> None:
+        """Cache `results`; skipped if the corpus changed since `version` was read."""
+        with self._lock:
+            if version != self._corpus_versions.get(corpus, 0):
+                return
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            free = np.flatnonzero(self._corpus < 0)
+            # Reuse a free slot, otherwise evict the least recently used entry.
+            slot = int(free[0]) if free.shape[0] else int(np.argmin(self._last_used))
+            now = time.time()
+            self._vectors[slot] = vector
+            self._entries[slot] = {"query": query, "keys": key_tokens(query), "results": results}
+            self._corpus[slot] = self._corpus_id(corpus)
+            self._version[slot] = version
+            self._stored_at[slot] = now
+            self._last_used[slot] = now
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": int((self._corpus >= 0).sum()),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_CACHE = SemanticCache(RAG_CACHE_MAX_ENTRIES, RAG_CACHE_SIMILARITY_THRESHOLD, RAG_CACHE_TTL_SECONDS)
+
+
+def lookup_cached_results(corpus: str, query: str) -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[np.ndarray, int]]]:
+    """
+    Look `query` up in the semantic cache of `corpus`.
+
+    Returns:
+        (entry, probe): the cached entry or None, and the query embedding plus
+        corpus version to pass to `store_results` (None if the query could not
+        be embedded)
+    """
+    version = _CACHE.corpus_version(corpus)
+    try:
+        vector = embed_query(query)
+    except Exception as e:
+        logger.warning(f"Could not embed query for the RAG cache: {str(e)}")
+        return None, None
+    return _CACHE.lookup(corpus, vector, query), (vector, version)
+
+
+def store_results(
+    corpus: str,
+    query: str,
+    probe: Optional[Tuple[np.ndarray, int]],
+    results: List[Dict[str, Any]],
+) -> None:
+    """Cache the retrieval `results` of a query looked up with `lookup_cached_results`."""
+    if probe is not None and results:
+        vector, version = probe
+        _CACHE.store(corpus, version, vector, query, results)
+
+
+def invalidate_corpus(corpus: str) -> None:
+    """Bump the corpus version so its cached results are no longer served."""
+    _CACHE.bump_corpus_version(corpus)
+
+
+def corpus_version(corpus: str) -> int:
+    """Version counter of `corpus`, bumped whenever its documents change."""
+    return _CACHE.corpus_version(corpus)
+
+
+def get_rag_cache_stats() -> Dict[str, Any]:
+    """Size and hit-rate metrics of the RAG semantic cache."""
+    return _CACHE.stats()
@@ -0,0 +1,296 @@
+"""
+Hybrid keyword + vector retrieval for `rag_query`.
+
+Tax law text is full of exact article numbers ("Điều 9", "khoản 2") and legal
+terms that embeddings blur together. A query is therefore answered by two
+retrievers run concurrently:
+  - the backend's vector search, and
+  - an in-memory BM25 inverted index over the corpus chunks,
+whose rankings are merged with reciprocal rank fusion (RRF_K = RAG_RRF_K).
+The two retrievers chunk documents differently (the backend's chunker vs.
+chunk_text), so a keyword hit and a vector hit are fused as one passage when
+they come from the same source and most terms of the shorter one
+(RAG_FUSION_MIN_OVERLAP) appear in the other.
+If RAG_RERANK_MODEL names a sentence-transformers CrossEncoder, the fused
+candidates are reranked by it before the top DEFAULT_TOP_K are returned.
+
+Tokenization is Vietnamese-aware: Vietnamese words are space-separated
+syllables, so adjacent syllable pairs ("thu_nhập", "điều_9") are indexed next
+to the syllables themselves. Every token is also indexed without diacritics,
+and queries typed without diacritics ("thue thu nhap") are matched on that
+form; queries with diacritics keep "thuế" (tax) and "thuê" (rent) apart.
+
+The keyword index is built in a background thread, never on the request
+path: until it is ready, queries use vector search alone. It is rebuilt when
+the backend's corpus revision changes, checked every
+RAG_KEYWORD_INDEX_REFRESH_SECONDS so that changes made by other processes or
+in the console are picked up, and right after this process changes the
+corpus (the RAG cache's corpus version), until which the old index is not used.
+"""
+
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from ..config import (
+    RAG_FUSION_MIN_OVERLAP,
+    RAG_HYBRID_CANDIDATES,
+    RAG_KEYWORD_INDEX_REFRESH_SECONDS,
+    RAG_RERANK_MODEL,
+    RAG_RRF_K,
+)
+from .rag_backends import get_backend
+from .rag_cache import corpus_version, invalidate_corpus
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_FOLDED_PREFIX = "~"
+
+
+def _fold(token: str) -> str:
+    """Strip Vietnamese diacritics: "thuế" -> "thue", "đất" -> "dat"."""
+    token = token.replace("đ", "d")
+    return "".join(c for c in unicodedata.normalize("NFD", token) if not unicodedata.combining(c))
+
+
+def _syllables(text: str) -> List[str]:
+    return _TOKEN.findall(unicodedata.normalize("NFC", text).lower())
+
+
+def _with_bigrams(syllables: List[str]) -> List[str]:
+    return syllables + [f"{a}_{b}" for a, b in zip(syllables, syllables[1:])]
+
+
+def tokenize_document(text: str) -> List[str]:
+    """Index terms of a chunk: syllables and syllable bigrams, with and without diacritics."""
+    terms = _with_bigrams(_syllables(text))
+    return terms + [_FOLDED_PREFIX + _fold(term) for term in terms]
+
+
+def tokenize_query(text: str) -> List[str]:
+    """Query terms; a query typed without diacritics is matched on the folded terms."""
+    terms = _with_bigrams(_syllables(text))
+    if all(term == _fold(term) for term in terms):
+        return [_FOLDED_PREFIX + term for term in terms]
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index of term -> (chunk ids, term frequencies)."""
+
+    def __init__(self, chunks: List[Dict[str, str]], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        lengths = []
+        for i, chunk in enumerate(chunks):
+            counts = Counter(tokenize_document(chunk["text"]))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                ids, tfs = postings.setdefault(term, ([], []))
+                ids.append(i)
+                tfs.append(tf)
+        self.postings = {
+            term: (np.asarray(ids, dtype=np.int32), np.asarray(tfs, dtype=np.float32))
+            for term, (ids, tfs) in postings.items()
+        }
+        self.lengths = np.asarray(lengths, dtype=np.float32)
+        self.avg_length = float(self.lengths.mean()) if chunks else 0.0
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """The `k` best (chunk id, score) pairs with a positive score."""
+        if not self.chunks:
+            return []
+        n = len(self.chunks)
+        scores = np.zeros(n, dtype=np.float32)
+        norm = self.k1 * (1.0 - self.b + self.b * self.lengths / max(self.avg_length, 1e-9))
+        for term in set(tokenize_query(query)):
+            if term not in self.postings:
+                continue
+            ids, tfs = self.postings[term]
+            idf = math.log(1.0 + (n - ids.shape[0] + 0.5) / (ids.shape[0] + 0.5))
+            scores[ids] += idf * tfs * (self.k1 + 1.0) / (tfs + norm[ids])
+        hits = np.flatnonzero(scores > 0)
+        if hits.shape[0] > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits])]
+        return [(int(i), float(scores[i])) for i in hits]
+
+
+# resource name -> (backend revision, local corpus version, index)
+_INDEXES: Dict[str, Tuple[str, int, BM25Index]] = {}
+# resource name -> (monotonic time, local corpus version) of the last build or check
+_CHECKED: Dict[str, Tuple[float, int]] = {}
+_BUILDING: Set[str] = set()
+_INDEXES_LOCK = threading.Lock()
+_BUILDER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-keyword-index")
+_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rag-hybrid")
+_RERANKER: Optional[Any] = None
+_RERANKER_LOCK = threading.Lock()
+
+
+def _build_index(resource_name: str) -> None:
+    """Rebuild the keyword index of the corpus unless the backend's revision is unchanged."""
+    try:
+        version = corpus_version(resource_name)
+        backend = get_backend()
+        revision = backend.corpus_revision(resource_name)
+        with _INDEXES_LOCK:
+            cached = _INDEXES.get(resource_name)
+        if cached is not None and cached[0] == revision:
+            index = cached[2]
+        else:
+            start = time.perf_counter()
+            index = BM25Index(backend.list_chunks(resource_name))
+            logger.info(
+                f"Built keyword index of {resource_name}: {len(index.chunks)} chunks "
+                f"in {time.perf_counter() - start:.1f}s"
+            )
+            if cached is not None and version == cached[1]:
+                # Changed outside this process: its cached answers are stale too.
+                invalidate_corpus(resource_name)
+                version += 1 if corpus_version(resource_name) == version + 1 else 0
+        with _INDEXES_LOCK:
+            _INDEXES[resource_name] = (revision, version, index)
+            _CHECKED[resource_name] = (time.monotonic(), version)
+    except Exception as e:
+        logger.warning(f"Could not build the keyword index of {resource_name}: {str(e)}")
+    finally:
+        with _INDEXES_LOCK:
+            _BUILDING.discard(resource_name)
+
+
+def _keyword_index(resource_name: str) -> Optional[BM25Index]:
+    """
+    The keyword index of the corpus, or None while it is being built.
+
+    Builds and revision checks are scheduled on a background thread, so a
+    query never waits for the corpus to be downloaded and parsed.
+    """
+    version = corpus_version(resource_name)
+    now = time.monotonic()
+    with _INDEXES_LOCK:
+        cached = _INDEXES.get(resource_name)
+        checked = _CHECKED.get(resource_name)
+        due = (
+            checked is None
+            or checked[1] != version
+            or now - checked[0] >= RAG_KEYWORD_INDEX_REFRESH_SECONDS
+        )
+        if due and resource_name not in _BUILDING:
+            _BUILDING.add(resource_name)
+            _CHECKED[resource_name] = (now, version)
+            _BUILDER.submit(_build_index, resource_name)
+    # After a change by this process the old index may return deleted passages.
+    if cached is None or cached[1] != version:
+        return None
+    return cached[2]
+
+
+def _keyword_search(resource_name: str, query: str, k: int) -> List[Dict[str, Any]]:
+    index = _keyword_index(resource_name)
+    if index is None:
+        return []
+    return [{**index.chunks[i], "keyword_score": score} for i, score in index.search(query, k)]
+
+
+def _reranker():
+    global _RERANKER
+    with _RERANKER_LOCK:
+        if _RERANKER is None:
+            from sentence_transformers import CrossEncoder
+
+            _RERANKER = CrossEncoder(RAG_RERANK_MODEL)
+    return _RERANKER
+
+
+def _overlap(a: Set[str], b: Set[str]) -> float:
+    """Share of the smaller term set that is also in the other one."""
+    smaller = min(len(a), len(b))
+    return len(a & b) / smaller if smaller else 0.0
+
+
+def reciprocal_rank_fusion(
+    rankings: Dict[str, List[Dict[str, Any]]],
+    k: int = RAG_RRF_K,
+    min_overlap: float = RAG_FUSION_MIN_OVERLAP,
+) -> List[Dict[str, Any]]:
+    """
+    Merge ranked result lists; a passage scores sum(1 / (k + rank)) over the lists it is in.
+
+    Results of different retrievers are the same passage when they have the
+    same source_uri and a term overlap of at least `min_overlap`; the merged
+    passage keeps the text of the list given first.
+
+    Args:
+        rankings: retriever name -> results, best first
+        k: RRF damping constant
+        min_overlap: smallest share of the shorter text's terms found in the other
+
+    Returns:
+        list: merged results, best first, each with rrf_score and the retrievers that found it
+    """
+    fused: List[Dict[str, Any]] = []
+    fused_terms: List[Set[str]] = []
+    for retriever, results in rankings.items():
+        for rank, result in enumerate(results, start=1):
+            terms = set(_syllables(result.get("text", "")))
+            match = next(
+                (
+                    i for i, entry in enumerate(fused)
+                    if retriever not in entry["retrievers"]
+                    and entry.get("source_uri", "") == result.get("source_uri", "")
+                    and _overlap(fused_terms[i], terms) >= min_overlap
+                ),
+                None,
+            )
+            if match is None:
+                entry = {"score": None, **result, "rrf_score": 0.0, "retrievers": []}
+                fused.append(entry)
+                fused_terms.append(terms)
+            else:
+                entry = fused[match]
+                for name, value in result.items():
+                    if value is not None and entry.get(name) is None:
+                        entry[name] = value
+            entry["rrf_score"] += 1.0 / (k + rank)
+            entry["retrievers"].append(retriever)
+    return sorted(fused, key=lambda entry: entry["rrf_score"], reverse=True)
+
+
+def hybrid_query(resource_name: str, text: str, top_k: int, distance_threshold: float) -> List[Dict[str, Any]]:
+    """
+    Retrieve the `top_k` best chunks by fused keyword and vector search.
+
+    Results have the backend's query shape (source_uri, source_name, text,
+    score as vector distance or None for keyword-only hits) plus rrf_score,
+    retrievers and, when reranking, rerank_score.
+    """
+    keyword_future = _POOL.submit(_keyword_search, resource_name, text, RAG_HYBRID_CANDIDATES)
+    vector_results = get_backend().query(resource_name, text, RAG_HYBRID_CANDIDATES, distance_threshold)
+    try:
+        keyword_results = keyword_future.result()
+    except Exception as e:
+        logger.warning(f"Keyword search failed, using vector results only: {str(e)}")
+        keyword_results = []
+
+    candidates = reciprocal_rank_fusion({"vector": vector_results, "keyword": keyword_results})
+    if RAG_RERANK_MODEL and len(candidates) > 1:
+        try:
+            scores = _reranker().predict([(text, candidate["text"]) for candidate in candidates])
+            for candidate, score in zip(candidates, scores):
+                candidate["rerank_score"] = float(score)
+            candidates.sort(key=lambda candidate: candidate["rerank_score"], reverse=True)
+        except Exception as e:
+            logger.warning(f"Reranking failed, keeping fused order: {str(e)}")
+    return candidates[:top_k]
@@ -1,23 +1,34 @@
 """
-Tool for querying Vertex AI RAG corpora and retrieving relevant information.
+Tool for querying RAG corpora and retrieving relevant information.
+
+Corpora are served by the backend selected with RAG_BACKEND (Vertex AI RAG
+Engine by default, or a local index; see rag_backends).
 """
 
+import hashlib
 import logging
+import os
 import re 
-from typing import List, Dict, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple, Union
 
 from google.adk.tools.tool_context import ToolContext
-from vertexai import rag
 
 from ..config import (
     DEFAULT_DISTANCE_THRESHOLD,
     DEFAULT_TOP_K,
-    DEFAULT_CHUNK_OVERLAP,
-    DEFAULT_CHUNK_SIZE,
-    DEFAULT_EMBEDDING_REQUESTS_PER_MIN,
-    DEFAULT_EMBEDDING_MODEL,
+    RAG_CACHE_ENABLED,
+    RAG_COMPRESSION_ENABLED,
+    RAG_CONTEXT_TOKEN_BUDGET,
+    RAG_HYBRID_ENABLED,
+    RAG_MAX_QUERIES,
 )
-from .utils import check_corpus_exists, get_corpus_resource_name
+from .context_compression import compress_results, format_context
+from .ingest_manifest import delete_manifest, sync_sources
+from .rag_backends import get_backend
+from .rag_cache import invalidate_corpus, lookup_cached_results, store_results
+from .rag_hybrid import hybrid_query
+from .utils import check_corpus_exists, estimate_tokens, get_corpus_resource_name, invalidate_corpus_cache
 
 def add_data(
     corpus_name: str,
@@ -25,7 +36,7 @@ def add_data(
     tool_context: ToolContext,
 ) -> dict:
     """
-    Add new data sources to a Vertex AI RAG corpus.
+    Add new data sources to a RAG corpus.
 
     Args:
         corpus_name (str): The name of the corpus to add data to. If empty, the current corpus will be used.
@@ -34,6 +45,7 @@ def add_data(
                           - Google Drive: "https://drive.google.com/file/d/{FILE_ID}/view"
                           - Google Docs/Sheets/Slides: "https://docs.google.com/{type}/d/{FILE_ID}/..."
                           - Google Cloud Storage: "gs://{BUCKET}/{PATH}"
+                          - Local files or directories (local backend only)
                           Example: ["https://drive.google.com/file/d/123", "gs://my_bucket/my_files_dir"]
         tool_context (ToolContext): The tool context
 
@@ -99,6 +111,11 @@ def add_data(
             validated_paths.append(path)
             continue
 
+        # The local backend also indexes files from disk
+        if get_backend().accepts_local_paths and os.path.exists(path):
+            validated_paths.append(path)
+            continue
+
         # If we're here, the path wasn't in a recognized format
         invalid_paths.append(f"{path} (Invalid format)")
 
@@ -115,21 +132,13 @@ def add_data(
         # Get the corpus resource name
         corpus_resource_name = get_corpus_resource_name(corpus_name)
 
-        # Set up chunking configuration
-        transformation_config = rag.TransformationConfig(
-            chunking_config=rag.ChunkingConfig(
-                chunk_size=DEFAULT_CHUNK_SIZE,
-                chunk_overlap=DEFAULT_CHUNK_OVERLAP,
-            ),
-        )
+        # Import new and changed files; unchanged ones are skipped
+        sync = sync_sources(corpus_resource_name, validated_paths)
+        files_added = sync["files_added"] + sync["files_updated"]
 
-        # Import files to the corpus
-        import_result = rag.import_files(
-            corpus_resource_name,
-            validated_paths,
-            transformation_config=transformation_config,
-            max_embedding_requests_per_min=DEFAULT_EMBEDDING_REQUESTS_PER_MIN,
-        )
+        # Cached answers for this corpus are now stale
+        if files_added or sync["files_failed"]:
+            invalidate_corpus(corpus_resource_name)
 
         # Set this as the current corpus if not already set
         if not tool_context.state.get("current_corpus"):
@@ -139,12 +148,21 @@ def add_data(
         conversion_msg = ""
         if conversions:
             conversion_msg = " (Converted Google Docs URLs to Drive format)"
+        skipped_msg = ""
+        if sync["files_unchanged"]:
+            skipped_msg = f", skipped {sync['files_unchanged']} unchanged file(s)"
 
         return {
-            "status": "success",
-            "message": f"Successfully added {import_result.imported_rag_files_count} file(s) to corpus '{corpus_name}'{conversion_msg}",
+            "status": "warning" if sync["files_failed"] else "success",
+            "message": (
+                f"Successfully added {files_added} file(s) to corpus '{corpus_name}'{skipped_msg}{conversion_msg}"
+                + (f"; {len(sync['files_failed'])} file(s) failed" if sync["files_failed"] else "")
+            ),
             "corpus_name": corpus_name,
-            "files_added": import_result.imported_rag_files_count,
+            "files_added": files_added,
+            "files_updated": sync["files_updated"],
+            "files_unchanged": sync["files_unchanged"],
+            "files_failed": sync["files_failed"],
             "paths": validated_paths,
             "invalid_paths": invalid_paths,
             "conversions": conversions,
@@ -163,7 +181,7 @@ def create_corpus(
     tool_context: ToolContext,
 ) -> dict:
     """
-    Create a new Vertex AI RAG corpus with the specified name.
+    Create a new RAG corpus with the specified name.
 
     Args:
         corpus_name (str): The name for the new corpus
@@ -185,20 +203,10 @@ def create_corpus(
         # Clean corpus name for use as display name
         display_name = re.sub(r"[^a-zA-Z0-9_-]", "_", corpus_name)
 
-        # Configure embedding model
-        embedding_model_config = rag.RagEmbeddingModelConfig(
-            vertex_prediction_endpoint=rag.VertexPredictionEndpoint(
-                publisher_model=DEFAULT_EMBEDDING_MODEL
-            )
-        )
-
         # Create the corpus
-        rag_corpus = rag.create_corpus(
-            display_name=display_name,
-            backend_config=rag.RagVectorDbConfig(
-                rag_embedding_model_config=embedding_model_config
-            ),
-        )
+        rag_corpus = get_backend().create_corpus(display_name)
+
+        invalidate_corpus_cache()
 
         # Update state to track corpus existence
         tool_context.state[f"corpus_exists_{corpus_name}"] = True
@@ -209,8 +217,8 @@ def create_corpus(
         return {
             "status": "success",
             "message": f"Successfully created corpus '{corpus_name}'",
-            "corpus_name": rag_corpus.name,
-            "display_name": rag_corpus.display_name,
+            "corpus_name": rag_corpus["resource_name"],
+            "display_name": rag_corpus["display_name"],
             "corpus_created": True,
         }
 
@@ -223,19 +231,95 @@ def create_corpus(
         }
     
         
+def _retrieve(corpus_resource_name: str, query: str) -> Tuple[List[Dict], bool]:
+    """Results of one query, served from the semantic cache when possible; returns (results, cached)."""
+    # Serve semantically equivalent questions from the cache
+    cache_probe = None
+    if RAG_CACHE_ENABLED:
+        cached, cache_probe = lookup_cached_results(corpus_resource_name, query)
+        if cached is not None:
+            return cached["results"], True
+
+    # Perform the query: keyword + vector search fused, or vector search only
+    retrieve = hybrid_query if RAG_HYBRID_ENABLED else get_backend().query
+    results = retrieve(
+        corpus_resource_name,
+        query,
+        top_k=DEFAULT_TOP_K,
+        distance_threshold=DEFAULT_DISTANCE_THRESHOLD,
+    )
+    store_results(corpus_resource_name, query, cache_probe, results)
+    return results, False
+
+
+def _merge_results(per_query: List[List[Dict]], token_budget: int) -> Tuple[List[Dict], bool]:
+    """
+    Merge the results of several queries into one context; returns (results, truncated).
+
+    Chunks are taken round-robin by rank so every query contributes its best
+    chunk first. A chunk retrieved by several queries is kept once, listing
+    the indices of those queries. Chunks stop being added once the token
+    budget is spent (the first chunk is always kept).
+    """
+    merged: Dict[Tuple[str, str], Dict] = {}
+    tokens = 0
+    truncated = False
+    for rank in range(max((len(results) for results in per_query), default=0)):
+        for query_index, results in enumerate(per_query):
+            if rank >= len(results):
+                continue
+            result = results[rank]
+            key = (
+                result.get("source_uri", ""),
+                hashlib.sha1(" ".join(result.get("text", "").split()).encode("utf-8")).hexdigest(),
+            )
+            if key in merged:
+                merged[key]["queries"].append(query_index)
+                continue
+            cost = estimate_tokens(result.get("text", ""))
+            if merged and tokens + cost > token_budget:
+                truncated = True
+                continue
+            tokens += cost
+            merged[key] = {**result, "queries": [query_index]}
+    return list(merged.values()), truncated
+
+
+def _compress(queries: List[str], results: List[Dict], tool_context: ToolContext) -> Tuple[List[Dict], Dict]:
+    """
+    Compress the results to a token budget and store them as the 'context' state.
+
+    The stored context is replaced on every query, so its size stays bounded
+    however long the conversation gets. Returns (results, token stats).
+    """
+    if not RAG_COMPRESSION_ENABLED:
+        return results, {}
+    results, stats = compress_results(queries, results)
+    tool_context.state["context"] = format_context(results)
+    return results, stats
+
+
 def rag_query(
     corpus_name: str,
     query: str,
     tool_context: ToolContext,
+    queries: Optional[List[str]] = None,
 ) -> dict:
     """
-    Query a Vertex AI RAG corpus with a user question and return relevant information.
+    Query a RAG corpus with a user question and return relevant information.
 
     Args:
         corpus_name (str): The name of the corpus to query. If empty, the current corpus will be used.
                           Preferably use the resource_name from list_corpora results.
         query (str): The text query to search for in the corpus
         tool_context (ToolContext): The tool context
+        queries (List[str], optional): Further sub-questions to retrieve in the same call. All
+                          queries run concurrently and their chunks are merged into one
+                          de-duplicated context capped at RAG_CONTEXT_TOKEN_BUDGET tokens.
+
+    The returned chunk texts are compressed to the sentences relevant to the queries
+    (RAG_COMPRESSED_TOKEN_BUDGET tokens in total) and stored as the 'context' state,
+    replacing the previous context.
 
     Returns:
         dict: The query results and status
@@ -254,41 +338,55 @@ def rag_query(
         # Get the corpus resource name
         corpus_resource_name = get_corpus_resource_name(corpus_name)
 
-        # Configure retrieval parameters
-        rag_retrieval_config = rag.RagRetrievalConfig(
-            top_k=DEFAULT_TOP_K,
-            filter=rag.Filter(vector_distance_threshold=DEFAULT_DISTANCE_THRESHOLD),
-        )
-
-        # Perform the query
-        print("Performing retrieval query...")
-        response = rag.retrieval_query(
-            rag_resources=[
-                rag.RagResource(
-                    rag_corpus=corpus_resource_name,
-                )
-            ],
-            text=query,
-            rag_retrieval_config=rag_retrieval_config,
-        )
-
-        # Process the response into a more usable format
-        results = []
-        if hasattr(response, "contexts") and response.contexts:
-            for ctx_group in response.contexts.contexts:
-                result = {
-                    "source_uri": (
-                        ctx_group.source_uri if hasattr(ctx_group, "source_uri") else ""
-                    ),
-                    "source_name": (
-                        ctx_group.source_display_name
-                        if hasattr(ctx_group, "source_display_name")
-                        else ""
-                    ),
-                    "text": ctx_group.text if hasattr(ctx_group, "text") else "",
-                    "score": ctx_group.score if hasattr(ctx_group, "score") else 0.0,
+        all_queries = list(dict.fromkeys(q.strip() for q in [query, *(queries or [])] if q and q.strip()))
+        if len(all_queries) > RAG_MAX_QUERIES:
+            logging.warning(f"rag_query got {len(all_queries)} queries; only the first {RAG_MAX_QUERIES} are used")
+            all_queries = all_queries[:RAG_MAX_QUERIES]
+
+        if len(all_queries) > 1:
+            with ThreadPoolExecutor(max_workers=len(all_queries)) as pool:
+                retrieved = list(pool.map(lambda q: _retrieve(corpus_resource_name, q), all_queries))
+            results, truncated = _merge_results([r for r, _ in retrieved], RAG_CONTEXT_TOKEN_BUDGET)
+            if not results:
+                return {
+                    "status": "warning",
+                    "message": f"No results found in corpus '{corpus_name}' for any of the {len(all_queries)} queries",
+                    "query": query,
+                    "queries": all_queries,
+                    "corpus_name": corpus_name,
+                    "results": [],
+                    "results_count": 0,
                 }
-                results.append(result)
+            results, stats = _compress(all_queries, results, tool_context)
+            return {
+                "status": "success",
+                "message": f"Successfully queried corpus '{corpus_name}' with {len(all_queries)} queries",
+                "query": query,
+                "queries": all_queries,
+                "corpus_name": corpus_name,
+                "results": results,
+                "results_count": len(results),
+                "per_query": [
+                    {"query": q, "results_count": len(r), "cached": cached}
+                    for q, (r, cached) in zip(all_queries, retrieved)
+                ],
+                "truncated": truncated,
+                **stats,
+            }
+
+        results, cached = _retrieve(corpus_resource_name, query)
+        if cached:
+            results, stats = _compress(all_queries, results, tool_context)
+            return {
+                "status": "success",
+                "message": f"Successfully queried corpus '{corpus_name}' (cached answer for a similar question)",
+                "query": query,
+                "corpus_name": corpus_name,
+                "results": results,
+                "results_count": len(results),
+                "cached": True,
+                **stats,
+            }
 
         # If we didn't find any results
         if not results:
@@ -301,6 +399,7 @@ def rag_query(
                 "results_count": 0,
             }
 
+        results, stats = _compress(all_queries, results, tool_context)
         return {
             "status": "success",
             "message": f"Successfully queried corpus '{corpus_name}'",
@@ -308,6 +407,7 @@ def rag_query(
             "corpus_name": corpus_name,
             "results": results,
             "results_count": len(results),
+            **stats,
         }
 
     except Exception as e:
@@ -326,7 +426,7 @@ def delete_corpus(
     tool_context: ToolContext,
 ) -> dict:
     """
-    Delete a Vertex AI RAG corpus when it's no longer needed.
+    Delete a RAG corpus when it's no longer needed.
     Requires confirmation to prevent accidental deletion.
 
     Args:
@@ -359,7 +459,10 @@ def delete_corpus(
         corpus_resource_name = get_corpus_resource_name(corpus_name)
 
         # Delete the corpus
-        rag.delete_corpus(corpus_resource_name)
+        get_backend().delete_corpus(corpus_resource_name)
+        invalidate_corpus_cache()
+        invalidate_corpus(corpus_resource_name)
+        delete_manifest(corpus_resource_name)
 
         # Remove from state by setting to False
         state_key = f"corpus_exists_{corpus_name}"
@@ -384,7 +487,7 @@ def delete_document(
     tool_context: ToolContext,
 ) -> dict:
     """
-    Delete a specific document from a Vertex AI RAG corpus.
+    Delete a specific document from a RAG corpus.
 
     Args:
         corpus_name (str): The full resource name of the corpus containing the document.
@@ -410,8 +513,8 @@ def delete_document(
         corpus_resource_name = get_corpus_resource_name(corpus_name)
 
         # Delete the document
-        rag_file_path = f"{corpus_resource_name}/ragFiles/{document_id}"
-        rag.delete_file(rag_file_path)
+        get_backend().delete_file(corpus_resource_name, document_id)
+        invalidate_corpus(corpus_resource_name)
 
         return {
             "status": "success",
@@ -461,41 +564,7 @@ def get_corpus_info(
         file_details = []
         try:
             # Get the list of files
-            files = rag.list_files(corpus_resource_name)
-            for rag_file in files:
-                # Get document specific details
-                try:
-                    # Extract the file ID from the name
-                    file_id = rag_file.name.split("/")[-1]
-
-                    file_info = {
-                        "file_id": file_id,
-                        "display_name": (
-                            rag_file.display_name
-                            if hasattr(rag_file, "display_name")
-                            else ""
-                        ),
-                        "source_uri": (
-                            rag_file.source_uri
-                            if hasattr(rag_file, "source_uri")
-                            else ""
-                        ),
-                        "create_time": (
-                            str(rag_file.create_time)
-                            if hasattr(rag_file, "create_time")
-                            else ""
-                        ),
-                        "update_time": (
-                            str(rag_file.update_time)
-                            if hasattr(rag_file, "update_time")
-                            else ""
-                        ),
-                    }
-
-                    file_details.append(file_info)
-                except Exception:
-                    # Continue to the next file
-                    continue
+            file_details = get_backend().list_files(corpus_resource_name)
         except Exception:
             # Continue without file details
             pass
@@ -519,7 +588,7 @@ def get_corpus_info(
         
 def list_corpora() -> dict:
     """
-    List all available Vertex AI RAG corpora.
+    List all available RAG corpora.
 
     Returns:
         dict: A list of available corpora and status, with each corpus containing:
@@ -530,23 +599,7 @@ def list_corpora() -> dict:
     """
     try:
         # Get the list of corpora
-        corpora = rag.list_corpora()
-
-        # Process corpus information into a more usable format
-        corpus_info: List[Dict[str, Union[str, int]]] = []
-        for corpus in corpora:
-            corpus_data: Dict[str, Union[str, int]] = {
-                "resource_name": corpus.name,  # Full resource name for use with other tools
-                "display_name": corpus.display_name,
-                "create_time": (
-                    str(corpus.create_time) if hasattr(corpus, "create_time") else ""
-                ),
-                "update_time": (
-                    str(corpus.update_time) if hasattr(corpus, "update_time") else ""
-                ),
-            }
-
-            corpus_info.append(corpus_data)
+        corpus_info: List[Dict[str, Union[str, int]]] = get_backend().list_corpora()
 
         return {
             "status": "success",
@@ -0,0 +1,127 @@
+"""
+Compact encoding of tool results before they are handed to the model.
+
+Everything a tool returns ends up in the LLM context, so results are encoded
+as minified JSON, lists of records are turned into a column header plus value
+rows (keys are written once instead of once per row), floats are rounded and
+long lists are capped with an explicit truncation marker.
+"""
+
+import json
+import math
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from ..config import RESULT_FLOAT_PRECISION, RESULT_MAX_ROWS
+
+
+def round_number(value: float, precision: int = RESULT_FLOAT_PRECISION) -> float:
+    """
+    Round to `precision` decimals, keeping `precision` significant digits for
+    values below 1 so small prices (e.g. 0.00001234) do not collapse to zero.
+    """
+    if not math.isfinite(value) or value == 0:
+        return value
+    magnitude = abs(value)
+    if magnitude >= 1:
+        return round(value, precision)
+    return round(value, precision - 1 - math.floor(math.log10(magnitude)))
+
+
+def compact(value: Any, precision: int = RESULT_FLOAT_PRECISION) -> Any:
+    """Recursively round floats and convert values to JSON-friendly types."""
+    if isinstance(value, bool) or value is None or isinstance(value, (int, str)):
+        return value
+    if isinstance(value, float):
+        # NaN/inf are not valid JSON
+        return round_number(value, precision) if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: compact(v, precision) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [compact(v, precision) for v in value]
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    # NumPy scalars and anything else with an item() accessor
+    if hasattr(value, "item"):
+        return compact(value.item(), precision)
+    return str(value)
+
+
+def to_table(
+    rows: Iterable[Dict[str, Any]],
+    fields: Optional[List[str]] = None,
+    max_rows: Optional[int] = RESULT_MAX_ROWS,
+    exact_total: bool = True,
+) -> Dict[str, Any]:
+    """
+    Convert a list of records into {"columns": [...], "rows": [[...], ...]}.
+
+    Args:
+        rows: records to encode
+        fields: columns to keep, in order; defaults to every key seen
+        max_rows: cap on the number of rows; when exceeded the result carries
+                  "truncated": True and the original "total_rows"
+        exact_total: False when the query already stopped at max_rows + 1
+                     rows, so "total_rows" would be wrong and is left out
+    """
+    rows = list(rows)
+    if fields is None:
+        fields = list(dict.fromkeys(key for row in rows for key in row))
+    table: Dict[str, Any] = {"columns": list(fields)}
+    if max_rows is not None and max_rows >= 0 and len(rows) > max_rows:
+        table["truncated"] = True
+        if exact_total:
+            table["total_rows"] = len(rows)
+        rows = rows[:max_rows]
+    table["rows"] = [[row.get(field) for field in fields] for row in rows]
+    return table
+
+
+def _is_records(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(v, dict) for v in value)
+
+
+def encode_result(
+    data: Any,
+    fields: Optional[List[str]] = None,
+    precision: int = RESULT_FLOAT_PRECISION,
+    max_rows: Optional[int] = RESULT_MAX_ROWS,
+    tabular: bool = True,
+    exact_total: bool = True,
+) -> str:
+    """
+    Encode a tool result as a compact JSON string.
+
+    Args:
+        data: native result (dict, list of records, scalar)
+        fields: columns to keep in every list of records
+        precision: float rounding, see `round_number`
+        max_rows: row cap for lists of records
+        tabular: encode lists of records as column/row tables
+        exact_total: see `to_table`
+
+    Returns:
+        str: minified JSON
+    """
+    def _encode(value: Any) -> Any:
+        if _is_records(value):
+            if tabular:
+                return to_table(value, fields, max_rows, exact_total)
+            records = value
+            if fields is not None:
+                records = [{f: row.get(f) for f in fields} for row in records]
+            if max_rows is not None and max_rows >= 0 and len(records) > max_rows:
+                truncated = {"records": records[:max_rows], "truncated": True}
+                if exact_total:
+                    truncated["total_rows"] = len(records)
+                return truncated
+            return records
+        if isinstance(value, dict):
+            return {k: _encode(v) for k, v in value.items()}
+        return value
+
+    return json.dumps(
+        compact(_encode(data), precision),
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
@@ -0,0 +1,63 @@
+"""
+Deterministic prompt-safety gate for the main flow.
+
+Runs the local prompt-safety classifier as a `before_agent_callback`, so no
+LLM round trip is spent just to call it. A malicious verdict short-circuits
+the flow with a refusal; otherwise the flow runs unchanged.
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
+
+from ..config import DEFEND_MALICIOUS_CLASS_ID
+from .defend_tools import classify_prompt_safety
+
+logger = logging.getLogger(__name__)
+
+BLOCKED_MESSAGE = (
+    "Sorry, your request was blocked because it violates the FINA usage policy. "
+    "Please rephrase it as a personal-finance request."
+)
+UNVERIFIED_MESSAGE = (
+    "Sorry, your request could not be safety-checked right now. Please try again in a moment."
+)
+
+
+def _user_text(callback_context: CallbackContext) -> str:
+    content = callback_context.user_content
+    if not content or not content.parts:
+        return ""
+    return "\n".join(part.text for part in content.parts if part.text)
+
+
+def _reply(text: str) -> types.Content:
+    return types.Content(role="model", parts=[types.Part(text=text)])
+
+
+async def prompt_safety_gate(callback_context: CallbackContext) -> Optional[types.Content]:
+    """
+    Classify the user's message before the agent runs.
+
+    Returns a refusal `Content` (which makes ADK skip the agent) for malicious
+    or unverifiable prompts, and None to let the agent run.
+    """
+    text = _user_text(callback_context)
+    if not text.strip():
+        return None
+
+    try:
+        verdict = await asyncio.to_thread(classify_prompt_safety, text)
+    except Exception as e:
+        # Fail closed: an unchecked prompt never reaches the tools.
+        logger.error(f"[safety gate] classifier error: {str(e)}")
+        return _reply(UNVERIFIED_MESSAGE)
+
+    callback_context.state["safety_verdict"] = verdict
+    if verdict == DEFEND_MALICIOUS_CLASS_ID:
+        logger.warning("[safety gate] blocked malicious prompt: %s", text[:200])
+        return _reply(BLOCKED_MESSAGE)
+    return None
@@ -4,22 +4,51 @@ Utility functions for the RAG tools.
 
 import logging
 import re
+import threading
+import time
+from typing import Dict, Optional
 
 from google.adk.tools.tool_context import ToolContext
-from vertexai import rag
 
-from ..config import (
-    LOCATION,
-    PROJECT_ID,
-)
+from ..config import RAG_CORPUS_CACHE_TTL_SECONDS
+from .rag_backends import get_backend
 
 logger = logging.getLogger(__name__)
 
+# Process-wide directory of corpora: display name and resource name both map
+# to the resource name. Refreshed with one list_corpora call per TTL.
+_CORPUS_DIRECTORY: Optional[Dict[str, str]] = None
+_CORPUS_DIRECTORY_LOADED_AT = 0.0
+_CORPUS_DIRECTORY_LOCK = threading.Lock()
+
+
+def _corpus_directory(refresh: bool = False) -> Dict[str, str]:
+    """Return the cached corpus directory, listing corpora again when stale."""
+    global _CORPUS_DIRECTORY, _CORPUS_DIRECTORY_LOADED_AT
+    with _CORPUS_DIRECTORY_LOCK:
+        expired = time.monotonic() - _CORPUS_DIRECTORY_LOADED_AT > RAG_CORPUS_CACHE_TTL_SECONDS
+        if _CORPUS_DIRECTORY is None or expired or refresh:
+            directory = {}
+            for corpus in get_backend().list_corpora():
+                directory[corpus["resource_name"]] = corpus["resource_name"]
+                if corpus.get("display_name"):
+                    directory[corpus["display_name"]] = corpus["resource_name"]
+            _CORPUS_DIRECTORY = directory
+            _CORPUS_DIRECTORY_LOADED_AT = time.monotonic()
+        return _CORPUS_DIRECTORY
+
+
+def invalidate_corpus_cache() -> None:
+    """Drop the cached corpus directory, e.g. after creating or deleting a corpus."""
+    global _CORPUS_DIRECTORY
+    with _CORPUS_DIRECTORY_LOCK:
+        _CORPUS_DIRECTORY = None
+
 
 def get_corpus_resource_name(corpus_name: str) -> str:
     """
     Convert a corpus name to its full resource name if needed.
-    Handles various input formats and ensures the returned name follows Vertex AI's requirements.
+    Handles various input formats and ensures the returned name follows the RAG backend's requirements.
 
     Args:
         corpus_name (str): The corpus name or display name
@@ -29,17 +58,15 @@ def get_corpus_resource_name(corpus_name: str) -> str:
     """
     logger.info(f"Getting resource name for corpus: {corpus_name}")
 
-    # If it's already a full resource name with the projects/locations/ragCorpora format
-    if re.match(r"^projects/[^/]+/locations/[^/]+/ragCorpora/[^/]+$", corpus_name):
+    # If it's already a full resource name (projects/locations/ragCorpora format on Vertex AI)
+    if get_backend().is_resource_name(corpus_name):
         return corpus_name
 
     # Check if this is a display name of an existing corpus
     try:
-        # List all corpora and check if there's a match with the display name
-        corpora = rag.list_corpora()
-        for corpus in corpora:
-            if hasattr(corpus, "display_name") and corpus.display_name == corpus_name:
-                return corpus.name
+        resource_name = _corpus_directory().get(corpus_name)
+        if resource_name:
+            return resource_name
     except Exception as e:
         logger.warning(f"Error when checking for corpus display name: {str(e)}")
         # If we can't check, continue with the default behavior
@@ -56,7 +83,7 @@ def get_corpus_resource_name(corpus_name: str) -> str:
     corpus_id = re.sub(r"[^a-zA-Z0-9_-]", "_", corpus_id)
 
     # Construct the standardized resource name
-    return f"projects/{PROJECT_ID}/locations/{LOCATION}/ragCorpora/{corpus_id}"
+    return get_backend().resource_name(corpus_id)
 
 
 def check_corpus_exists(corpus_name: str, tool_context: ToolContext) -> bool:
@@ -78,19 +105,20 @@ def check_corpus_exists(corpus_name: str, tool_context: ToolContext) -> bool:
         # Get full resource name
         corpus_resource_name = get_corpus_resource_name(corpus_name)
 
-        # List all corpora and check if this one exists
-        corpora = rag.list_corpora()
-        for corpus in corpora:
-            if (
-                corpus.name == corpus_resource_name
-                or corpus.display_name == corpus_name
-            ):
-                # Update state
-                tool_context.state[f"corpus_exists_{corpus_name}"] = True
-                # Also set this as the current corpus if no current corpus is set
-                if not tool_context.state.get("current_corpus"):
-                    tool_context.state["current_corpus"] = corpus_name
-                return True
+        # Look the corpus up in the cached directory; on a miss refresh once in
+        # case it was created since the directory was loaded.
+        directory = _corpus_directory()
+        exists = corpus_resource_name in directory or corpus_name in directory
+        if not exists:
+            directory = _corpus_directory(refresh=True)
+            exists = corpus_resource_name in directory or corpus_name in directory
+        if exists:
+            # Update state
+            tool_context.state[f"corpus_exists_{corpus_name}"] = True
+            # Also set this as the current corpus if no current corpus is set
+            if not tool_context.state.get("current_corpus"):
+                tool_context.state["current_corpus"] = corpus_name
+            return True
 
         return False
     except Exception as e:
@@ -116,6 +144,10 @@ def set_current_corpus(corpus_name: str, tool_context: ToolContext) -> bool:
         return True
     return False
 
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count of `text` (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
 def append_to_state(tool_context: ToolContext, field: str, response: str) -> dict[str, str]:
     existing = tool_context.state.get(field)
     if existing is None:
@@ -127,3 +159,9 @@ def append_to_state(tool_context: ToolContext, field: str, response: str) -> dic
         tool_context.state[field] = [existing, response]
     logging.info(f"[Added to {field}] {response}")
     return {"status": "success"}
+
+def set_state(tool_context: ToolContext, field: str, response: str) -> dict[str, str]:
+    """Replace the value of `field` in state, unlike append_to_state which accumulates."""
+    tool_context.state[field] = response
+    logging.info(f"[Set {field}] {response}")
+    return {"status": "success"}
@@ -0,0 +1,304 @@
+"""
+Mark-to-market valuation of the `investments` table.
+
+A valuation run loads every position, resolves its market symbol, fetches all
+prices with one provider call per asset type, computes P&L for the whole table
+in a single NumPy pass and writes the results back with one bulk update
+(the `apply_investment_valuations` function from supabase/migrations). A
+provider that fails only leaves its own positions unpriced.
+
+All values are in VND, the currency `amount_invested` is recorded in: stocks
+are quoted in VND and crypto is converted to VALUATION_CRYPTO_CONVERT ("VND").
+The `quantity` column is added by supabase/migrations/*_add_investment_quantity.sql.
+
+Scheduled revaluation runs as its own process:
+
+    python -m fina.tools.valuation schedule --interval 900
+"""
+
+import argparse
+import json
+
+import logging
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from vnstock import Vnstock
+
+from ..config import (
+    PRICE_HISTORY_SOURCE,
+    PROVIDER_TIMEOUT_SECONDS,
+    VALUATION_CRYPTO_CONVERT,
+    VALUATION_INTERVAL_SECONDS,
+)
+from .database import select_rows, supabase
+from .investment_tools import COINMARKETCAP_API_KEY
+from .price_history import load_history
+from .provider_replay import get_http_session, replay_call, today as provider_today
+
+logger = logging.getLogger(__name__)
+
+# Vnstock history quotes prices in thousands of VND while the price board
+# quotes plain VND.
+_HISTORY_PRICE_SCALE = 1000.0
+
+# Common crypto names users type instead of ticker symbols.
+_CRYPTO_ALIASES = {
+    "BITCOIN": "BTC",
+    "ETHEREUM": "ETH",
+    "TETHER": "USDT",
+    "BINANCECOIN": "BNB",
+    "SOLANA": "SOL",
+    "RIPPLE": "XRP",
+    "CARDANO": "ADA",
+    "DOGECOIN": "DOGE",
+    "POLKADOT": "DOT",
+    "LITECOIN": "LTC",
+}
+
+_schedule_stop: Optional[threading.Event] = None
+_schedule_thread: Optional[threading.Thread] = None
+_run_lock = threading.Lock()
+
+
+def _resolve_symbol(asset_name: str, asset_type: str) -> str:
+    """Map an investment row's asset name to a provider symbol."""
+    symbol = re.sub(r"[^A-Z0-9]", "", (asset_name or "").upper())
+    if (asset_type or "").lower() == "crypto":
+        return _CRYPTO_ALIASES.get(symbol, symbol)
+    return symbol
+
+
+def _fetch_crypto_prices(symbols: List[str]) -> Dict[str, float]:
+    """Fetch latest crypto prices for all symbols in one CoinMarketCap call."""
+    if not symbols:
+        return {}
+    response = get_http_session().get(
+        "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest",
+        headers={"Accepts": "application/json", "X-CMC_PRO_API_KEY": COINMARKETCAP_API_KEY},
+        params={"symbol": ",".join(symbols), "convert": VALUATION_CRYPTO_CONVERT},
+        timeout=PROVIDER_TIMEOUT_SECONDS,
+    )
+    data = response.json().get("data", {})
+    prices = {}
+    for symbol in symbols:
+        info = data.get(symbol)
+        # The v1 endpoint returns a list when a symbol is ambiguous.
+        if isinstance(info, list):
+            info = info[0] if info else None
+        if info:
+            prices[symbol] = float(info["quote"][VALUATION_CRYPTO_CONVERT]["price"])
+    return prices
+
+
+def _fetch_stock_prices(symbols: List[str]) -> Dict[str, float]:
+    """Fetch latest VN stock prices for all symbols from one price board call."""
+    if not symbols:
+        return {}
+    prices = {}
+    try:
+        board = replay_call(
+            "vnstock.price_board",
+            lambda: Vnstock().stock(symbol=symbols[0], source=PRICE_HISTORY_SOURCE).trading.price_board(symbols),
+            symbols=symbols, source=PRICE_HISTORY_SOURCE,
+        )
+        for symbol, price in zip(board[("listing", "symbol")], board[("match", "match_price")]):
+            if price:
+                prices[str(symbol).upper()] = float(price)
+    except Exception as e:
+        logger.warning(f"Price board request failed, falling back to price history: {str(e)}")
+
+    # Fall back to the latest stored close for anything the board did not price.
+    start = provider_today() - timedelta(days=10)
+    for symbol in symbols:
+        if symbol in prices:
+            continue
+        try:
+            closes = load_history(symbol, start)["close"]
+            if closes.shape[0]:
+                prices[symbol] = float(closes[-1]) * _HISTORY_PRICE_SCALE
+        except Exception as e:
+            logger.warning(f"Could not price stock '{symbol}': {str(e)}")
+    return prices
+
+
+def _fetch_prices(asset_type: str, fetch: Callable[[List[str]], Dict[str, float]], symbols: List[str]) -> Dict[str, float]:
+    """Run one provider's price fetch; a failure leaves its positions unpriced instead of aborting the run."""
+    try:
+        return fetch(symbols)
+    except Exception as e:
+        logger.error(f"Could not fetch {asset_type} prices, {len(symbols)} symbol(s) left unpriced: {str(e)}")
+        return {}
+
+
+def _entry_price(symbol: str, asset_type: str, start_date) -> float:
+    """Close price on (or just after) the investment start date, if known."""
+    if (asset_type or "").lower() != "stock" or not start_date:
+        return float("nan")
+    try:
+        start = datetime.fromisoformat(str(start_date).replace("Z", "+00:00")).date()
+        closes = load_history(symbol, start, start + timedelta(days=7))["close"]
+        if closes.shape[0]:
+            return float(closes[0]) * _HISTORY_PRICE_SCALE
+    except Exception as e:
+        logger.warning(f"Could not find entry price for '{symbol}': {str(e)}")
+    return float("nan")
+
+
+def revalue_investments() -> dict:
+    """
+    Revalue every position in the `investments` table at current market prices.
+
+    Positions need either a `quantity` column or, for stocks, a `start_date`
+    from which the entry price (and so the quantity) can be derived.
+
+    Returns:
+        dict: Totals for the run and the positions that could not be priced
+    """
+    with _run_lock:
+        rows = select_rows("investments")
+        if not rows:
+            return {
+                "status": "success",
+                "message": "No investments to revalue",
+                "positions_valued": 0,
+                "positions_skipped": [],
+            }
+
+        types = [(row.get("type") or "").lower() for row in rows]
+        symbols = [_resolve_symbol(row.get("asset_name"), t) for row, t in zip(rows, types)]
+
+        prices = {}
+        prices.update(_fetch_prices(
+            "crypto", _fetch_crypto_prices, sorted({s for s, t in zip(symbols, types) if t == "crypto"})
+        ))
+        prices.update(_fetch_prices(
+            "stock", _fetch_stock_prices, sorted({s for s, t in zip(symbols, types) if t == "stock"})
+        ))
+
+        invested = np.array([float(row.get("amount_invested") or 0.0) for row in rows])
+        quantity = np.array([
+            float(row["quantity"]) if row.get("quantity") is not None else np.nan for row in rows
+        ])
+        missing_qty = np.isnan(quantity)
+        if missing_qty.any():
+            entry = np.array([
+                _entry_price(s, t, row.get("start_date")) if m else np.nan
+                for row, s, t, m in zip(rows, symbols, types, missing_qty)
+            ])
+            quantity = np.where(missing_qty, invested / entry, quantity)
+        price = np.array([prices.get(s, np.nan) for s in symbols])
+
+        current_value = quantity * price
+        profit = current_value - invested
+        with np.errstate(divide="ignore", invalid="ignore"):
+            profit_percent = np.where(invested > 0, profit / invested * 100.0, 0.0)
+        valued = np.isfinite(current_value)
+
+        # Only the computed columns are written, by id in one UPDATE, so edits
+        # made to a row since it was read are not overwritten.
+        updates = [
+            {
+                "id": row["id"],
+                "current_value": round(float(current_value[i]), 2),
+                "profit": round(float(profit[i]), 2),
+                "profit_percent": round(float(profit_percent[i]), 2),
+            }
+            for i, row in enumerate(rows)
+            if valued[i]
+        ]
+        if updates:
+            supabase.rpc("apply_investment_valuations", {"updates": updates}).execute()
+
+        skipped = [
+            {
+                "id": rows[i].get("id"),
+                "asset_name": rows[i].get("asset_name"),
+                "reason": "no market price" if np.isnan(price[i]) else "unknown quantity",
+            }
+            for i in np.flatnonzero(~valued)
+        ]
+        return {
+            "status": "success",
+            "message": f"Revalued {len(updates)} of {len(rows)} investment(s)",
+            "positions_valued": len(updates),
+            "positions_skipped": skipped,
+            "total_invested": round(float(invested[valued].sum()), 2),
+            "total_current_value": round(float(current_value[valued].sum()), 2),
+            "total_profit": round(float(profit[valued].sum()), 2),
+            "valued_at": datetime.now().isoformat(),
+        }
+
+
+def mark_to_market() -> dict:
+    """
+    Update current value, profit and profit percent of all investments using
+    the latest crypto and VN stock prices.
+
+    Returns:
+        dict: Totals of the valuation and any investments that could not be priced
+    """
+    try:
+        return revalue_investments()
+    except Exception as e:
+        error_msg = f"Error revaluing investments: {str(e)}"
+        logger.error(error_msg)
+        return {"status": "error", "message": error_msg}
+
+
+def _schedule_loop(stop: threading.Event, interval_seconds: int) -> None:
+    while not stop.wait(interval_seconds):
+        result = mark_to_market()
+        logger.info(f"[scheduled valuation] {result.get('message')}")
+
+
+def start_valuation_schedule(interval_seconds: int = VALUATION_INTERVAL_SECONDS) -> bool:
+    """
+    Start a daemon thread that revalues the investments table every
+    `interval_seconds`. Returns False if disabled or already running.
+    """
+    global _schedule_stop, _schedule_thread
+    if interval_seconds <= 0 or (_schedule_thread and _schedule_thread.is_alive()):
+        return False
+    _schedule_stop = threading.Event()
+    _schedule_thread = threading.Thread(
+        target=_schedule_loop,
+        args=(_schedule_stop, interval_seconds),
+        name="fina-valuation",
+        daemon=True,
+    )
+    _schedule_thread.start()
+    return True
+
+
+def stop_valuation_schedule() -> None:
+    """Stop the scheduled valuation thread if it is running."""
+    if _schedule_stop is not None:
+        _schedule_stop.set()
+
+
+def _main() -> None:
+    parser = argparse.ArgumentParser(description="Mark-to-market valuation of the investments table")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("once", help="revalue all investments now")
+    schedule = sub.add_parser("schedule", help="revalue all investments every --interval seconds")
+    schedule.add_argument("--interval", type=int, default=VALUATION_INTERVAL_SECONDS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "once":
+        print(json.dumps(mark_to_market(), ensure_ascii=False, indent=2))
+        return
+    if not start_valuation_schedule(args.interval):
+        parser.error("--interval must be positive")
+    try:
+        _schedule_thread.join()
+    except KeyboardInterrupt:
+        stop_valuation_schedule()
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,4 @@
+-- Units held per position, used by fina.tools.valuation to mark it to market.
+-- Nullable: stock positions without it are valued from their entry close.
+alter table public.investments
+    add column if not exists quantity double precision;
@@ -0,0 +1,19 @@
+-- Bulk write of computed valuation fields, used by fina.tools.valuation.
+-- A plain UPDATE by id: an upsert of partial rows runs as INSERT ... ON CONFLICT
+-- and fails the NOT NULL checks of the columns it does not send.
+create or replace function public.apply_investment_valuations(updates jsonb)
+returns integer
+language sql
+as $$
+    with applied as (
+        update public.investments as i
+        set current_value = u.current_value,
+            profit = u.profit,
+            profit_percent = u.profit_percent
+        from jsonb_to_recordset(updates)
+            as u(id bigint, current_value numeric, profit numeric, profit_percent numeric)
+        where i.id = u.id
+        returning i.id
+    )
+    select count(*)::integer from applied;
+$$;
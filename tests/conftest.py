@@ -0,0 +1,12 @@
+import os
+import sys
+
+# fina.tools.database creates its Supabase client at import time; these
+# placeholders let the modules import without credentials. Tests never
+# reach the network.
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.e30.test")
+os.environ.setdefault("MODEL", "gemini-2.5-flash")
+os.environ.setdefault("PROVIDER_REPLAY_MODE", "off")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
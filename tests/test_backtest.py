@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from fina.tools.backtest import rebalance_indices, run_backtest
+
+_DAY = 86400
+
+
+def _naive_equity(prices, weights, anchors, initial_value=1.0):
+    """Share-by-share simulation: hold shares, trade back to the weights at each anchor's close."""
+    anchors = set(int(a) for a in anchors)
+    shares = weights * initial_value / prices[0]
+    equity = [initial_value]
+    for t in range(1, prices.shape[0]):
+        value = float(shares @ prices[t])
+        equity.append(value)
+        if t in anchors:
+            shares = weights * value / prices[t]
+    return np.array(equity)
+
+
+@pytest.fixture
+def market():
+    rng = np.random.default_rng(7)
+    times = np.int64(1_704_067_200) + np.arange(400, dtype=np.int64) * _DAY  # from 2024-01-01
+    prices = 100.0 * np.cumprod(1.0 + rng.normal(0.0005, 0.02, size=(400, 3)), axis=0)
+    return times, prices
+
+
+@pytest.mark.parametrize("rebalance", ["none", "daily", "weekly", "monthly", "quarterly", "yearly"])
+def test_equity_matches_share_simulation(market, rebalance):
+    times, prices = market
+    weights = np.array([[0.5, 0.3, 0.2], [1.0, 0.0, 0.0]])
+
+    result = run_backtest(times, prices, weights, rebalance=rebalance, initial_value=1000.0)
+
+    anchors = rebalance_indices(times, rebalance)
+    for k in range(weights.shape[0]):
+        np.testing.assert_allclose(result["equity"][:, k], _naive_equity(prices, weights[k], anchors, 1000.0), rtol=1e-10)
+
+
+def test_single_asset_has_no_turnover(market):
+    times, prices = market
+    result = run_backtest(times, prices, np.array([[0.0, 1.0, 0.0]]), rebalance="monthly")
+    assert result["turnover"][0] == pytest.approx(0.0)
+    np.testing.assert_allclose(result["equity"][:, 0], prices[:, 1] / prices[0, 1])
+
+
+def test_monthly_anchors_start_each_month():
+    times = np.int64(1_704_067_200) + np.arange(70, dtype=np.int64) * _DAY  # 2024-01-01 .. 2024-03-10
+    np.testing.assert_array_equal(rebalance_indices(times, "monthly"), [0, 31, 60])
+
+
+def test_weekly_anchors_start_on_monday():
+    times = np.int64(1_704_067_200) + np.arange(15, dtype=np.int64) * _DAY  # 2024-01-01 was a Monday
+    np.testing.assert_array_equal(rebalance_indices(times, "weekly"), [0, 7, 14])
+
+
+def test_unknown_rebalance_is_rejected():
+    with pytest.raises(ValueError):
+        rebalance_indices(np.zeros(3, dtype=np.int64), "hourly")
@@ -0,0 +1,99 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from google.adk.models import LlmRequest
+from google.genai import types
+
+from fina.tools import context_cache
+
+
+class FakeCaches:
+    def __init__(self):
+        self.created = []
+        self.failures = 0
+        self.gate = None
+
+    def create(self, model, config):
+        if self.gate is not None and config.display_name == "fina-slow":
+            self.gate.wait(timeout=5)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("503 unavailable")
+        name = f"cachedContents/{len(self.created)}"
+        self.created.append(config.display_name)
+        return SimpleNamespace(name=name, expire_time=datetime.now(timezone.utc) + timedelta(hours=1))
+
+    def update(self, name, config):
+        return SimpleNamespace(name=name, expire_time=datetime.now(timezone.utc) + timedelta(hours=1))
+
+
+@pytest.fixture
+def caches(monkeypatch):
+    fake = FakeCaches()
+    monkeypatch.setattr(context_cache, "_CLIENT", SimpleNamespace(caches=fake))
+    for name in ("_CACHES", "_RETRY_AFTER", "_CREATE_LOCKS", "_REFRESHING"):
+        monkeypatch.setattr(context_cache, name, {})
+    return fake
+
+
+def request(instruction: str = "x" * 8000) -> LlmRequest:
+    return LlmRequest(model="gemini-2.5-flash", config=types.GenerateContentConfig(system_instruction=instruction))
+
+
+def test_failed_creation_is_retried_after_the_backoff(caches):
+    caches.failures = 1
+    req = request()
+    assert context_cache._cache_name(req, "db") is None
+    # Within the backoff the prefix is sent uncached without another create call.
+    assert context_cache._cache_name(req, "db") is None
+    assert caches.created == []
+
+    key = context_cache._prefix_key(req)
+    context_cache._RETRY_AFTER[key] = datetime.now(timezone.utc) - timedelta(seconds=1)
+    assert context_cache._cache_name(req, "db") == "cachedContents/0"
+    assert key not in context_cache._RETRY_AFTER
+    assert context_cache._cache_name(req, "db") == "cachedContents/0"
+    assert caches.created == ["fina-db"]
+
+
+def test_small_prefix_is_never_created(caches):
+    req = request("short instruction")
+    assert context_cache._cache_name(req, "ctx") is None
+    assert context_cache._cache_name(req, "ctx") is None
+    assert caches.created == []
+
+
+def test_slow_creation_does_not_block_other_prefixes(caches):
+    caches.gate = threading.Event()
+    slow = threading.Thread(target=context_cache._cache_name, args=(request("a" * 8000), "slow"))
+    slow.start()
+    try:
+        assert context_cache._cache_name(request("b" * 8000), "fast") == "cachedContents/0"
+    finally:
+        caches.gate.set()
+        slow.join()
+    assert caches.created == ["fina-fast", "fina-slow"]
+
+
+def test_concurrent_first_requests_make_one_cache(caches):
+    req = request()
+    names = []
+    threads = [threading.Thread(target=lambda: names.append(context_cache._cache_name(req, "db"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert names == ["cachedContents/0"] * 4
+    assert caches.created == ["fina-db"]
+
+
+def test_expiring_cache_is_refreshed(caches):
+    req = request()
+    key = context_cache._prefix_key(req)
+    context_cache._CACHES[key] = ("cachedContents/9", datetime.now(timezone.utc) + timedelta(minutes=5))
+    assert context_cache._cache_name(req, "db") == "cachedContents/9"
+    context_cache._POOL.submit(lambda: None).result()
+    assert context_cache._CACHES[key][1] - datetime.now(timezone.utc) > timedelta(minutes=30)
+    assert caches.created == []
@@ -0,0 +1,193 @@
+import asyncio
+import inspect
+import json
+
+import pytest
+
+from fina.tools import crud_dispatch, database
+
+
+class _Query:
+    def __init__(self, calls, rows):
+        self.calls = calls
+        self.rows = rows
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return method
+
+    def execute(self):
+        return type("Response", (), {"data": self.rows})()
+
+
+class _Supabase:
+    def __init__(self, rows):
+        self.calls = []
+        self.rows = rows
+
+    def table(self, name):
+        self.calls.append(("table", (name,), {}))
+        return _Query(self.calls, self.rows)
+
+
+def test_select_rows_filters_orders_and_limits_in_the_database(monkeypatch):
+    fake = _Supabase([{"id": 3}])
+    monkeypatch.setattr(database, "supabase", fake)
+    rows = database.select_rows(
+        "investments", ["id", "asset_name"], "id", search_columns=["asset_name"], terms=["bitcoin", "btc"], limit=5
+    )
+    assert rows == [{"id": 3}]
+    assert fake.calls == [
+        ("table", ("investments",), {}),
+        ("select", ("id,asset_name",), {}),
+        ("or_", ("asset_name.ilike.%bitcoin%,asset_name.ilike.%btc%",), {}),
+        ("order", ("id",), {"desc": True}),
+        ("limit", (5,), {}),
+    ]
+
+
+def test_search_terms_keep_only_words_that_can_name_a_row():
+    assert crud_dispatch.search_terms("Delete my Bitcoin investment") == ["bitcoin"]
+    assert crud_dispatch.search_terms("Xóa khoản nợ anh Nam 5 triệu") == ["anh", "nam"]
+    assert crud_dispatch.search_terms("Sửa giao dịch 50k") == []
+
+
+def test_find_targets_searches_by_name_then_falls_back_to_newest(monkeypatch):
+    calls = []
+
+    def select_rows(table, fields, order_by, search_columns=None, terms=None, limit=None):
+        calls.append((table, tuple(fields), order_by, search_columns, terms, limit))
+        return [] if terms else [{"id": 9}]
+
+    monkeypatch.setattr(crud_dispatch, "select_rows", select_rows)
+    assert crud_dispatch.find_targets("delete_investment", "Delete my Bitcoin investment", limit=7) == [{"id": 9}]
+    assert calls[0] == (
+        "investments",
+        ("id", "asset_name", "type", "amount_invested", "from_wallet", "start_date"),
+        "id",
+        ["asset_name", "type"],
+        ["bitcoin"],
+        7,
+    )
+    assert calls[1][4] is None and calls[1][5] == 7
+    assert calls[1][2] == "id"
+
+
+@pytest.mark.parametrize("message, reply", [
+    ("yes", True),
+    ("Có", True),
+    ("đồng ý", True),
+    ("ok, delete it", True),
+    ("no", False),
+    ("Không, đừng xóa", False),
+    ("hủy", False),
+    ("yes but delete the other wallet instead", None),
+    ("Show my debts", None),
+    ("", None),
+])
+def test_confirmation_reply(message, reply):
+    assert crud_dispatch.confirmation_reply(message) is reply
+
+
+@pytest.fixture
+def tools(monkeypatch):
+    calls = []
+
+    def fake(intent, result=None):
+        tool = crud_dispatch.INTENT_TOOLS[intent]
+
+        def call(**kwargs):
+            calls.append((tool.__name__, kwargs))
+            return result
+
+        call.__name__ = tool.__name__
+        call.__signature__ = inspect.signature(tool)
+        monkeypatch.setitem(crud_dispatch.INTENT_TOOLS, intent, call)
+
+    return fake, calls
+
+
+def test_dispatch_coerces_arguments_to_the_annotated_types(tools):
+    fake, calls = tools
+    fake("insert_transaction")
+    result = crud_dispatch.dispatch(
+        "insert_transaction",
+        {"wallet": "Cash", "amount": "50,000", "time": "2026-10-19T08:00:00", "unknown": 1},
+    )
+    assert result["status"] == "success"
+    assert calls == [("insert_transaction", {"wallet": "Cash", "amount": 50000.0, "time": "2026-10-19T08:00:00"})]
+
+    fake("delete_debt")
+    assert crud_dispatch.dispatch("delete_debt", {"debt_id": "12"})["arguments"] == {"debt_id": 12}
+
+
+@pytest.mark.parametrize("intent, arguments, name", [
+    ("insert_transaction", {"wallet": "Cash", "amount": "fifty"}, "amount"),
+    ("insert_transaction", {"wallet": "Cash", "amount": True}, "amount"),
+    ("delete_debt", {"debt_id": 1.5}, "debt_id"),
+    ("edit_wallet", {"wallet_name": "Cash", "new_data": {}}, "new_data"),
+    ("insert_debt", {"name": "Nam", "amount": 1, "interest_rate": 0, "to_wallet": "Cash", "due_date": "next week"}, "due_date"),
+])
+def test_dispatch_rejects_values_of_the_wrong_type(tools, intent, arguments, name):
+    fake, calls = tools
+    fake(intent)
+    result = crud_dispatch.dispatch(intent, arguments)
+    assert result["status"] == "error" and f"'{name}'" in result["message"]
+    assert calls == []
+
+
+def test_dispatch_decodes_encoded_read_results(tools):
+    fake, _ = tools
+    fake("read_wallet", json.dumps({"columns": ["name"], "rows": [["Cash"]]}))
+    result = crud_dispatch.dispatch("read_wallet")
+    assert result["result"] == {"columns": ["name"], "rows": [["Cash"]]}
+
+
+def test_delete_runs_only_after_confirmation(tools, monkeypatch):
+    from google.adk.models.base_llm import BaseLlm
+    from google.adk.models.llm_response import LlmResponse
+    from google.adk.runners import InMemoryRunner
+    from google.genai import types
+
+    from fina.sub_agents.database_agent import agent as database_agent
+
+    class _Extractor(BaseLlm):
+        model: str = "fake"
+
+        async def generate_content_async(self, llm_request, stream=False):
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text='{"investment_id": 4}')]))
+
+    fake, calls = tools
+    fake("delete_investment")
+    monkeypatch.setattr(database_agent, "find_targets", lambda intent, text: [{"id": 4, "asset_name": "Bitcoin"}])
+    agent = database_agent.crud_dispatch_agent
+    monkeypatch.setattr(agent.argument_agent, "model", _Extractor())
+
+    async def turn(runner, session, text):
+        replies = []
+        async for event in runner.run_async(
+            user_id="u", session_id=session.id, new_message=types.Content(role="user", parts=[types.Part(text=text)])
+        ):
+            if event.content and event.content.parts and event.content.parts[0].text:
+                replies.append(event.content.parts[0].text)
+        return replies
+
+    async def main():
+        runner = InMemoryRunner(agent=agent, app_name="test")
+        session = await runner.session_service.create_session(
+            app_name="test", user_id="u", state={"intent": "delete_investment"}
+        )
+        first = await turn(runner, session, "Delete my Bitcoin investment")
+        assert calls == [] and "Please confirm" in first[-1] and "Bitcoin" in first[-1]
+        second = await turn(runner, session, "yes")
+        assert calls == [("delete_investment", {"investment_id": 4})] and second[-1].startswith("Done")
+
+        calls.clear()
+        await turn(runner, session, "Delete my Bitcoin investment")
+        third = await turn(runner, session, "no")
+        assert calls == [] and third[-1].startswith("Cancelled")
+
+    asyncio.run(main())
@@ -0,0 +1,150 @@
+import json
+
+import numpy as np
+import pytest
+import torch
+
+from fina.tools import defend_onnx, defend_tools
+
+
+class _Tokenizer:
+    def __call__(self, texts, **kwargs):
+        ids = torch.tensor([[len(t), 1] for t in texts])
+        return _Batch(input_ids=ids, attention_mask=torch.ones_like(ids))
+
+
+class _Batch(dict):
+    def to(self, device):
+        return self
+
+
+class _TorchModel(torch.nn.Module):
+    device = torch.device("cpu")
+
+    def forward(self, input_ids, attention_mask):
+        benign = (input_ids[:, 0] % 2 == 0).float()
+        logits = torch.stack([1.0 - benign, benign], dim=1)
+        return type("Output", (), {"logits": logits})()
+
+
+class _Onnx:
+    def __init__(self, flip=()):
+        self.flip = set(flip)
+
+    def logits(self, inputs):
+        benign = (inputs["input_ids"][:, 0] % 2 == 0).astype(np.float32)
+        for i in self.flip:
+            benign[i] = 1.0 - benign[i]
+        return np.stack([1.0 - benign, benign], axis=1)
+
+
+def test_parity_counts_disagreements_and_requires_all_by_default():
+    texts = ["ab", "abc", "abcd", "abcde"]
+    agree = defend_onnx.check_parity(_Tokenizer(), _TorchModel(), _Onnx(), texts=texts, labels=[1, 0, 1, 0], batch_size=3)
+    assert agree["disagreements"] == 0 and agree["passed"]
+    assert agree["torch_accuracy"] == agree["onnx_accuracy"] == 1.0
+
+    one_off = defend_onnx.check_parity(_Tokenizer(), _TorchModel(), _Onnx(flip=[2]), texts=texts)
+    assert one_off["disagreements"] == 1
+    assert one_off["passed"] is (defend_onnx.DEFEND_ONNX_MAX_DISAGREEMENTS >= 1)
+
+
+def test_failed_parity_returns_the_loaded_torch_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(defend_onnx, "DEFEND_ONNX_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(defend_onnx, "export_quantized", lambda *args: str(tmp_path / "model-int8.onnx"))
+    monkeypatch.setattr(defend_onnx, "OnnxClassifier", lambda path: _Onnx())
+    monkeypatch.setattr(defend_onnx, "check_parity", lambda *args: {"passed": False, "disagreements": 3})
+    model = _TorchModel()
+    loads = []
+
+    def load():
+        loads.append(1)
+        return model
+
+    sha = "a" * 40
+    (tmp_path / "org_model" / sha).mkdir(parents=True)
+    classifier, fallback = defend_onnx.load_onnx_classifier("org/model", _Tokenizer(), load, sha)
+
+    assert classifier is None and fallback is model and loads == [1]
+    report = json.loads((tmp_path / "org_model" / sha / "parity.json").read_text())
+    assert report["passed"] is False
+
+
+def test_loaded_model_does_not_load_torch_twice(monkeypatch):
+    loads = []
+    model = _TorchModel()
+    monkeypatch.setattr(defend_tools, "DEFEND_BACKEND", "auto")
+    monkeypatch.setattr(defend_tools, "_DEVICE", torch.device("cpu"))
+    monkeypatch.setattr(defend_tools.AutoTokenizer, "from_pretrained", lambda *args, **kwargs: _Tokenizer())
+    monkeypatch.setattr(defend_tools, "_load_torch_model", lambda *args: loads.append(1) or model)
+
+    def parity_failed(name, tokenizer, load, revision):
+        return None, load()
+
+    monkeypatch.setattr(defend_tools, "load_onnx_classifier", parity_failed)
+    loaded = defend_tools._LoadedModel("org/model", "a" * 40)
+
+    assert loaded.model is model and loaded.onnx is None and loads == [1]
+
+
+def test_revision_is_resolved_to_a_pinned_commit(tmp_path, monkeypatch):
+    calls = []
+
+    class _Api:
+        def model_info(self, name, revision):
+            calls.append((name, revision))
+            return type("Info", (), {"sha": "b" * 40})()
+
+    import huggingface_hub
+
+    monkeypatch.setattr(defend_tools, "_RESOLVED", {})
+    monkeypatch.setattr(huggingface_hub, "HfApi", _Api)
+    assert defend_tools.resolve_revision("org/model", "main") == "b" * 40
+    assert defend_tools.resolve_revision("org/model", "main") == "b" * 40
+    assert defend_tools.resolve_revision("org/model", "c" * 40) == "c" * 40
+    assert calls == [("org/model", "main")]
+
+
+def test_revision_falls_back_to_the_downloaded_ref(tmp_path, monkeypatch):
+    class _OfflineApi:
+        def model_info(self, name, revision):
+            raise OSError("offline")
+
+    import huggingface_hub
+    import huggingface_hub.constants
+
+    refs = tmp_path / "models--org--model" / "refs"
+    refs.mkdir(parents=True)
+    (refs / "main").write_text("d" * 40)
+    monkeypatch.setattr(defend_tools, "_RESOLVED", {})
+    monkeypatch.setattr(huggingface_hub, "HfApi", _OfflineApi)
+    monkeypatch.setattr(huggingface_hub.constants, "HF_HUB_CACHE", str(tmp_path))
+    assert defend_tools.resolve_revision("org/model", "main") == "d" * 40
+
+
+class _WindowTokenizer:
+    def __call__(self, texts, **kwargs):
+        return {
+            "input_ids": [[len(t), 1] for t in texts],
+            "attention_mask": [[1, 1] for _ in texts],
+            "overflow_to_sample_mapping": list(range(len(texts))),
+        }
+
+    def pad(self, features, padding, return_tensors):
+        return {key: np.array([f[key] for f in features]) for key in features[0]}
+
+
+def test_cascade_stats_are_keyed_by_the_resolved_sha(monkeypatch):
+    sha = "e" * 40
+    loaded = type("Loaded", (), {"tokenizer": _WindowTokenizer(), "model": None, "onnx": _Onnx()})()
+    monkeypatch.setattr(defend_tools, "_RESOLVED", {("org/model", "main"): sha})
+    monkeypatch.setattr(defend_tools, "_REGISTRY", defend_tools._ModelRegistry(2))
+    monkeypatch.setattr(defend_tools, "_LoadedModel", lambda name, revision: loaded)
+    monkeypatch.setattr(defend_tools.defend_lexical, "screen", lambda texts: [None] * len(texts))
+
+    report = defend_tools.evaluate_cascade(["ab", "abc"], [0, 1], "org/model@main")
+
+    (stats,) = defend_tools.get_model_stats()
+    assert (stats["revision"], stats["prompts"], stats["loads"]) == (sha, 2, 1)
+    assert (report["model"], report["revision"]) == ("org/model", sha)
+    assert report["cascade_recall"] == 1.0
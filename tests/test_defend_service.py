@@ -0,0 +1,73 @@
+import json
+import socketserver
+import threading
+import time
+
+import pytest
+
+from fina.tools import defend_service
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, delay=0.0, close_after_reply=False):
+        self.delay = delay
+        self.close_after_reply = close_after_reply
+        self.received = 0
+        super().__init__(path, _Handler)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            self.server.received += 1
+            time.sleep(self.server.delay)
+            self.wfile.write(json.dumps({"status": "success", "echo": json.loads(line)}).encode("utf-8") + b"\n")
+            self.wfile.flush()
+            if self.server.close_after_reply:
+                return
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(defend_service, "_local", threading.local())
+    servers = []
+
+    def start(**kwargs):
+        path = str(tmp_path / f"defend-{len(servers)}.sock")
+        srv = _Server(path, **kwargs)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        servers.append(srv)
+        return path, srv
+
+    yield start
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
+
+
+def test_timeout_is_not_retried(server, monkeypatch):
+    monkeypatch.setattr(defend_service, "DEFEND_SERVICE_TIMEOUT_SECONDS", 0.2)
+    path, srv = server(delay=0.5)
+    with pytest.raises(TimeoutError):
+        defend_service._request({"op": "health"}, path)
+    time.sleep(0.4)
+    assert srv.received == 1
+
+
+def test_stale_connection_is_reopened(server):
+    path, srv = server(close_after_reply=True)
+    assert defend_service._request({"op": "health", "n": 1}, path)["echo"]["n"] == 1
+    time.sleep(0.1)
+    assert defend_service._request({"op": "health", "n": 2}, path)["echo"]["n"] == 2
+    assert srv.received == 2
+
+
+def test_missing_service_is_reported(tmp_path, monkeypatch):
+    monkeypatch.setattr(defend_service, "_local", threading.local())
+    health = defend_service.service_health(str(tmp_path / "absent.sock"))
+    assert health["status"] == "error"
@@ -0,0 +1,62 @@
+import pytest
+
+from fina.tools import ingest_manifest
+
+
+class _Backend:
+    name = "fake"
+    embedding_model = "test"
+
+    def __init__(self, files):
+        self.files = files
+        self.deleted, self.imported = [], []
+
+    def list_files(self, resource_name):
+        return list(self.files)
+
+    def delete_file(self, resource_name, file_id):
+        self.deleted.append(file_id)
+
+    def add_files(self, resource_name, paths):
+        self.imported.extend(paths)
+        return len(paths)
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    manifest = ingest_manifest.IngestManifest
+    monkeypatch.setattr(ingest_manifest, "IngestManifest", lambda name: manifest(name, str(tmp_path / "manifests")))
+    paths = []
+    for name in ("a.txt", "b.txt"):
+        path = tmp_path / name
+        path.write_text(f"text of {name}")
+        paths.append(str(path))
+    return paths
+
+
+def _use(monkeypatch, backend):
+    monkeypatch.setattr(ingest_manifest, "get_backend", lambda: backend)
+
+
+def test_files_in_the_corpus_but_not_the_manifest_are_replaced(sources, monkeypatch):
+    backend = _Backend([{"file_id": "old-a", "source_uri": sources[0]}])
+    _use(monkeypatch, backend)
+
+    result = ingest_manifest.sync_sources("local/ragCorpora/c1", sources)
+
+    assert backend.deleted == ["old-a"]
+    assert sorted(backend.imported) == sorted(sources)
+    assert (result["files_updated"], result["files_added"]) == (1, 1)
+
+
+def test_second_sync_skips_unchanged_files(sources, monkeypatch):
+    backend = _Backend([])
+    _use(monkeypatch, backend)
+    ingest_manifest.sync_sources("local/ragCorpora/c1", sources)
+    backend.files = [{"file_id": f"id-{i}", "source_uri": uri} for i, uri in enumerate(sources)]
+    backend.imported.clear()
+
+    result = ingest_manifest.sync_sources("local/ragCorpora/c1", sources)
+
+    assert backend.imported == [] and backend.deleted == []
+    assert result["files_unchanged"] == 2
@@ -0,0 +1,52 @@
+import pytest
+
+from fina.tools import intent_router
+from fina.tools.intent_router import calibrate_thresholds, classify_intent, evaluate_router
+
+
+def test_lowest_threshold_reaches_the_target():
+    confidences = [0.9, 0.8, 0.7, 0.6, 0.5]
+    correct = [True, True, False, True, True]
+    assert intent_router._lowest_threshold(confidences, correct, 1.0) == 0.8
+    assert intent_router._lowest_threshold(confidences, correct, 0.75) == 0.5
+    assert intent_router._lowest_threshold([0.4], [False], 0.9) == 1.0
+    # A correct and a wrong prediction with the same confidence cannot be split.
+    assert intent_router._lowest_threshold([0.9, 0.7, 0.7], [True, True, False], 1.0) == 0.9
+
+
+def test_write_intents_need_a_higher_bar_and_unknown_is_never_routed():
+    labels = ["tax", "read_debt", "insert_debt", "delete_debt", "unknown"]
+    predictions = [("tax", 0.9), ("read_debt", 0.6), ("insert_debt", 0.5), ("delete_debt", 0.95), ("tax", 0.99)]
+    threshold, write_threshold = calibrate_thresholds(labels[:4] + ["tax"], predictions, 0.97, 1.0, 0.15)
+    assert threshold == 0.6
+    assert write_threshold == pytest.approx(0.75)
+
+    threshold, _ = calibrate_thresholds(labels, predictions, 1.0, 1.0, 0.15)
+    assert threshold == 1.0  # the confident "tax" for an unknown message is a misroute
+    _, write_threshold = calibrate_thresholds(["insert_debt"], [("delete_debt", 0.99)], 0.97, 1.0, 0.15)
+    assert write_threshold == 1.0
+
+
+def test_built_in_examples_meet_the_calibrated_targets():
+    report = evaluate_router()
+    assert report["routed_accuracy"] >= 0.97
+    assert report["write_routed_accuracy"] == 1.0
+    assert report["write_threshold"] >= report["threshold"] + 0.15 - 1e-9
+    assert report["coverage"] > 0.1
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("Tôi vừa đầu tư Bitcoin", "insert_investment"),
+    ("Edit my gold investment", "edit_investment"),
+    ("Delete my Bitcoin investment", "delete_investment"),
+    ("Show my spending history", "read_transaction"),
+    ("What is my current balance?", "read_wallet"),
+])
+def test_known_misroutes_are_routed_right_or_left_to_the_llm(text, intent):
+    routed, _ = classify_intent(text)
+    assert routed in (intent, None)
+
+
+def test_off_topic_messages_go_to_the_llm():
+    for text in ("Hello", "Xin chào", "Tell me a joke"):
+        assert classify_intent(text)[0] is None
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from fina.tools.portfolio_analytics import _project_capped_simplex, mean_variance_weights, risk_parity_weights
+
+
+def _bisect_projection(v, cap):
+    lo, hi = v.min() - cap - 1.0, v.max()
+    for _ in range(200):
+        mid = (lo + hi) / 2.0
+        if np.clip(v - mid, 0.0, cap).sum() > 1.0:
+            lo = mid
+        else:
+            hi = mid
+    return np.clip(v - (lo + hi) / 2.0, 0.0, cap)
+
+
+def test_projection_of_a_dominant_weight_is_fully_invested():
+    w = _project_capped_simplex(np.array([1e6, 0.0, 0.0, 0.0]), 0.4)
+    np.testing.assert_allclose(w, [0.4, 0.2, 0.2, 0.2])
+    assert w.sum() == pytest.approx(1.0, abs=1e-12)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_projection_matches_bisection(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(2, 30))
+    cap = float(rng.uniform(1.0 / n, 1.0))
+    v = rng.normal(scale=float(rng.choice([1e-3, 1.0, 1e3])), size=n)
+
+    w = _project_capped_simplex(v, cap)
+
+    assert w.sum() == pytest.approx(1.0, abs=1e-9)
+    assert w.min() >= 0.0 and w.max() <= cap + 1e-12
+    np.testing.assert_allclose(w, _bisect_projection(v, cap), atol=1e-9)
+
+
+def test_projection_keeps_a_feasible_point():
+    v = np.array([0.1, 0.3, 0.2, 0.4])
+    np.testing.assert_allclose(_project_capped_simplex(v, 0.5), v)
+
+
+def test_mean_variance_respects_cap_and_budget():
+    mu = np.array([0.30, 0.05, 0.04, 0.03])
+    cov = np.diag([0.04, 0.02, 0.02, 0.02])
+    w = mean_variance_weights(mu, cov, risk_aversion=1.0, max_weight=0.4)
+    assert w.sum() == pytest.approx(1.0, abs=1e-9)
+    assert w.max() <= 0.4 + 1e-12
+    assert w[0] == pytest.approx(0.4)
+
+
+def test_risk_parity_equalizes_risk_contributions():
+    cov = np.array([[0.04, 0.01, 0.0], [0.01, 0.09, 0.02], [0.0, 0.02, 0.16]])
+    w = risk_parity_weights(cov)
+    contrib = w * (cov @ w)
+    np.testing.assert_allclose(contrib, contrib.mean(), rtol=1e-6)
+    assert w.sum() == pytest.approx(1.0)
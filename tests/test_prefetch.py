@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import pytest
+
+from fina.tools import prefetch
+
+
+@pytest.fixture
+def plan(monkeypatch):
+    def failing():
+        raise RuntimeError("provider down")
+
+    monkeypatch.setitem(prefetch.PREFETCH_PLAN, "invest", {
+        "summary": lambda: {"total_income": 10},
+        "top_crypto": failing,
+        "top_vn_stocks": lambda: [],
+    })
+
+
+def test_failed_and_empty_fetches_are_written_as_none(plan):
+    state = asyncio.run(prefetch.prefetch_state("invest"))
+    assert state == {
+        "summary": {"total_income": 10},
+        "top_crypto": None,
+        "top_vn_stocks": None,
+        "prefetched": ["summary"],
+    }
+
+
+def test_provider_errors_are_not_prefetched(monkeypatch):
+    from fina.tools import investment_tools
+
+    def down():
+        raise ConnectionError("CoinMarketCap unavailable")
+
+    # The agent tool hides the failure in a truthy result; the plan must not.
+    monkeypatch.setattr(investment_tools, "_fetch_top_10_crypto", down)
+    assert "error" in investment_tools.get_top_10_crypto()
+    monkeypatch.setitem(prefetch.PREFETCH_PLAN, "invest", {
+        "top_crypto": down,
+        "top_vn_stocks": lambda: [{"ticker": "FPT", "price": 120.0}],
+    })
+
+    state = asyncio.run(prefetch.prefetch_state("invest"))
+
+    assert state["top_crypto"] is None
+    assert json.loads(state["top_vn_stocks"]) == {"columns": ["ticker", "price"], "rows": [["FPT", 120.0]]}
+    assert state["prefetched"] == ["top_vn_stocks"]
+
+
+def test_invest_plan_uses_the_raising_fetchers():
+    from fina.tools import investment_tools
+
+    plan = prefetch.PREFETCH_PLAN["invest"]
+    assert plan["top_crypto"] is investment_tools._fetch_top_10_crypto
+    assert plan["top_vn_stocks"] is investment_tools._fetch_top_10_vn_stocks
+
+
+@pytest.mark.parametrize("intent", ["tax", None])
+def test_intents_without_a_plan_clear_every_key(intent):
+    state = asyncio.run(prefetch.prefetch_state(intent))
+    assert state == {"summary": None, "top_crypto": None, "top_vn_stocks": None, "prefetched": []}
+
+
+def test_prefetch_agent_overwrites_stale_state(plan):
+    from google.adk.runners import InMemoryRunner
+    from google.genai import types
+
+    from fina.agent import prefetch_agent
+
+    async def main():
+        runner = InMemoryRunner(agent=prefetch_agent, app_name="test")
+        session = await runner.session_service.create_session(
+            app_name="test",
+            user_id="u",
+            state={"intent": "visualize", "summary": "old", "top_crypto": ["old"], "prefetched": ["summary", "top_crypto"]},
+        )
+        async for _ in runner.run_async(
+            user_id="u", session_id=session.id, new_message=types.Content(role="user", parts=[types.Part(text="chart")])
+        ):
+            pass
+        session = await runner.session_service.get_session(app_name="test", user_id="u", session_id=session.id)
+        return session.state
+
+    state = asyncio.run(main())
+    assert state["summary"] is None and state["top_crypto"] is None and state["prefetched"] == []
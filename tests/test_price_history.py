@@ -0,0 +1,99 @@
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from fina.tools import price_history
+
+TODAY = date(2025, 3, 5)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_history, "PRICE_HISTORY_DIR", str(tmp_path))
+    monkeypatch.setattr(price_history, "provider_today", lambda: TODAY)
+    calls = []
+
+    def fetch_bars(symbol, start, end, interval):
+        calls.append((start, end))
+        days = np.arange(np.datetime64(start), np.datetime64(end) + 1)
+        return {
+            "time": days.astype("datetime64[s]").astype(np.int64),
+            **{name: np.ones(len(days)) for name in price_history.COLUMNS[1:]},
+        }
+
+    monkeypatch.setattr(price_history, "_fetch_bars", fetch_bars)
+    return calls
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    """Whether each partition write included the columns."""
+    written = []
+    write_partition = price_history._write_partition
+
+    def spy(path, columns, meta):
+        written.append(columns is not None)
+        write_partition(path, columns, meta)
+
+    monkeypatch.setattr(price_history, "_write_partition", spy)
+    return written
+
+
+def test_forming_bar_is_not_refetched_within_the_ttl(store):
+    start = TODAY - timedelta(days=10)
+    price_history.load_history("FPT", start)
+    price_history.load_history("FPT", start)
+    price_history.load_history("FPT", start, TODAY - timedelta(days=1))
+    assert store == [(start, TODAY)]
+
+
+def test_expired_forming_bar_refetches_only_today_and_keeps_unchanged_columns(store, writes, monkeypatch):
+    start = TODAY - timedelta(days=10)
+    price_history.load_history("FPT", start)
+
+    monkeypatch.setattr(price_history, "PRICE_HISTORY_LIVE_TTL_SECONDS", 0)
+    bars = price_history.load_history("FPT", start)
+
+    assert store == [(start, TODAY), (TODAY, TODAY)]
+    assert writes == [True, False]
+    assert bars["time"].shape[0] == 11
+
+
+def test_new_rows_rewrite_the_partition(store, writes):
+    price_history.load_history("FPT", TODAY - timedelta(days=5), TODAY - timedelta(days=3))
+    bars = price_history.load_history("FPT", TODAY - timedelta(days=8), TODAY - timedelta(days=3))
+    assert store[-1] == (TODAY - timedelta(days=8), TODAY - timedelta(days=6))
+    assert writes == [True, True]
+    assert bars["time"].shape[0] == 6
+
+
+def test_load_price_matrix_reads_the_store_and_queues_the_rest(store, monkeypatch):
+    from fina.tools import portfolio_analytics
+
+    start = TODAY - timedelta(days=10)
+    price_history.load_history("FPT", start, TODAY - timedelta(days=1))
+    price_history.load_history("VNM", start, TODAY - timedelta(days=1))
+    fetched = len(store)
+    queued = []
+    monkeypatch.setattr(portfolio_analytics, "sync_in_background", lambda symbols, *args: queued.extend(symbols))
+
+    times, prices, kept, missing = portfolio_analytics.load_price_matrix(["FPT", "vnm", "ACB"], start)
+
+    assert len(store) == fetched
+    assert queued == ["ACB"]
+    assert kept == ["FPT", "VNM"] and missing == ["ACB"]
+    assert prices.shape == (10, 2)
+
+
+def test_background_sync_is_queued_once(store):
+    start = TODAY - timedelta(days=3)
+    price_history._SYNC_POOL.submit(lambda: None).result()
+    gate = price_history._SYNC_POOL.submit(time.sleep, 0.2)
+    assert price_history.sync_in_background(["acb", "ACB"], start) == ["ACB"]
+    assert price_history.sync_in_background(["ACB"], start) == []
+    gate.result()
+    price_history._SYNC_POOL.submit(lambda: None).result()
+    assert price_history.is_stored("ACB", start)
+    assert store == [(start, TODAY)]
@@ -0,0 +1,111 @@
+import json
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+import requests
+
+from fina.tools import price_history, provider_replay
+
+
+@pytest.fixture
+def replay_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(provider_replay, "PROVIDER_FIXTURE_DIR", str(tmp_path / "fixtures"))
+    monkeypatch.setattr(provider_replay, "PROVIDER_REPLAY_LATENCY_MS", 0)
+    monkeypatch.setattr(provider_replay, "PROVIDER_REPLAY_ERROR_RATE", 0)
+    monkeypatch.setattr(provider_replay, "_TODAY", None)
+    return tmp_path
+
+
+def _mode(monkeypatch, mode):
+    monkeypatch.setattr(provider_replay, "PROVIDER_REPLAY_MODE", mode)
+    monkeypatch.setattr(provider_replay, "_TODAY", None)
+
+
+def test_replay_call_serves_the_recorded_result(replay_dir, monkeypatch):
+    _mode(monkeypatch, "record")
+    assert provider_replay.replay_call("vnstock.test", lambda: {"price": 1}, symbol="FPT") == {"price": 1}
+
+    _mode(monkeypatch, "replay")
+    assert provider_replay.replay_call("vnstock.test", lambda: pytest.fail("provider called"), symbol="FPT") == {"price": 1}
+    with pytest.raises(requests.exceptions.ConnectionError):
+        provider_replay.replay_call("vnstock.test", lambda: None, symbol="VNM")
+
+
+def test_today_is_frozen_to_the_recording_date(replay_dir, monkeypatch):
+    _mode(monkeypatch, "record")
+    recorded = provider_replay.today()
+    assert recorded == date.today()
+
+    fixture = replay_dir / "fixtures" / "today.json"
+    fixture.write_text(json.dumps({"today": "2025-03-03"}))
+    _mode(monkeypatch, "replay")
+    assert provider_replay.today() == date(2025, 3, 3)
+
+
+def test_price_history_sync_replays_on_a_later_day(replay_dir, monkeypatch):
+    """Relative date ranges recorded one day resolve to the same fixture keys in replay."""
+    monkeypatch.setattr(price_history, "PRICE_HISTORY_DIR", str(replay_dir / "store"))
+    recorded_day = date(2025, 3, 3)
+    bars = pd.DataFrame({
+        "time": pd.to_datetime(["2025-02-26", "2025-02-27", "2025-02-28"]),
+        "open": [1.0, 2.0, 3.0], "high": [1.0, 2.0, 3.0], "low": [1.0, 2.0, 3.0],
+        "close": [1.0, 2.0, 3.0], "volume": [10.0, 20.0, 30.0],
+    })
+    keys = []
+    real_replay_call = provider_replay.replay_call
+
+    def recording_call(name, fn, **key):
+        keys.append(key)
+        return real_replay_call(name, lambda: bars, **key)
+
+    monkeypatch.setattr(price_history, "replay_call", recording_call)
+    _mode(monkeypatch, "record")
+    monkeypatch.setattr(provider_replay, "_TODAY", recorded_day)
+    price_history.load_history("FPT", recorded_day - timedelta(days=10))
+
+    # Replay from an empty store: the frozen date reproduces the recorded key.
+    monkeypatch.setattr(price_history, "PRICE_HISTORY_DIR", str(replay_dir / "store-replay"))
+    (replay_dir / "fixtures" / "today.json").write_text(json.dumps({"today": recorded_day.isoformat()}))
+    _mode(monkeypatch, "replay")
+    closes = price_history.load_history("FPT", provider_replay.today() - timedelta(days=10))["close"]
+
+    assert keys[0] == keys[1]
+    assert list(closes) == [1.0, 2.0, 3.0]
+
+
+def test_replay_adapter_round_trip(replay_dir, monkeypatch):
+    class _Delegate:
+        def send(self, request, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response._content = b'{"data": [1]}'
+            response.url = request.url
+            return response
+
+        def close(self):
+            pass
+
+    request = requests.Request("GET", "https://pro-api.example.com/v1/quotes", params={"symbol": "BTC"}).prepare()
+    recorder = provider_replay.ReplayAdapter("record")
+    recorder.delegate = _Delegate()
+    recorder.send(request)
+
+    replayed = provider_replay.ReplayAdapter("replay").send(request)
+    assert replayed.status_code == 200
+    assert replayed.json() == {"data": [1]}
+
+
+def test_crypto_requests_have_a_timeout(monkeypatch):
+    from fina.tools import investment_tools
+
+    seen = {}
+
+    class _Session:
+        def get(self, url, **kwargs):
+            seen.update(kwargs)
+            return type("Response", (), {"json": lambda self: {"data": []}})()
+
+    monkeypatch.setattr(investment_tools, "get_http_session", lambda: _Session())
+    investment_tools._fetch_top_10_crypto()
+    assert seen["timeout"] == investment_tools.PROVIDER_TIMEOUT_SECONDS
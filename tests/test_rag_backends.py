@@ -0,0 +1,78 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from fina.tools import embeddings, rag_backends
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    def embed_texts(texts, task="RETRIEVAL_QUERY", backend="local"):
+        vectors = np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    monkeypatch.setattr(embeddings, "embed_texts", embed_texts)
+    return rag_backends.LocalBackend(root=str(tmp_path / "index"), embedding_model="test")
+
+
+def _document(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def _arrays_dirs(backend, corpus):
+    directory = backend._dir(corpus)
+    return sorted(name for name in os.listdir(directory) if os.path.isdir(os.path.join(directory, name)))
+
+
+def test_reader_of_the_previous_corpus_json_sees_one_consistent_version(backend, tmp_path):
+    corpus = backend.create_corpus("docs")["resource_name"]
+    backend.add_files(corpus, [_document(tmp_path, "a.txt", "alpha document")])
+    old_meta = backend._meta(corpus)
+
+    backend.add_files(corpus, [_document(tmp_path, "b.txt", "beta document")])
+
+    # A reader that loaded corpus.json just before the write still finds its arrays.
+    old_index = rag_backends._LocalIndex(os.path.join(backend._dir(corpus), old_meta["arrays"]))
+    assert old_index.file_index.shape[0] == 1 and len(old_meta["files"]) == 1
+    assert old_index.chunk(0) == "alpha document"
+    assert [chunk["text"] for chunk in backend.list_chunks(corpus)] == ["alpha document", "beta document"]
+
+
+def test_only_the_current_and_previous_versions_are_kept(backend, tmp_path):
+    corpus = backend.create_corpus("docs")["resource_name"]
+    for name in ("a.txt", "b.txt", "c.txt"):
+        backend.add_files(corpus, [_document(tmp_path, name, f"text of {name}")])
+    meta = backend._meta(corpus)
+    assert meta["arrays"] in _arrays_dirs(backend, corpus)
+    assert len(_arrays_dirs(backend, corpus)) == 2
+
+
+def test_corpus_in_the_flat_layout_is_read_and_migrated(backend, tmp_path):
+    corpus = backend.create_corpus("docs")["resource_name"]
+    backend.add_files(corpus, [_document(tmp_path, "a.txt", "alpha document")])
+    directory = backend._dir(corpus)
+    meta = backend._meta(corpus)
+    arrays = os.path.join(directory, meta.pop("arrays"))
+    for name in rag_backends._ARRAY_FILES:
+        os.replace(os.path.join(arrays, name), os.path.join(directory, name))
+    for name in _arrays_dirs(backend, corpus):
+        shutil.rmtree(os.path.join(directory, name))
+    meta["version"] += 1
+    with open(os.path.join(directory, "corpus.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    assert [chunk["text"] for chunk in backend.list_chunks(corpus)] == ["alpha document"]
+    backend.add_files(corpus, [_document(tmp_path, "b.txt", "beta document")])
+    backend.add_files(corpus, [_document(tmp_path, "c.txt", "gamma document")])
+    assert not any(os.path.exists(os.path.join(directory, name)) for name in rag_backends._ARRAY_FILES)
+    assert len(backend.list_chunks(corpus)) == 3
+
+
+def test_base_backend_cannot_be_instantiated():
+    with pytest.raises(TypeError):
+        rag_backends.RetrievalBackend()
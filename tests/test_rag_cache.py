@@ -0,0 +1,75 @@
+import numpy as np
+
+import pytest
+
+from fina.tools.rag_cache import SemanticCache, key_tokens
+
+
+def _unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def _results(text):
+    return [{"source_uri": "gs://docs/a.pdf", "text": text}]
+
+
+def test_similar_query_hits_and_dissimilar_misses():
+    cache = SemanticCache(max_entries=4, threshold=0.9, ttl_seconds=60)
+    cache.store("corpus", 0, _unit(1, 0, 0), "what is an ETF", _results("etf"))
+
+    hit = cache.lookup("corpus", _unit(1, 0.1, 0), "what's an ETF")
+    assert hit["query"] == "what is an ETF" and hit["similarity"] > 0.9
+    assert cache.lookup("corpus", _unit(0, 1, 0), "what is an ETF") is None
+    assert cache.lookup("other", _unit(1, 0, 0), "what is an ETF") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_corpus_change_invalidates_and_blocks_late_stores():
+    cache = SemanticCache(max_entries=4, threshold=0.9, ttl_seconds=60)
+    version = cache.corpus_version("corpus")
+    cache.store("corpus", version, _unit(1, 0, 0), "q", _results("old"))
+    cache.bump_corpus_version("corpus")
+
+    assert cache.lookup("corpus", _unit(1, 0, 0), "q") is None
+    # A query answered before the change must not repopulate the cache.
+    cache.store("corpus", version, _unit(1, 0, 0), "q", _results("old"))
+    assert cache.lookup("corpus", _unit(1, 0, 0), "q") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_expired_entries_are_not_served():
+    cache = SemanticCache(max_entries=4, threshold=0.9, ttl_seconds=0)
+    cache.store("corpus", 0, _unit(1, 0, 0), "q", _results("a"))
+    cache._stored_at[:] -= 1
+    assert cache.lookup("corpus", _unit(1, 0, 0), "q") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticCache(max_entries=2, threshold=0.99, ttl_seconds=60)
+    cache.store("corpus", 0, _unit(1, 0, 0), "q", _results("a"))
+    cache.store("corpus", 0, _unit(0, 1, 0), "q", _results("b"))
+    cache._last_used[0] += 10  # "a" was used more recently than "b"
+    cache.store("corpus", 0, _unit(0, 0, 1), "q", _results("c"))
+
+    assert cache.lookup("corpus", _unit(1, 0, 0), "q")["results"] == _results("a")
+    assert cache.lookup("corpus", _unit(0, 1, 0), "q") is None
+    assert cache.lookup("corpus", _unit(0, 0, 1), "q")["results"] == _results("c")
+
+
+@pytest.mark.parametrize("cached, query", [
+    ("Điều 5 Luật thuế thu nhập cá nhân quy định gì?", "Điều 6 Luật thuế thu nhập cá nhân quy định gì?"),
+    ("What does Article 12 say about deductions?", "What does Section 12 say about deductions?"),
+    ("Personal income tax brackets for 2024", "Personal income tax brackets for 2025"),
+    ("Thuế cho thu nhập 10 triệu", "Thuế cho thu nhập 15 triệu"),
+])
+def test_queries_with_different_numbers_or_references_do_not_share_a_hit(cached, query):
+    cache = SemanticCache(max_entries=4, threshold=0.9, ttl_seconds=60)
+    cache.store("corpus", 0, _unit(1, 0, 0), cached, _results("a"))
+    assert cache.lookup("corpus", _unit(1, 0.01, 0), query) is None
+    assert cache.lookup("corpus", _unit(1, 0.01, 0), cached)["query"] == cached
+
+
+def test_key_tokens_ignore_case_and_thousands_separators():
+    assert key_tokens("ĐIỀU 5, thu nhập 5.000.000") == key_tokens("điều 5 thu nhập 5,000,000")
+    assert key_tokens("what is an ETF") == frozenset()
@@ -0,0 +1,127 @@
+import threading
+
+import pytest
+
+from fina.tools import rag_cache, rag_hybrid
+
+PASSAGE = (
+    "Điều 9. Thu nhập chịu thuế từ tiền lương, tiền công là khoản thu nhập người lao động "
+    "nhận được từ người sử dụng lao động"
+)
+
+
+class _Backend:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.revision = "r1"
+        self.builds = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def corpus_revision(self, resource_name):
+        return self.revision
+
+    def list_chunks(self, resource_name):
+        self.release.wait(5)
+        self.builds += 1
+        return list(self.chunks)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    chunks = [
+        {"source_uri": "gs://law/pit.pdf", "source_name": "pit.pdf", "text": PASSAGE},
+        {"source_uri": "gs://law/vat.pdf", "source_name": "vat.pdf", "text": "Thuế giá trị gia tăng áp dụng cho hàng hóa"},
+        {"source_uri": "gs://law/rent.pdf", "source_name": "rent.pdf", "text": "Hợp đồng thuê nhà phải ghi rõ giá thuê"},
+    ]
+    fake = _Backend(chunks)
+    monkeypatch.setattr(rag_hybrid, "get_backend", lambda: fake)
+    for name in ("_INDEXES", "_CHECKED"):
+        monkeypatch.setattr(rag_hybrid, name, {})
+    monkeypatch.setattr(rag_hybrid, "_BUILDING", set())
+    monkeypatch.setattr(rag_hybrid, "RAG_KEYWORD_INDEX_REFRESH_SECONDS", 0.0)
+    yield fake
+    fake.release.set()
+    _wait_for_builder()
+
+
+def _wait_for_builder():
+    rag_hybrid._BUILDER.submit(lambda: None).result(5)
+
+
+def test_bm25_matches_article_numbers_and_diacritics():
+    index = rag_hybrid.BM25Index([
+        {"text": PASSAGE},
+        {"text": "Điều 19. Giảm trừ gia cảnh"},
+        {"text": "Hợp đồng thuê nhà phải ghi rõ giá thuê"},
+    ])
+    assert index.search("điều 9", 3)[0][0] == 0
+    assert index.search("thue thu nhap", 3)[0][0] == 0
+    # With diacritics, "thuế" (tax) does not match "thuê" (rent).
+    assert [i for i, _ in index.search("thuế", 3)] == [0]
+
+
+def test_fusion_merges_differently_chunked_passages():
+    vector = [{"source_uri": "gs://law/pit.pdf", "text": PASSAGE + " theo hợp đồng lao động", "score": 0.2}]
+    keyword = [
+        {"source_uri": "gs://law/pit.pdf", "text": "khoản 1 " + PASSAGE, "keyword_score": 7.0},
+        {"source_uri": "gs://law/other.pdf", "text": PASSAGE, "keyword_score": 5.0},
+    ]
+    fused = rag_hybrid.reciprocal_rank_fusion({"vector": vector, "keyword": keyword}, k=60)
+
+    assert len(fused) == 2
+    top = fused[0]
+    assert top["retrievers"] == ["vector", "keyword"]
+    assert top["text"] == vector[0]["text"] and top["score"] == 0.2 and top["keyword_score"] == 7.0
+    assert top["rrf_score"] == pytest.approx(2 / 61)
+    assert fused[1]["source_uri"] == "gs://law/other.pdf" and fused[1]["score"] is None
+
+
+def test_fusion_keeps_unrelated_passages_of_one_source_apart():
+    vector = [{"source_uri": "gs://law/pit.pdf", "text": "Điều 2. Đối tượng nộp thuế là cá nhân cư trú", "score": 0.3}]
+    keyword = [{"source_uri": "gs://law/pit.pdf", "text": PASSAGE, "keyword_score": 3.0}]
+    assert len(rag_hybrid.reciprocal_rank_fusion({"vector": vector, "keyword": keyword})) == 2
+
+
+def test_index_is_built_off_the_request_path(backend):
+    backend.release.clear()
+    assert rag_hybrid._keyword_search("corpus", "điều 9", 5) == []
+    backend.release.set()
+    _wait_for_builder()
+
+    results = rag_hybrid._keyword_search("corpus", "điều 9", 5)
+    assert results[0]["source_uri"] == "gs://law/pit.pdf"
+    assert backend.builds == 1
+
+
+def test_index_is_rebuilt_when_the_backend_revision_changes(backend, monkeypatch):
+    invalidated = []
+    monkeypatch.setattr(rag_hybrid, "invalidate_corpus", invalidated.append)
+    rag_hybrid._keyword_index("corpus")
+    _wait_for_builder()
+    rag_hybrid._keyword_index("corpus")
+    _wait_for_builder()
+    assert backend.builds == 1  # same revision: checked, not rebuilt
+
+    backend.revision = "r2"
+    backend.chunks.append({"source_uri": "gs://law/new.pdf", "source_name": "new.pdf", "text": "Điều 50. Quy định mới"})
+    rag_hybrid._keyword_index("corpus")
+    _wait_for_builder()
+
+    assert backend.builds == 2 and invalidated == ["corpus"]
+    assert rag_hybrid._keyword_search("corpus", "điều 50", 5)[0]["source_uri"] == "gs://law/new.pdf"
+
+
+def test_change_in_this_process_retires_the_old_index(backend):
+    rag_hybrid._keyword_index("corpus")
+    _wait_for_builder()
+    assert rag_hybrid._keyword_index("corpus") is not None
+    _wait_for_builder()
+
+    rag_cache.invalidate_corpus("corpus")
+    backend.revision = "r2"
+    backend.release.clear()
+    assert rag_hybrid._keyword_index("corpus") is None
+    backend.release.set()
+    _wait_for_builder()
+    assert rag_hybrid._keyword_index("corpus") is not None
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from fina.tools import database, investment_tools
+from fina.tools.result_encoding import encode_result, round_number, to_table
+
+
+def test_round_number_keeps_significant_digits_of_small_values():
+    assert round_number(1234.5678) == 1234.57
+    assert round_number(0.000012345) == 0.000012
+
+
+def test_to_table_caps_rows_and_reports_total():
+    rows = [{"id": i, "name": f"w{i}"} for i in range(5)]
+    table = to_table(rows, ["name"], max_rows=2)
+    assert table == {"columns": ["name"], "truncated": True, "total_rows": 5, "rows": [["w0"], ["w1"]]}
+
+
+def test_encode_result_is_minified_and_drops_nan():
+    assert encode_result({"a": [{"x": 1.239, "y": float("nan")}]}) == '{"a":{"columns":["x","y"],"rows":[[1.24,null]]}}'
+
+
+class _Query:
+    def __init__(self, log, rows):
+        self.log, self.rows = log, rows
+
+    def select(self, columns):
+        self.log.append(("select", columns))
+        return self
+
+    def order(self, column, desc=False):
+        self.log.append(("order", column, desc))
+        return self
+
+    def limit(self, count):
+        self.log.append(("limit", count))
+        self.rows = self.rows[:count]
+        return self
+
+    def execute(self):
+        return type("Response", (), {"data": self.rows})()
+
+
+def test_read_tools_order_newest_first_before_the_cap(monkeypatch):
+    log = []
+    rows = [{"time": f"2026-01-{day:02d}", "amount": day} for day in (3, 2, 1)]
+    monkeypatch.setattr(database.supabase, "table", lambda name: _Query(log, rows))
+
+    table = json.loads(database.read_transactions(fields=["time", "amount"], limit=2))
+
+    assert ("order", "time", True) in log
+    assert ("limit", 3) in log
+    assert table["rows"] == [["2026-01-03", 3], ["2026-01-02", 2]]
+    assert table["truncated"] is True
+    assert "total_rows" not in table
+
+
+def test_read_tools_reject_unknown_fields_without_a_query(monkeypatch):
+    monkeypatch.setattr(database.supabase, "table", lambda name: pytest.fail("queried the database"))
+
+    result = json.loads(database.read_wallets(fields=["name", "owner"]))
+
+    assert result["status"] == "error"
+    assert "owner" in result["message"] and "balance" in result["message"]
+
+
+def test_investment_summary_filters_each_table_by_its_own_columns(monkeypatch):
+    monkeypatch.setattr(investment_tools, "_fetch_top_10_crypto", lambda: [{"symbol": "BTC", "price_usd": 1.0, "market_cap": 9}])
+    monkeypatch.setattr(investment_tools, "_fetch_top_10_vn_stocks", lambda: [{"ticker": "FPT", "price": 2.0, "market_cap": 8}])
+
+    summary = json.loads(investment_tools.get_investment_summary(crypto_fields=["symbol", "price_usd"], stock_fields=["ticker"]))
+
+    assert summary["top_cryptos"] == {"columns": ["symbol", "price_usd"], "rows": [["BTC", 1.0]]}
+    assert summary["top_vn_stocks"] == {"columns": ["ticker"], "rows": [["FPT"]]}
@@ -0,0 +1,67 @@
+import math
+
+import pytest
+
+from fina.tools import valuation
+
+
+class _Query:
+    def execute(self):
+        return None
+
+
+class _Supabase:
+    def __init__(self):
+        self.calls = []
+
+    def rpc(self, name, params):
+        assert name == "apply_investment_valuations"
+        self.calls.append(params["updates"])
+        return _Query()
+
+
+@pytest.fixture
+def market(monkeypatch):
+    rows = [
+        {"id": 1, "asset_name": "Bitcoin", "type": "crypto", "amount_invested": 1_000_000, "quantity": 0.5, "note": "user edit"},
+        {"id": 2, "asset_name": "FPT", "type": "stock", "amount_invested": 2_000_000, "quantity": 20},
+        {"id": 3, "asset_name": "XYZ", "type": "stock", "amount_invested": 500_000, "quantity": 5},
+    ]
+    db = _Supabase()
+    monkeypatch.setattr(valuation, "select_rows", lambda table, fields=None: rows)
+    monkeypatch.setattr(valuation, "supabase", db)
+    monkeypatch.setattr(valuation, "_fetch_crypto_prices", lambda symbols: {"BTC": 3_000_000.0})
+    monkeypatch.setattr(valuation, "_fetch_stock_prices", lambda symbols: {"FPT": 120_000.0})
+    return db
+
+
+def test_update_writes_only_id_and_computed_fields(market):
+    result = valuation.revalue_investments()
+
+    (updates,) = market.calls
+    assert [set(update) for update in updates] == [{"id", "current_value", "profit", "profit_percent"}] * 2
+    btc = next(update for update in updates if update["id"] == 1)
+    assert btc == {"id": 1, "current_value": 1_500_000.0, "profit": 500_000.0, "profit_percent": 50.0}
+    assert result["positions_valued"] == 2
+    assert result["positions_skipped"] == [{"id": 3, "asset_name": "XYZ", "reason": "no market price"}]
+
+
+def test_totals_cover_only_valued_positions(market):
+    result = valuation.revalue_investments()
+
+    assert result["total_invested"] == 3_000_000.0
+    assert result["total_current_value"] == 1_500_000.0 + 2_400_000.0
+    assert math.isclose(result["total_profit"], 900_000.0)
+
+
+
+def test_failing_provider_only_skips_its_positions(market, monkeypatch):
+    def down(symbols):
+        raise ConnectionError("CoinMarketCap unavailable")
+
+    monkeypatch.setattr(valuation, "_fetch_crypto_prices", down)
+    result = valuation.revalue_investments()
+
+    (updates,) = market.calls
+    assert [update["id"] for update in updates] == [2]
+    assert {skip["id"] for skip in result["positions_skipped"]} == {1, 3}